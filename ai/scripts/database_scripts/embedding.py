@@ -3,49 +3,98 @@ import numpy as np
 from deepface import DeepFace
 import psycopg2
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "recognition"))
+from embedders import embedding_meta, get_embedder, save_embedding
+from face_alignment import FaceAligner
 
 VIDEO_PATH = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monitoring-System\dataset\students\780328.mp4"
 STUDENT_ROLL = "780328"
 EMBEDDINGS_FOLDER = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monitoring-System\student_embeddings"
 
+# Embedding backend: "deepface" or "onnx" (see recognition/embedders.py).
+# Both produce L2-normalized ArcFace vectors, the model the recognizer
+# matches with; the model and dimension are stored with every embedding.
+EMBEDDING_BACKEND = "deepface"
+ONNX_MODEL_PATH = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monitoring-System\models\arcface.onnx"
+
+# Enroll landmark-aligned 112x112 crops instead of plain detector crops.
+# Must match USE_ALIGNMENT in recognition/real_time_recognition2.py: the
+# flag is stored with every embedding and the recognizer only loads
+# embeddings of its own crop kind. Frames where no landmarks are found are
+# skipped rather than enrolled unaligned.
+ALIGN_FACES = False
+aligner = FaceAligner() if ALIGN_FACES else None
+
 os.makedirs(EMBEDDINGS_FOLDER, exist_ok=True)
 
-def save_embedding_database(student_id: str, embedding:list)->None:
+if EMBEDDING_BACKEND == "onnx":
+    embedder = get_embedder("onnx", model_path=ONNX_MODEL_PATH)
+else:
+    embedder = get_embedder("deepface", model_name="ArcFace")
+
+def connect_database():
+    return psycopg2.connect(
+        dbname="college_db",
+        user="postgres",
+        password="admin",
+        host="localhost",
+        port="5432"
+    )
+
+def add_embedding_model_columns()->None:
+    """
+        This function adds the model / dim / aligned columns to student_embeddings (once).\n
+        Rows enrolled before they existed keep NULL there and must not be
+        matched against embeddings of a known model.
+        Returns: None
+    """
+    conn = connect_database()
+    cur = conn.cursor()
+    cur.execute(
+        "ALTER TABLE student_embeddings "
+        "ADD COLUMN IF NOT EXISTS model VARCHAR(50), ADD COLUMN IF NOT EXISTS dim INTEGER, "
+        "ADD COLUMN IF NOT EXISTS aligned BOOLEAN NOT NULL DEFAULT FALSE"
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def save_embedding_database(student_id: str, embedding:list, meta: dict)->None:
     """
         This function saves student's embedding in the database.\n
         Parameters:
             student_id(str): Roll_No of student
             embedding(list or bytes): The embedding vector representing the student's features.
+            meta(dict): Model, dimension and crop kind of the embedding (embedders.embedding_meta)
         Returns: None
     """
-    conn = psycopg2.connect(
-        dbname="college_db",
-        user="postgres",
-        password="admin",
-        host="localhost",
-        port="5432"
-    )
+    conn = connect_database()
     cur = conn.cursor()
     cur.execute(
-        "INSERT INTO student_embeddings (student_id, embedding) VALUES (%s, %s)",
-        (student_id, embedding)  # directly use list
+        "INSERT INTO student_embeddings (student_id, embedding, model, dim, aligned) VALUES (%s, %s, %s, %s, %s)",
+        (student_id, embedding, meta["model"], meta["dim"], meta["aligned"])  # directly use list
     )
     conn.commit()
     cur.close()
     conn.close()
 
-def save_embedding_file(student_id: str, embedding: list)->None:
+def save_embedding_file(student_id: str, embedding: list, meta: dict)->None:
     """
         This function saves student's embedding in the local directory.\n
         Parameters:
             student_id(str): Roll_No of student
             embedding(list or bytes): The embedding vector representing the student's features.
+            meta(dict): Model, dimension and crop kind, written to a .json sidecar next to the .npy
         Returns: None
     """
     filepath = os.path.join(EMBEDDINGS_FOLDER, f"{student_id}.npy")
-    np.save(filepath, np.array(embedding))
+    save_embedding(filepath, embedding, meta)
     print(f"Saved embedding to file: {filepath}")
 
+add_embedding_model_columns()
+
 cap = cv2.VideoCapture(VIDEO_PATH)
 frame_count = 0
 processed_count = 0
@@ -67,14 +116,24 @@ while True:
             continue
 
         for i, face_data in enumerate(faces):
-            face_img = cv2.resize(face_data["face"], (160, 160))
-
-            embedding = DeepFace.represent(face_img, model_name="Facenet", enforce_detection=False)[0]["embedding"]
+            if aligner is not None:
+                area = face_data["facial_area"]
+                aligned = aligner.align_still(frame, (area["x"], area["y"], area["w"], area["h"]))
+                if aligned is None:
+                    print(f"No landmarks for face {i} in frame {frame_count}, skipped")
+                    continue
+                # BGR frame -> RGB, as the recognizer feeds its embedder
+                face_img = cv2.cvtColor(aligned, cv2.COLOR_BGR2RGB)
+            else:
+                face_img = cv2.resize(face_data["face"], (160, 160))
+
+            embedding = embedder.embed(face_img).tolist()
+            meta = embedding_meta(embedder, embedding, aligned=ALIGN_FACES)
 
             student_id = f"{STUDENT_ROLL}_frame{frame_count}_{i}"
 
-            save_embedding_database(student_id, embedding)
-            save_embedding_file(student_id, embedding)
+            save_embedding_database(student_id, embedding, meta)
+            save_embedding_file(student_id, embedding, meta)
 
             processed_count += 1
 
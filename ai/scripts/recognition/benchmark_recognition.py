@@ -0,0 +1,441 @@
+import os
+import io
+import json
+import time
+import argparse
+import itertools
+import platform
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from real_time_recognition2 import OptimizedFaceRecognition
+from embedders import get_embedder, l2_normalize
+from tiled_detection import TiledFaceDetector
+from face_alignment import FaceAligner
+
+# =======================
+# Recognition pipeline benchmark
+# =======================
+# Runs detect -> crop -> embed -> match over a frame stream for every
+# combination of matcher / executor / detector / aligner and gallery size, and writes
+# the results as JSON so runs can be compared across commits.
+#
+#   python benchmark_recognition.py --gallery-sizes 100 1000 10000 --frames 200 \
+#       --output bench_results.json
+#
+# Gallery and frames are synthetic by default, and each face is matched
+# with a synthetic probe near an enrolled identity. Pass --video to use a
+# recorded stream: detections then come from the detector under test and
+# the embedder's own output is matched, against the real gallery given by
+# --embeddings (padded with synthetic identities up to each gallery size;
+# aligner=aligned only uses embeddings enrolled from aligned crops).
+#
+# The per-student "loop" matcher is O(embeddings) in Python and is skipped
+# above --loop-max-identities.
+
+ABSOLUTE_THRESHOLD = 0.20  # Same decision rule as recognize_face_optimized
+RELATIVE_GAP = 0.05
+EMBEDDING_DIM = 512
+
+
+# =======================
+# Synthetic data
+# =======================
+def synthetic_gallery(n_identities, min_per_id=1, max_per_id=20, dim=EMBEDDING_DIM, seed=0):
+    """{student_id: [embedding, ...]} with a few noisy samples around each identity centre"""
+    rng = np.random.default_rng(seed)
+    centres = l2_normalize(rng.standard_normal((n_identities, dim)))
+    counts = rng.integers(min_per_id, max_per_id + 1, size=n_identities)
+
+    gallery = {}
+    for i, (centre, count) in enumerate(zip(centres, counts)):
+        samples = l2_normalize(centre + 0.3 / np.sqrt(dim) * rng.standard_normal((count, dim)))
+        gallery[f"{100000 + i}"] = list(samples)
+    return gallery
+
+
+def synthetic_frames(n_frames, faces_per_frame=4, size=(480, 640), face_size=(100, 100), seed=0):
+    """Yield (frame, boxes) with textured face-sized patches that drift slowly, like seated students"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    w, h = face_size
+    positions = np.column_stack([
+        rng.integers(0, width - w, faces_per_frame),
+        rng.integers(0, height - h, faces_per_frame),
+    ])
+    for _ in range(n_frames):
+        frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        positions = positions + rng.integers(-3, 4, positions.shape)
+        positions[:, 0] = np.clip(positions[:, 0], 0, width - w)
+        positions[:, 1] = np.clip(positions[:, 1], 0, height - h)
+        boxes = []
+        for x, y in positions:
+            frame[y:y + h, x:x + w] = cv2.GaussianBlur(frame[y:y + h, x:x + w], (9, 9), 0)
+            boxes.append((int(x), int(y), w, h))
+        yield frame, np.array(boxes)
+
+
+def video_frames(path, n_frames=None):
+    """Yield (frame, None) from a recorded video file"""
+    cap = cv2.VideoCapture(path)
+    count = 0
+    try:
+        while n_frames is None or count < n_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield frame, None
+    finally:
+        cap.release()
+
+
+class SyntheticEmbedder:
+    """Cheap stand-in embedder: fixed random projection of the grey 112x112 crop"""
+
+    name = "synthetic"
+
+    def __init__(self, dim=EMBEDDING_DIM, seed=0):
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((112 * 112, dim)).astype(np.float32) / 112
+
+    def embed(self, face_img):
+        grey = cv2.cvtColor(cv2.resize(np.asarray(face_img, dtype=np.uint8), (112, 112)), cv2.COLOR_RGB2GRAY)
+        return l2_normalize(grey.reshape(-1).astype(np.float32) @ self.projection)
+
+    def embed_batch(self, face_imgs):
+        return np.stack([self.embed(face_img) for face_img in face_imgs])
+
+
+# =======================
+# Pipeline options
+# =======================
+def build_recognizer(gallery, embedder):
+    """OptimizedFaceRecognition over an in-memory gallery (no .npy files needed)"""
+    with tempfile.TemporaryDirectory() as empty_folder, contextlib.redirect_stdout(io.StringIO()):
+        recognizer = OptimizedFaceRecognition(empty_folder, embedder=embedder)
+        recognizer.embedding_dict = defaultdict(list, gallery)
+        recognizer.build_search_index()
+    return recognizer
+
+
+def loop_matcher(recognizer):
+    """The recognizer's own per-student scipy loop (its logging is silenced by run_case)"""
+    def match(embedding):
+        return recognizer.recognize_face_optimized(embedding)
+
+    # It scans the stored per-student embeddings themselves
+    match.index_bytes = sum(e.nbytes for embeddings in recognizer.embedding_dict.values() for e in embeddings)
+    return match
+
+
+def knn_matcher(recognizer):
+    """sklearn NearestNeighbors over averaged per-student embeddings"""
+    n_neighbors = min(2, len(recognizer.student_labels))
+
+    def match(embedding):
+        distances, indices = recognizer.knn_model.kneighbors([embedding], n_neighbors=n_neighbors)
+        best = distances[0][0]
+        if best > ABSOLUTE_THRESHOLD:
+            return "Unknown", best
+        if n_neighbors > 1 and distances[0][1] - best < RELATIVE_GAP:
+            return "Unknown", best
+        return recognizer.student_labels[indices[0][0]], best
+
+    # Averaged embeddings plus the copy NearestNeighbors validated at fit time (if it made one)
+    arrays = {id(a): a for a in (np.asarray(recognizer.student_embeddings), recognizer.knn_model._fit_X)}
+    match.index_bytes = sum(a.nbytes for a in arrays.values())
+    return match
+
+
+def matrix_matcher(recognizer):
+    """One matrix product against every stored embedding, min distance per student"""
+    labels = list(recognizer.embedding_dict.keys())
+    stacked = [np.asarray(recognizer.embedding_dict[label]) for label in labels]
+    starts = np.cumsum([0] + [len(block) for block in stacked[:-1]])
+    gallery = np.vstack(stacked).astype(np.float32)
+
+    def match(embedding):
+        similarities = gallery @ np.asarray(embedding, dtype=np.float32)
+        best_per_student = np.maximum.reduceat(similarities, starts)
+        if len(best_per_student) >= 2:
+            top2 = np.argpartition(-best_per_student, 1)[:2]
+            top2 = top2[np.argsort(-best_per_student[top2])]
+        else:
+            top2 = np.array([0])
+        best = 1.0 - best_per_student[top2[0]]
+        if best > ABSOLUTE_THRESHOLD:
+            return "Unknown", best
+        if len(top2) > 1 and (1.0 - best_per_student[top2[1]]) - best < RELATIVE_GAP:
+            return "Unknown", best
+        return labels[top2[0]], best
+
+    match.index_bytes = gallery.nbytes
+    return match
+
+
+MATCHERS = {
+    "loop": loop_matcher,
+    "knn": knn_matcher,
+    "matrix": matrix_matcher,
+}
+
+EXECUTORS = ["inline", "threads"]
+DETECTORS = ["fast", "tiled"]
+ALIGNERS = ["none", "aligned"]
+
+
+def make_detector(name, recognizer):
+    if name == "fast":
+        return recognizer.detect_faces_fast, None
+    if name == "tiled":
+        tiled = TiledFaceDetector()
+        return tiled.detect, tiled
+    raise ValueError(f"Unknown detector: {name}")
+
+
+# =======================
+# Measurement
+# =======================
+def percentiles(values_ms):
+    if not values_ms:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    values = np.asarray(values_ms)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(np.mean(values)),
+    }
+
+
+def traced_peak_mb(func, *args):
+    """func(*args) and the peak memory it allocated (Python objects and numpy buffers)
+
+    Traced on its own, outside the timed loop: tracemalloc slows every allocation.
+    """
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / (1024 * 1024)
+
+
+def query_embedding(base, rng):
+    """A probe close to a gallery sample, like a real enrolled face seen again"""
+    return l2_normalize(base + 0.3 / np.sqrt(base.shape[-1]) * rng.standard_normal(base.shape))
+
+
+def run_case(recognizer, frames, matcher_name, executor_name, detector_name, aligner_name="none", workers=4, seed=0):
+    """Benchmark one matcher/executor/detector/aligner combination over a list of frames"""
+    # Memory of this case alone: building its index, then one query against it
+    with contextlib.redirect_stdout(io.StringIO()):
+        match, build_peak_mb = traced_peak_mb(MATCHERS[matcher_name], recognizer)
+        probe = l2_normalize(next(iter(recognizer.embedding_dict.values()))[0])
+        _, query_peak_mb = traced_peak_mb(match, probe)
+    detect, detector = make_detector(detector_name, recognizer)
+    pool = ThreadPoolExecutor(max_workers=workers) if executor_name == "threads" else None
+    aligner = FaceAligner() if aligner_name == "aligned" else None
+
+    rng = np.random.default_rng(seed)
+    gallery_matrix = np.vstack([np.asarray(v) for v in recognizer.embedding_dict.values()])
+    # Each face slot in the stream is one enrolled student
+    slot_bases = {}
+
+    def process_face(face_img, probe, track_id):
+        t0 = time.perf_counter()
+        # BGR crop -> RGB, as the recognizer feeds its embedder
+        embedding = recognizer.embedder.embed(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB))
+        t1 = time.perf_counter()
+        # Synthetic faces match a probe near their enrolled identity, recorded ones their real embedding
+        identity, distance = match(embedding if probe is None else probe)
+        t2 = time.perf_counter()
+        return (t1 - t0) * 1000, (t2 - t1) * 1000, identity, distance, track_id
+
+    detect_ms, crop_ms, embed_ms, match_ms, face_ms = [], [], [], [], []
+    recognized = 0
+    reused = 0
+    # The recognizer prints per-student distances; keep them out of the timings
+    devnull = open(os.devnull, "w")
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(devnull):
+            for frame, known_boxes in frames:
+                t0 = time.perf_counter()
+                detected = detect(frame)
+                detect_ms.append((time.perf_counter() - t0) * 1000)
+
+                # Synthetic frames carry their own boxes, recorded ones use detections
+                synthetic = known_boxes is not None
+                boxes = known_boxes if synthetic else detected
+                jobs = []
+                for i, (x, y, w, h) in enumerate(boxes):
+                    if synthetic and i not in slot_bases:
+                        slot_bases[i] = gallery_matrix[rng.integers(0, len(gallery_matrix))]
+                    t0 = time.perf_counter()
+                    if aligner is not None:
+                        face_img, track = aligner.align(frame, (x, y, w, h), len(detect_ms))
+                        crop_ms.append((time.perf_counter() - t0) * 1000)
+                        if not aligner.needs_recognition(track, len(detect_ms)):
+                            reused += 1
+                            continue
+                        track_id = track.track_id
+                    else:
+                        face_img = cv2.resize(frame[y:y + h, x:x + w], (160, 160))
+                        crop_ms.append((time.perf_counter() - t0) * 1000)
+                        track_id = None
+                    probe = query_embedding(slot_bases[i], rng) if synthetic else None
+                    jobs.append((face_img, probe, track_id))
+
+                if pool is not None:
+                    results = list(pool.map(lambda job: process_face(*job), jobs))
+                else:
+                    results = [process_face(*job) for job in jobs]
+
+                for e_ms, m_ms, identity, distance, track_id in results:
+                    embed_ms.append(e_ms)
+                    match_ms.append(m_ms)
+                    face_ms.append(e_ms + m_ms)
+                    recognized += identity != "Unknown"
+                    if aligner is not None:
+                        aligner.record_attempt(track_id, identity, distance)
+    finally:
+        elapsed = time.perf_counter() - start
+        devnull.close()
+        if pool is not None:
+            pool.shutdown()
+        if detector is not None:
+            detector.close()
+
+    n_frames = len(detect_ms)
+    return {
+        "matcher": matcher_name,
+        "executor": executor_name,
+        "detector": detector_name,
+        "aligner": aligner_name,
+        "frames": n_frames,
+        "faces": len(face_ms) + reused,
+        "recognitions": len(face_ms),
+        "reused_track_identities": reused,
+        "recognized_rate": recognized / len(face_ms) if face_ms else None,
+        "fps": n_frames / elapsed if elapsed > 0 else None,
+        "face_latency_ms": percentiles(face_ms),
+        "embed_ms": percentiles(embed_ms),
+        "match_ms": percentiles(match_ms),
+        "detect_ms": percentiles(detect_ms),
+        "crop_ms": percentiles(crop_ms),
+        "alignment": aligner.stats() if aligner is not None else None,
+        "index_mb": match.index_bytes / (1024 * 1024),
+        "build_peak_mb": build_peak_mb,
+        "query_peak_mb": query_peak_mb,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition pipeline")
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--loop-max-identities", type=int, default=1000,
+                        help="Skip the loop matcher for larger galleries (it takes seconds per face)")
+    parser.add_argument("--min-per-id", type=int, default=1)
+    parser.add_argument("--max-per-id", type=int, default=20)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--faces-per-frame", type=int, default=4)
+    parser.add_argument("--video", help="Recorded stream instead of synthetic frames")
+    parser.add_argument("--embeddings", help="Enrolled .npy gallery to match --video faces against")
+    parser.add_argument("--matchers", nargs="+", default=list(MATCHERS), choices=list(MATCHERS))
+    parser.add_argument("--executors", nargs="+", default=EXECUTORS, choices=EXECUTORS)
+    parser.add_argument("--detectors", nargs="+", default=DETECTORS, choices=DETECTORS)
+    parser.add_argument("--aligners", nargs="+", default=ALIGNERS, choices=ALIGNERS)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--embedder", default="synthetic", choices=["synthetic", "deepface", "onnx"])
+    parser.add_argument("--onnx-model", help="ArcFace .onnx graph for --embedder onnx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    if args.embedder == "synthetic":
+        embedder = SyntheticEmbedder(seed=args.seed)
+    elif args.embedder == "onnx":
+        embedder = get_embedder("onnx", model_path=args.onnx_model)
+    else:
+        embedder = get_embedder("deepface", model_name="ArcFace")
+
+    if args.video:
+        frames = list(video_frames(args.video, args.frames))
+    else:
+        frames = list(synthetic_frames(args.frames, args.faces_per_frame, seed=args.seed))
+
+    # Aligned crops are only matched against embeddings enrolled from aligned crops
+    enrolled, dim = {aligner: {} for aligner in args.aligners}, EMBEDDING_DIM
+    if args.embeddings:
+        for aligner in args.aligners:
+            with contextlib.redirect_stdout(io.StringIO()):
+                loaded = OptimizedFaceRecognition(
+                    args.embeddings, embedder=embedder, aligner=FaceAligner() if aligner == "aligned" else None
+                )
+            enrolled[aligner], dim = dict(loaded.embedding_dict), loaded.embedding_dim
+            print(f"📂 {len(enrolled[aligner])} enrolled identities for aligner={aligner} from {args.embeddings}")
+    elif args.video:
+        print("⚠️ --video without --embeddings: real faces are matched against synthetic identities, "
+              "so recognized_rate only counts false matches")
+
+    results = []
+    for size, aligner in itertools.product(args.gallery_sizes, args.aligners):
+        if args.embeddings and not enrolled[aligner]:
+            print(f"⏭️ identities={size} aligner={aligner} skipped (no embeddings of that crop kind)")
+            continue
+        distractors = synthetic_gallery(
+            max(0, size - len(enrolled[aligner])), args.min_per_id, args.max_per_id, dim=dim, seed=args.seed
+        )
+        gallery = {**enrolled[aligner], **{f"distractor{k}": v for k, v in distractors.items()}}
+        gallery_mb = sum(e.nbytes for embeddings in gallery.values() for e in embeddings) / (1024 * 1024)
+        recognizer = build_recognizer(gallery, embedder)
+
+        for matcher, executor, detector in itertools.product(args.matchers, args.executors, args.detectors):
+            if matcher == "loop" and len(gallery) > args.loop_max_identities:
+                print(f"⏭️ identities={size} matcher=loop skipped (above --loop-max-identities)")
+                continue
+            print(f"⏱️ identities={size} matcher={matcher} executor={executor} detector={detector} aligner={aligner}")
+            result = run_case(recognizer, frames, matcher, executor, detector, aligner, args.workers, args.seed)
+            result.update({
+                "identities": len(gallery),
+                "enrolled_identities": len(enrolled[aligner]),
+                "embeddings": sum(len(v) for v in gallery.values()),
+                "gallery_mb": gallery_mb,
+            })
+            print(f"   fps={result['fps']:.1f} face p95={result['face_latency_ms']['p95']} ms")
+            results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "embedder": embedder.name,
+        "source": args.video or "synthetic",
+        "gallery": args.embeddings or "synthetic",
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+import json
+import argparse
+import numpy as np
+import cv2
+
+# =======================
+# Face embedding backends
+# =======================
+# Every backend exposes the same API:
+#   embed(face_img)        -> L2-normalized 1-D vector
+#   embed_batch(face_imgs) -> (N, D) array of L2-normalized vectors
+# so the recognizer and the enrollment scripts can switch between DeepFace
+# (TensorFlow) and an exported ArcFace graph running under ONNX Runtime.
+#
+# Vectors from different models (or dimensions) are not comparable, so every
+# stored embedding gets a JSON sidecar next to its .npy recording the model
+# and dimension that produced it, and the recognizer refuses to match
+# against embeddings of another model. The ONNX backend is an export of
+# DeepFace's ArcFace, so both backends share the "ArcFace" model name.
+
+ARCFACE_INPUT_SIZE = (112, 112)
+
+
+def l2_normalize(vec):
+    """L2 normalize vector (or each row of a 2-D array)"""
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec, axis=-1, keepdims=True)
+    norm[norm == 0] = 1.0
+    return vec / norm
+
+
+class DeepFaceEmbedder:
+    """Embeddings through DeepFace.represent (TensorFlow)"""
+
+    name = "deepface"
+
+    def __init__(self, model_name="ArcFace"):
+        from deepface import DeepFace
+        self._deepface = DeepFace
+        self.model_name = model_name
+
+    def embed(self, face_img):
+        result = self._deepface.represent(
+            face_img,
+            model_name=self.model_name,
+            enforce_detection=False,
+            detector_backend="skip"  # Faces are already cropped
+        )
+        return l2_normalize(result[0]["embedding"])
+
+    def embed_batch(self, face_imgs):
+        return np.stack([self.embed(face_img) for face_img in face_imgs])
+
+
+class OnnxArcFaceEmbedder:
+    """ArcFace embeddings from an exported ONNX graph, CPU only"""
+
+    name = "onnx"
+    model_name = "ArcFace"
+
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=1, quantized=False):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required for the ONNX backend: pip install onnxruntime") from e
+
+        if quantized:
+            model_path = quantize_model(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+
+        self.model_path = model_path
+        self.quantized = quantized
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def preprocess(self, face_img):
+        """Same preprocessing DeepFace applies for ArcFace: letterbox to 112x112, scale to [0, 1]"""
+        face_img = np.asarray(face_img)
+        if face_img.dtype != np.uint8 and face_img.max() <= 1.0:
+            face_img = (face_img * 255).astype(np.uint8)
+
+        target_h, target_w = ARCFACE_INPUT_SIZE
+        h, w = face_img.shape[:2]
+        factor = min(target_h / h, target_w / w)
+        resized = cv2.resize(face_img, (int(w * factor), int(h * factor)))
+
+        diff_h = target_h - resized.shape[0]
+        diff_w = target_w - resized.shape[1]
+        resized = np.pad(
+            resized,
+            ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+            "constant"
+        )
+        if resized.shape[:2] != ARCFACE_INPUT_SIZE:
+            resized = cv2.resize(resized, (target_w, target_h))
+
+        return resized.astype(np.float32) / 255.0
+
+    def embed(self, face_img):
+        return self.embed_batch([face_img])[0]
+
+    def embed_batch(self, face_imgs):
+        if len(face_imgs) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        batch = np.stack([self.preprocess(face_img) for face_img in face_imgs])
+        outputs = self.session.run(None, {self.input_name: batch})
+        return l2_normalize(outputs[0])
+
+
+def embedding_meta(embedder, embedding, aligned=False):
+    """What to store next to an embedding so it is only matched against its own model and crop kind"""
+    return {
+        "model": getattr(embedder, "model_name", embedder.name),
+        "backend": embedder.name,
+        "dim": int(np.asarray(embedding).shape[-1]),
+        "normalized": True,
+        "aligned": bool(aligned),
+    }
+
+
+def meta_path(embedding_path):
+    return os.path.splitext(embedding_path)[0] + ".json"
+
+
+def save_embedding(embedding_path, embedding, meta):
+    """Write an embedding as .npy plus its metadata sidecar"""
+    np.save(embedding_path, np.asarray(embedding, dtype=np.float32))
+    with open(meta_path(embedding_path), "w") as f:
+        json.dump(meta, f)
+
+
+def load_embedding_meta(embedding_path):
+    """Metadata recorded for an .npy embedding, or None for files enrolled before it was recorded"""
+    try:
+        with open(meta_path(embedding_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def quantize_model(model_path, output_path=None):
+    """Create (once) an int8 dynamic-quantized copy of the ONNX model and return its path"""
+    if output_path is None:
+        stem, ext = os.path.splitext(model_path)
+        output_path = f"{stem}.int8{ext}"
+
+    if not os.path.exists(output_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"Quantizing {model_path} -> {output_path}")
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+
+    return output_path
+
+
+def export_deepface_arcface(output_path, opset=13):
+    """Export DeepFace's ArcFace Keras model to ONNX (needs tf2onnx)"""
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+
+    model = DeepFace.build_model("ArcFace")
+    keras_model = getattr(model, "model", model)
+    spec = (tf.TensorSpec((None, *ARCFACE_INPUT_SIZE, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset, output_path=output_path)
+    print(f"✅ Exported ArcFace to {output_path}")
+    return output_path
+
+
+def get_embedder(backend="deepface", **kwargs):
+    """Build an embedder by name ('deepface' or 'onnx')"""
+    if backend == "deepface":
+        return DeepFaceEmbedder(**kwargs)
+    if backend == "onnx":
+        return OnnxArcFaceEmbedder(**kwargs)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def equivalence_report(reference, candidate, face_imgs, min_similarity=0.99):
+    """Compare two embedders on the same faces and report their cosine agreement"""
+    ref = np.stack([reference.embed(face_img) for face_img in face_imgs])
+    cand = candidate.embed_batch(face_imgs)
+    similarities = np.sum(ref * cand, axis=1)
+
+    # Nearest-neighbour agreement: does each candidate embedding pick the same
+    # (other) reference face as the reference embedding does?
+    nn_agreement = 1.0
+    if len(ref) > 1:
+        ref_sims = ref @ ref.T
+        cand_sims = cand @ ref.T
+        np.fill_diagonal(ref_sims, -np.inf)
+        np.fill_diagonal(cand_sims, -np.inf)
+        nn_agreement = float(np.mean(ref_sims.argmax(axis=1) == cand_sims.argmax(axis=1)))
+
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "faces": len(face_imgs),
+        "cosine_mean": float(np.mean(similarities)),
+        "cosine_min": float(np.min(similarities)),
+        "cosine_p5": float(np.percentile(similarities, 5)),
+        "min_similarity": min_similarity,
+        "agreement_rate": float(np.mean(similarities >= min_similarity)),
+        "nearest_neighbour_agreement": nn_agreement,
+    }
+
+
+def load_faces(faces_folder, limit=None):
+    """Load face crops (images) from a folder, BGR->RGB like the recognizer does"""
+    faces = []
+    for file in sorted(os.listdir(faces_folder)):
+        if not file.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        img = cv2.imread(os.path.join(faces_folder, file))
+        if img is None:
+            continue
+        faces.append(cv2.cvtColor(cv2.resize(img, (160, 160)), cv2.COLOR_BGR2RGB))
+        if limit and len(faces) >= limit:
+            break
+    return faces
+
+
+# =======================
+# Usage
+# =======================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / check the ONNX ArcFace backend")
+    parser.add_argument("--model", required=True, help="Path to the ArcFace .onnx graph")
+    parser.add_argument("--export", action="store_true", help="Export DeepFace ArcFace to --model first")
+    parser.add_argument("--faces", help="Folder of face crops for the equivalence check")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--quantized", action="store_true", help="Check the int8 dynamic-quantized variant")
+    parser.add_argument("--intra-op-threads", type=int, default=None)
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--min-similarity", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.export:
+        export_deepface_arcface(args.model)
+
+    if args.faces:
+        faces = load_faces(args.faces, args.limit)
+        onnx_embedder = OnnxArcFaceEmbedder(
+            args.model,
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+            quantized=args.quantized
+        )
+        report = equivalence_report(DeepFaceEmbedder("ArcFace"), onnx_embedder, faces, args.min_similarity)
+        report["quantized"] = args.quantized
+        print(json.dumps(report, indent=2))
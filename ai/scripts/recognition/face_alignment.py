@@ -0,0 +1,272 @@
+import cv2
+import numpy as np
+
+# =======================
+# Landmark-based face alignment
+# =======================
+# ArcFace was trained on 112x112 crops warped so the eyes, nose and mouth
+# corners land on a fixed template. Plain rectangle resizes leave the face
+# rotated/shifted, which inflates distances. FaceAligner finds landmarks
+# with a lightweight detector, fits a similarity transform (rotation,
+# uniform scale, translation) onto the template and warps the frame.
+#
+# Landmarks are cached per track (a face followed across detections by box
+# IoU) relative to the face box, refreshed every few frames and smoothed,
+# so most frames only pay for one warpAffine. Tracks also remember the
+# identity once recognized, so the caller can skip re-recognition; the
+# identity is re-verified every reverify_interval frames (sooner while the
+# match was weak), so a wrong label or a track that slid onto another face
+# is corrected instead of being carried for the rest of the stream.
+#
+# Aligned queries only match an aligned gallery: enroll with ALIGN_FACES in
+# database_scripts/embedding.py (align_still), which records "aligned" in
+# each embedding's metadata; the recognizer refuses the other kind.
+
+ARCFACE_SIZE = (112, 112)
+
+# Standard ArcFace 5-point template for 112x112 (left eye, right eye, nose, mouth left, mouth right)
+ARCFACE_TEMPLATE = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32)
+
+
+class EyeLandmarkDetector:
+    """Two eye centres from OpenCV's eye cascade (no extra model files)"""
+
+    def __init__(self, cascade_path=None):
+        self.cascade = cv2.CascadeClassifier(cascade_path or cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+    def detect(self, gray_face):
+        """Return [[left_x, left_y], [right_x, right_y]] in crop coordinates, or None"""
+        h, w = gray_face.shape[:2]
+        upper = gray_face[:int(h * 0.6)]
+        eyes = self.cascade.detectMultiScale(
+            upper,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(max(8, w // 8), max(8, h // 8))
+        )
+        if len(eyes) < 2:
+            return None
+
+        # Two largest candidates, ordered left to right in the image
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        centres = np.array([[x + ew / 2, y + eh / 2] for x, y, ew, eh in eyes], dtype=np.float32)
+        centres = centres[np.argsort(centres[:, 0])]
+
+        # Reject implausible pairs (overlapping or too tilted)
+        dx, dy = centres[1] - centres[0]
+        if dx < w * 0.2 or dx > w * 0.75 or abs(dy) > dx:
+            return None
+        return centres
+
+
+class FacemarkLandmarkDetector:
+    """Five points from OpenCV's LBF facemark model (needs opencv-contrib and lbfmodel.yaml)"""
+
+    def __init__(self, model_path):
+        if not hasattr(cv2, "face"):
+            raise ImportError("cv2.face is missing: pip install opencv-contrib-python")
+        self.facemark = cv2.face.createFacemarkLBF()
+        self.facemark.loadModel(model_path)
+
+    def detect(self, gray_face):
+        h, w = gray_face.shape[:2]
+        ok, landmarks = self.facemark.fit(gray_face, np.array([[0, 0, w, h]]))
+        if not ok:
+            return None
+        points = landmarks[0][0]
+        return np.array([
+            points[36:42].mean(axis=0),  # left eye
+            points[42:48].mean(axis=0),  # right eye
+            points[30],                  # nose tip
+            points[48],                  # mouth left
+            points[54],                  # mouth right
+        ], dtype=np.float32)
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """One face followed across frames"""
+
+    def __init__(self, track_id, box, frame_num):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = frame_num
+        self.landmarks = None          # Normalized to the face box, (N, 2)
+        self.landmarks_frame = None    # Frame the landmarks were last measured on
+        self.identity = None
+        self.distance = None
+        self.verified_frame = None     # Frame the identity was last (re-)checked on
+        self.attempts = 0              # Recognition attempts before an identity was accepted
+
+
+class FaceAligner:
+    """Similarity-transform alignment with a per-track landmark cache"""
+
+    def __init__(self, landmark_detector=None, output_size=ARCFACE_SIZE, refresh_interval=5,
+                 smoothing=0.5, iou_threshold=0.3, max_age=30, reverify_interval=30, reverify_distance=0.15):
+        self.landmark_detector = landmark_detector or EyeLandmarkDetector()
+        self.output_size = output_size
+        self.refresh_interval = refresh_interval
+        self.reverify_interval = reverify_interval
+        self.reverify_distance = reverify_distance  # weaker matches are re-checked every refresh_interval
+        self.smoothing = smoothing
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks = {}
+        self.next_track_id = 0
+        self.template = ARCFACE_TEMPLATE * np.array(
+            [output_size[0] / ARCFACE_SIZE[0], output_size[1] / ARCFACE_SIZE[1]], dtype=np.float32
+        )
+        self.counters = {"aligned": 0, "cached": 0, "detected": 0, "fallback": 0, "reverified": 0, "relabelled": 0}
+        self.finished_attempts = []  # attempts of tracks that ended with an identity
+
+    def _match_track(self, box, frame_num):
+        best, best_iou = None, self.iou_threshold
+        for track in self.tracks.values():
+            iou = box_iou(track.box, box)
+            if iou > best_iou:
+                best, best_iou = track, iou
+
+        if best is None:
+            best = FaceTrack(self.next_track_id, box, frame_num)
+            self.tracks[best.track_id] = best
+            self.next_track_id += 1
+
+        best.box = box
+        best.last_seen = frame_num
+        return best
+
+    def expire(self, frame_num):
+        """Drop tracks not seen for max_age frames"""
+        for track_id in [t for t, track in self.tracks.items() if frame_num - track.last_seen > self.max_age]:
+            track = self.tracks.pop(track_id)
+            if track.identity is not None:
+                self.finished_attempts.append(track.attempts)
+
+    def _detect_landmarks(self, frame, box):
+        """Landmarks of the face in box, normalized to the box, or None"""
+        x, y, w, h = box
+        face = frame[max(0, y):y + h, max(0, x):x + w]
+        if face.size == 0:
+            return None
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        points = self.landmark_detector.detect(gray)
+        if points is None:
+            return None
+        self.counters["detected"] += 1
+        return points / np.array([w, h], dtype=np.float32)
+
+    def _warp(self, frame, box, landmarks):
+        """Warp the frame so the box's landmarks land on the template, or None"""
+        x, y, w, h = box
+        points = landmarks * np.array([w, h], dtype=np.float32) + np.array([x, y], dtype=np.float32)
+        matrix, _ = cv2.estimateAffinePartial2D(points, self.template[:len(points)], method=cv2.LMEDS)
+        if matrix is None:
+            return None
+        return cv2.warpAffine(frame, matrix, self.output_size, borderMode=cv2.BORDER_REPLICATE)
+
+    def _update_landmarks(self, track, frame, box, frame_num):
+        """Refresh the track's landmarks if due, blending with the cached ones"""
+        due = track.landmarks is None or frame_num - track.landmarks_frame >= self.refresh_interval
+        if not due:
+            self.counters["cached"] += 1
+            return
+
+        normalized = self._detect_landmarks(frame, box)
+        if normalized is None:
+            return
+
+        if track.landmarks is not None and len(track.landmarks) == len(normalized):
+            normalized = self.smoothing * normalized + (1 - self.smoothing) * track.landmarks
+        track.landmarks = normalized
+        track.landmarks_frame = frame_num
+
+    def align(self, frame, box, frame_num):
+        """Aligned output_size crop for a detected face box, plus its track"""
+        x, y, w, h = [int(v) for v in box]
+        track = self._match_track((x, y, w, h), frame_num)
+        self._update_landmarks(track, frame, (x, y, w, h), frame_num)
+
+        if track.landmarks is None:
+            # No landmarks yet: same rectangle crop as before, at the ArcFace size
+            self.counters["fallback"] += 1
+            return cv2.resize(frame[y:y + h, x:x + w], self.output_size), track
+
+        aligned = self._warp(frame, (x, y, w, h), track.landmarks)
+        if aligned is None:
+            self.counters["fallback"] += 1
+            return cv2.resize(frame[y:y + h, x:x + w], self.output_size), track
+
+        self.counters["aligned"] += 1
+        return aligned, track
+
+    def align_still(self, image, box):
+        """Aligned crop of one face in a still image (enrollment), or None without landmarks
+
+        No track and no rectangle fallback: an aligned gallery must only hold aligned crops.
+        """
+        box = tuple(int(v) for v in box)
+        landmarks = self._detect_landmarks(image, box)
+        aligned = None if landmarks is None else self._warp(image, box, landmarks)
+        self.counters["aligned" if aligned is not None else "fallback"] += 1
+        return aligned
+
+    def needs_recognition(self, track, frame_num):
+        """Whether a track needs an embedding + match on this frame"""
+        if track.identity is None:
+            return True
+
+        interval = self.reverify_interval
+        if self.reverify_distance is not None and track.distance is not None and track.distance > self.reverify_distance:
+            interval = self.refresh_interval
+        if frame_num - track.verified_frame < interval:
+            return False
+
+        # Claim the check so the track is not queued again while it is in flight
+        track.verified_frame = frame_num
+        self.counters["reverified"] += 1
+        return True
+
+    def record_attempt(self, track_id, identity, distance):
+        """Register a recognition result for a track"""
+        track = self.tracks.get(track_id)
+        if track is None:
+            return
+        if track.identity is None:
+            track.attempts += 1
+        elif identity != track.identity:
+            self.counters["relabelled"] += 1
+
+        if identity == "Unknown":
+            # A failed re-verification drops the label; the track is recognized again
+            track.identity = None
+            track.distance = None
+            return
+        if track.identity is None:
+            track.verified_frame = track.last_seen
+        track.identity = identity
+        track.distance = distance
+
+    def stats(self):
+        identified = [t.attempts for t in self.tracks.values() if t.identity is not None] + self.finished_attempts
+        return {
+            **self.counters,
+            "tracks": len(self.tracks),
+            "identified_tracks": len(identified),
+            "mean_attempts_per_identity": float(np.mean(identified)) if identified else None,
+        }
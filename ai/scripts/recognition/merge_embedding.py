@@ -2,6 +2,8 @@ import os
 import numpy as np
 from collections import defaultdict
 
+from embedders import load_embedding_meta, save_embedding
+
 # =======================
 # Paths
 # =======================
@@ -10,34 +12,54 @@ MERGED_FOLDER = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monito
 os.makedirs(MERGED_FOLDER, exist_ok=True)
 
 # =======================
-# Group embeddings by base ID
+# Group embeddings by base ID and model
 # =======================
+# Embeddings of different models or crop kinds (aligned / plain) cannot be
+# averaged; each gets its own merged file (files without recorded metadata
+# are grouped together)
 embeddings_dict = defaultdict(list)
 
 for file in os.listdir(EMBEDDINGS_FOLDER):
     if file.endswith(".npy"):
         filepath = os.path.join(EMBEDDINGS_FOLDER, file)
         embedding = np.load(filepath)
+        meta = load_embedding_meta(filepath)
 
         # Base student ID (remove (1), (2), etc.)
         student_id = os.path.splitext(file)[0].split("(")[0]
+        model = (meta["model"], meta["dim"], bool(meta.get("aligned", False))) if meta else None
 
-        embeddings_dict[student_id].append(embedding)
+        embeddings_dict[(student_id, model)].append((embedding, meta))
 
 print(f"✅ Found {len(embeddings_dict)} students to merge.")
 
 # =======================
 # Merge and Save
 # =======================
-for student_id, embeddings in embeddings_dict.items():
-    if len(embeddings) == 0:
+models_per_student = defaultdict(int)
+for student_id, _ in embeddings_dict:
+    models_per_student[student_id] += 1
+
+for (student_id, model), entries in embeddings_dict.items():
+    if len(entries) == 0:
         continue
 
     # Average all embeddings of this student
-    merged_embedding = np.mean(embeddings, axis=0)
+    merged_embedding = np.mean([embedding for embedding, _ in entries], axis=0)
 
-    save_path = os.path.join(MERGED_FOLDER, f"{student_id}.npy")
-    np.save(save_path, merged_embedding)
-    print(f"✅ Merged {len(embeddings)} files → {save_path}")
+    # The recognizer reads the student ID up to the first "_"
+    if models_per_student[student_id] == 1:
+        name = student_id
+    elif model is None:
+        name = f"{student_id}_unlabelled"
+    else:
+        name = f"{student_id}_{model[0]}{'_aligned' if model[2] else ''}"
+    save_path = os.path.join(MERGED_FOLDER, f"{name}.npy")
+    meta = entries[0][1]
+    if meta is None:
+        np.save(save_path, merged_embedding)
+    else:
+        save_embedding(save_path, merged_embedding, {**meta, "normalized": False})
+    print(f"✅ Merged {len(entries)} files → {save_path}")
 
 print("🎯 All embeddings merged successfully!")
@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
 import os
 from scipy.spatial.distance import cosine
 from collections import defaultdict
@@ -8,11 +7,22 @@ import time
 from sklearn.neighbors import NearestNeighbors
 import threading
 import queue
+from embedders import get_embedder, load_embedding_meta
+from tiled_detection import TiledFaceDetector
+from face_alignment import FaceAligner
 
 class OptimizedFaceRecognition:
-    def __init__(self, embeddings_folder, threshold=0.25):
+    def __init__(self, embeddings_folder, threshold=0.25, embedder=None, tiled_detector=None, aligner=None,
+                 allow_unlabelled=True):
         self.embeddings_folder = embeddings_folder
         self.threshold = threshold
+        # Embedding backend (DeepFace by default, see embedders.py for ONNX)
+        self.embedder = embedder if embedder is not None else get_embedder("deepface", model_name="ArcFace")
+        self.model_name = getattr(self.embedder, "model_name", self.embedder.name)
+        # Output size of the embedder, from one blank face (also warms the model up)
+        self.embedding_dim = int(np.asarray(self.embedder.embed(np.zeros((112, 112, 3), dtype=np.uint8))).shape[-1])
+        # Gallery files without recorded metadata are used if their dimension matches
+        self.allow_unlabelled = allow_unlabelled
         self.embedding_dict = defaultdict(list)
         self.student_embeddings = []
         self.student_labels = []
@@ -20,6 +30,12 @@ class OptimizedFaceRecognition:
         
         # Face detection setup
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Optional tiled detector for large halls (see tiled_detection.py)
+        self.tiled_detector = tiled_detector
+        # Optional landmark alignment + per-track cache (see face_alignment.py);
+        # aligned queries need a gallery enrolled from aligned crops
+        self.aligner = aligner
+        self.aligned = aligner is not None
         
         # Threading setup
         self.recognition_queue = queue.Queue()
@@ -43,25 +59,48 @@ class OptimizedFaceRecognition:
         return vec / norm
     
     def load_embeddings(self):
-        """Load and organize embeddings by student ID"""
+        """Load and organize embeddings by student ID, skipping those of another model"""
         print("Loading embeddings...")
+        refused = defaultdict(int)
+        unlabelled = 0
         
         for file in os.listdir(self.embeddings_folder):
             if file.endswith(".npy"):
                 try:
                     full_id = os.path.splitext(file)[0]
                     student_id = full_id.split("_")[0]
+                    path = os.path.join(self.embeddings_folder, file)
                     
-                    embedding = np.load(os.path.join(self.embeddings_folder, file))
-                    embedding = self.l2_normalize(embedding)
+                    embedding = np.load(path)
+                    meta = load_embedding_meta(path)
+                    if meta is None:
+                        # Files from before metadata was recorded are unaligned crops
+                        if not self.allow_unlabelled or embedding.shape[-1] != self.embedding_dim or self.aligned:
+                            refused[f"unlabelled, dim {embedding.shape[-1]}"] += 1
+                            continue
+                        unlabelled += 1
+                    elif (meta.get("model") != self.model_name or meta.get("dim") != self.embedding_dim
+                          or bool(meta.get("aligned", False)) != self.aligned):
+                        crops = "aligned" if meta.get("aligned") else "unaligned"
+                        refused[f"{meta.get('model')}, dim {meta.get('dim')}, {crops}"] += 1
+                        continue
                     
+                    embedding = self.l2_normalize(embedding)
                     self.embedding_dict[student_id].append(embedding)
                     
                 except Exception as e:
                     print(f"Error loading {file}: {e}")
                     continue
         
-        print(f"✅ Loaded embeddings for {len(self.embedding_dict)} students")
+        crops = "aligned" if self.aligned else "unaligned"
+        print(f"✅ Loaded embeddings for {len(self.embedding_dict)} students "
+              f"({self.model_name}, dim {self.embedding_dim}, {crops})")
+        for source, count in refused.items():
+            print(f"⚠️ Skipped {count} embedding(s) from another model or crop kind ({source}); "
+                  f"re-enroll them with database_scripts/embedding.py using {self.model_name}, "
+                  f"ALIGN_FACES={self.aligned}")
+        if unlabelled:
+            print(f"⚠️ {unlabelled} embedding(s) have no recorded model and were assumed to be {self.model_name}")
         
         # Print embedding statistics
         for student_id, embeddings in self.embedding_dict.items():
@@ -102,16 +141,8 @@ class OptimizedFaceRecognition:
             if len(face_img.shape) == 3 and face_img.shape[2] == 3:
                 face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
             
-            # Extract embedding
-            result = DeepFace.represent(
-                face_img, 
-                model_name="ArcFace", 
-                enforce_detection=False,
-                detector_backend="skip"  # Skip detection since we already have the face
-            )
-            
-            embedding = result[0]["embedding"]
-            return self.l2_normalize(embedding)
+            # Extract embedding (already L2 normalized by the backend)
+            return self.embedder.embed(face_img)
             
         except Exception as e:
             print(f"Embedding extraction error: {e}")
@@ -191,6 +222,12 @@ class OptimizedFaceRecognition:
         )
         return faces
     
+    def detect_faces(self, frame):
+        """Detect faces with the tiled detector if configured, else full-frame"""
+        if self.tiled_detector is not None:
+            return self.tiled_detector.detect(frame)
+        return self.detect_faces_fast(frame)
+    
     def recognition_worker(self):
         """Background thread for face recognition"""
         while self.running:
@@ -198,16 +235,22 @@ class OptimizedFaceRecognition:
                 if not self.recognition_queue.empty():
                     face_img, face_id, frame_num = self.recognition_queue.get(timeout=0.1)
                     
-                    print(f"[FRAME {frame_num}] 🔍 Starting recognition for Face ID {face_id}")
-                    
-                    # Extract embedding
-                    embedding = self.extract_embedding_safe(face_img)
-                    
-                    # Recognize with frame number
-                    identity, distance = self.recognize_face_optimized(embedding, frame_num)
-                    
-                    # Put result back
-                    self.result_queue.put((face_id, identity, distance, frame_num))
+                    try:
+                        print(f"[FRAME {frame_num}] 🔍 Starting recognition for Face ID {face_id}")
+                        start = time.perf_counter()
+                        
+                        # Extract embedding
+                        embedding = self.extract_embedding_safe(face_img)
+                        
+                        # Recognize with frame number
+                        identity, distance = self.recognize_face_optimized(embedding, frame_num)
+                        elapsed_ms = (time.perf_counter() - start) * 1000
+                        
+                        # Put result back
+                        self.result_queue.put((face_id, identity, distance, frame_num, elapsed_ms))
+                    finally:
+                        # Lets run_realtime() wait for pending faces at the end of a replay
+                        self.recognition_queue.task_done()
                     
             except queue.Empty:
                 continue
@@ -226,9 +269,25 @@ class OptimizedFaceRecognition:
         if self.recognition_thread:
             self.recognition_thread.join()
     
-    def run_realtime(self):
-        """Main real-time recognition loop"""
-        cap = cv2.VideoCapture(0)
+    def _result_record(self, face_origins, face_id, identity, distance, recognize_ms):
+        """Frame-log entry for one recognition result"""
+        source_frame, face_index = face_origins.pop(face_id, (None, None))
+        return {
+            "face_id": face_id,
+            "source_frame": source_frame,
+            "face_index": face_index,
+            "identity": identity,
+            "distance": float(distance),
+            "recognize_ms": recognize_ms
+        }
+    
+    def run_realtime(self, source=0, frame_logger=None, display=True):
+        """Main real-time recognition loop
+        
+        source: camera index / video path, or a ReplaySource (see stream_replay.py)
+        frame_logger: optional FrameLogger receiving per-frame boxes, identities and timings
+        """
+        cap = cv2.VideoCapture(source) if isinstance(source, (int, str)) else source
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         cap.set(cv2.CAP_PROP_FPS, 30)
@@ -242,6 +301,8 @@ class OptimizedFaceRecognition:
         # Face results storage - keep track of faces and their recognition results
         face_results = {}  # {face_id: (identity, distance, timestamp)}
         next_face_id = 0
+        face_origins = {}  # {face_id: (frame_num, index in that frame)} for the frame log
+        face_tracks = {}  # {face_id: track_id} when alignment is enabled
         
         # For immediate display without waiting for processing
         current_faces = []  # List of current face locations
@@ -257,11 +318,15 @@ class OptimizedFaceRecognition:
                 
                 self.frame_count += 1
                 print(f"\n📹 [FRAME {self.frame_count}] Processing frame...")
+                frame_record = {"frame": self.frame_count, "t": getattr(cap, "timestamp", None), "boxes": None, "detect_ms": None, "results": []}
                 
                 # Process every nth frame for detection
                 if self.frame_count % self.skip_frames == 0:
                     print(f"[FRAME {self.frame_count}] 🔍 Running face detection...")
-                    faces = self.detect_faces_fast(frame)
+                    detect_start = time.perf_counter()
+                    faces = self.detect_faces(frame)
+                    frame_record["detect_ms"] = (time.perf_counter() - detect_start) * 1000
+                    frame_record["boxes"] = [list(face) for face in faces]
                     current_faces = faces  # Update current faces
                     
                     print(f"[FRAME {self.frame_count}] 👥 Found {len(faces)} face(s)")
@@ -270,13 +335,23 @@ class OptimizedFaceRecognition:
                     for i, (x, y, w, h) in enumerate(faces):
                         print(f"[FRAME {self.frame_count}] 👤 Processing face {i+1}/{len(faces)} at position ({x},{y},{w},{h})")
                         
-                        # Extract face region
-                        face_roi = frame[y:y+h, x:x+w]
-                        face_img = cv2.resize(face_roi, (160, 160))
-                        
                         # Queue for recognition
                         face_id = next_face_id
                         next_face_id += 1
+                        face_origins[face_id] = (self.frame_count, i)
+                        
+                        if self.aligner is not None:
+                            # Aligned 112x112 crop; identified tracks are only re-verified now and then
+                            face_img, track = self.aligner.align(frame, (x, y, w, h), self.frame_count)
+                            if not self.aligner.needs_recognition(track, self.frame_count):
+                                face_results[face_id] = (track.identity, track.distance, time.time(), (x, y, w, h))
+                                frame_record["results"].append(self._result_record(face_origins, face_id, track.identity, track.distance, 0.0))
+                                continue
+                            face_tracks[face_id] = track.track_id
+                        else:
+                            # Extract face region
+                            face_roi = frame[y:y+h, x:x+w]
+                            face_img = cv2.resize(face_roi, (160, 160))
                         
                         if not self.recognition_queue.full():
                             self.recognition_queue.put((face_img, face_id, self.frame_count))
@@ -286,11 +361,17 @@ class OptimizedFaceRecognition:
                         
                         # Store face location with "Recognizing..." status
                         face_results[face_id] = ("Recognizing...", 0.0, time.time(), (x, y, w, h))
+                    
+                    if self.aligner is not None:
+                        self.aligner.expire(self.frame_count)
                 
                 # Get recognition results
                 while not self.result_queue.empty():
                     try:
-                        face_id, identity, distance, result_frame = self.result_queue.get_nowait()
+                        face_id, identity, distance, result_frame, recognize_ms = self.result_queue.get_nowait()
+                        frame_record["results"].append(self._result_record(face_origins, face_id, identity, distance, recognize_ms))
+                        if face_id in face_tracks:
+                            self.aligner.record_attempt(face_tracks.pop(face_id), identity, distance)
                         if face_id in face_results:
                             _, _, timestamp, location = face_results[face_id]
                             face_results[face_id] = (identity, distance, timestamp, location)
@@ -298,6 +379,12 @@ class OptimizedFaceRecognition:
                     except queue.Empty:
                         break
                 
+                if frame_logger is not None:
+                    frame_logger.log(frame_record)
+                
+                if not display:
+                    continue
+                
                 # Draw results - prioritize recent recognition results, fall back to current faces
                 current_time = time.time()
                 
@@ -346,13 +433,29 @@ class OptimizedFaceRecognition:
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     break
                     
+            # Replays end on purpose: finish the queued faces so the log is complete
+            if frame_logger is not None:
+                self.recognition_queue.join()
+                final_record = {"frame": self.frame_count, "boxes": None, "detect_ms": None, "results": []}
+                while not self.result_queue.empty():
+                    face_id, identity, distance, result_frame, recognize_ms = self.result_queue.get_nowait()
+                    final_record["results"].append(self._result_record(face_origins, face_id, identity, distance, recognize_ms))
+                    if face_id in face_tracks:
+                        self.aligner.record_attempt(face_tracks.pop(face_id), identity, distance)
+                frame_logger.log(final_record)
+                    
         except KeyboardInterrupt:
             print("\n🛑 Stopping recognition...")
         
         finally:
             self.stop_recognition_thread()
+            if self.tiled_detector is not None:
+                self.tiled_detector.close()
             cap.release()
-            cv2.destroyAllWindows()
+            if display:
+                cv2.destroyAllWindows()
+            if self.aligner is not None:
+                print(f"📐 Alignment stats: {self.aligner.stats()}")
             print("🏁 Recognition stopped.")
 
 # =======================
@@ -361,10 +464,34 @@ class OptimizedFaceRecognition:
 if __name__ == "__main__":
     EMBEDDINGS_FOLDER = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monitoring-System\student_embeddings\merged"
     
+    # Embedding backend: "deepface" (TensorFlow) or "onnx" (ONNX Runtime, CPU)
+    EMBEDDING_BACKEND = "deepface"
+    ONNX_MODEL_PATH = r"G:\final_year_project\Attendance-and-Classroom-Behavior-Monitoring-System\models\arcface.onnx"
+
+    if EMBEDDING_BACKEND == "onnx":
+        embedder = get_embedder("onnx", model_path=ONNX_MODEL_PATH, intra_op_threads=4, inter_op_threads=1, quantized=False)
+    else:
+        embedder = get_embedder("deepface", model_name="ArcFace")
+
+    # Tiled detection for large halls: back rows are upscaled 2x so small faces are found.
+    # Several times the cost of full-frame detection (see tiled_detection.py)
+    USE_TILED_DETECTION = False
+    tiled_detector = TiledFaceDetector(rows=3, cols=3, overlap=0.2, back_scale=2.0, max_workers=4) if USE_TILED_DETECTION else None
+
+    # Landmark alignment to the ArcFace 112x112 template, cached per track.
+    # Must match the gallery: enroll with ALIGN_FACES = True in
+    # database_scripts/embedding.py to use it (galleries of the other crop
+    # kind are refused at load). Off by default, like enrollment.
+    USE_ALIGNMENT = False
+    aligner = FaceAligner(refresh_interval=5) if USE_ALIGNMENT else None
+
     # Create and run the recognition system
     recognizer = OptimizedFaceRecognition(
         embeddings_folder=EMBEDDINGS_FOLDER,
-        threshold=0.25  # Lower threshold for stricter matching
+        threshold=0.25,  # Lower threshold for stricter matching
+        embedder=embedder,
+        tiled_detector=tiled_detector,
+        aligner=aligner
     )
     
     # Run real-time recognition
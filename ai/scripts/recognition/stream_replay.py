@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+from face_alignment import box_iou
+
+# =======================
+# Record & replay for camera streams
+# =======================
+# record_stream() captures a camera to a video file plus a sidecar
+# "<video>.timestamps.jsonl" holding the capture time of every frame.
+# ReplaySource feeds that recording back with the same read()/isOpened()/
+# release() interface as cv2.VideoCapture, either at the original pacing
+# or as fast as possible, so OptimizedFaceRecognition.run_realtime() can be
+# run twice on identical input. FrameLogger writes the per-frame outputs
+# (boxes, identities, timings) and compare_logs() diffs two such logs,
+# pairing faces across the runs by box overlap (IoU), so a detector that
+# finds the same faces in another order or with one extra box still lines up.
+
+
+def timestamps_path(video_path):
+    return f"{video_path}.timestamps.jsonl"
+
+
+def record_stream(output_path, source=0, max_frames=None, duration=None, size=(640, 480), fps=30, show=True):
+    """Record a camera stream with per-frame timestamps"""
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    cap.set(cv2.CAP_PROP_FPS, fps)
+
+    if not cap.isOpened():
+        print("Error: Could not open camera")
+        return 0
+
+    # MJPG keeps every frame independently decodable and loses little detail
+    writer = None
+    count = 0
+    start = time.monotonic()
+
+    print(f"🔴 Recording to {output_path}. Press 'q' to stop.")
+    try:
+        with open(timestamps_path(output_path), "w") as ts_file:
+            while max_frames is None or count < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                elapsed = time.monotonic() - start
+                if duration is not None and elapsed > duration:
+                    break
+
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+
+                writer.write(frame)
+                ts_file.write(json.dumps({"frame": count, "t": elapsed}) + "\n")
+                count += 1
+
+                if show:
+                    cv2.imshow("Recording", frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        if show:
+            cv2.destroyAllWindows()
+
+    print(f"✅ Recorded {count} frames")
+    return count
+
+
+class ReplaySource:
+    """Drop-in replacement for cv2.VideoCapture over a recording"""
+
+    def __init__(self, video_path, realtime=True):
+        self.video_path = video_path
+        self.realtime = realtime
+        self.cap = cv2.VideoCapture(video_path)
+        self.timestamps = []
+
+        ts_path = timestamps_path(video_path)
+        if os.path.exists(ts_path):
+            with open(ts_path) as f:
+                self.timestamps = [json.loads(line)["t"] for line in f if line.strip()]
+
+        self.index = 0
+        self.timestamp = None
+        self._start = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        # Capture properties (resolution, fps) are fixed by the recording
+        return False
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+
+        if self.index < len(self.timestamps):
+            self.timestamp = self.timestamps[self.index]
+        else:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+            self.timestamp = self.index / fps
+
+        if self.realtime:
+            if self._start is None:
+                self._start = time.monotonic() - self.timestamp
+            delay = self._start + self.timestamp - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class FrameLogger:
+    """JSON-lines log of what the pipeline produced for each frame"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+
+    def log(self, record):
+        self.file.write(json.dumps(record, default=_to_builtin) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+def load_log(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def match_boxes(boxes_a, boxes_b, iou_threshold=0.5):
+    """Greedy one-to-one pairing of two box lists by IoU: [(index_a, index_b, iou), ...]"""
+    pairs = sorted(
+        ((box_iou(a, b), i, j) for i, a in enumerate(boxes_a) for j, b in enumerate(boxes_b)),
+        reverse=True,
+    )
+    used_a, used_b, matches = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < iou_threshold:
+            break
+        if i in used_a or j in used_b:
+            continue
+        used_a.add(i)
+        used_b.add(j)
+        matches.append((i, j, iou))
+    return matches
+
+
+def compare_logs(baseline_path, candidate_path, iou_threshold=0.5):
+    """Compare two runs over the same recording for accuracy and speed
+
+    Boxes of a frame are paired across the runs by IoU (>= iou_threshold);
+    identities are compared for paired boxes only.
+    """
+    runs = {}
+    for name, path in (("baseline", baseline_path), ("candidate", candidate_path)):
+        records = load_log(path)
+        detections = {r["frame"]: r["boxes"] for r in records if r.get("boxes") is not None}
+        identities = {}  # {frame: {face_index: identity}}
+        detect_ms, recognize_ms = [], []
+        for r in records:
+            if r.get("detect_ms") is not None:
+                detect_ms.append(r["detect_ms"])
+            for result in r.get("results", []):
+                identities.setdefault(result["source_frame"], {})[result["face_index"]] = result["identity"]
+                recognize_ms.append(result["recognize_ms"])
+        runs[name] = {
+            "detections": detections,
+            "identities": identities,
+            "detect_ms": detect_ms,
+            "recognize_ms": recognize_ms,
+            "frames": len(records),
+        }
+
+    base, cand = runs["baseline"], runs["candidate"]
+    common_frames = sorted(set(base["detections"]) & set(cand["detections"]))
+    same_box_count = 0
+    base_boxes = cand_boxes = 0
+    matched_ious = []
+    faces_compared = same_identity = 0
+    for frame in common_frames:
+        base_frame, cand_frame = base["detections"][frame], cand["detections"][frame]
+        same_box_count += len(base_frame) == len(cand_frame)
+        base_boxes += len(base_frame)
+        cand_boxes += len(cand_frame)
+
+        base_ids, cand_ids = base["identities"].get(frame, {}), cand["identities"].get(frame, {})
+        for i, j, iou in match_boxes(base_frame, cand_frame, iou_threshold):
+            matched_ious.append(iou)
+            if i in base_ids and j in cand_ids:
+                faces_compared += 1
+                same_identity += base_ids[i] == cand_ids[j]
+
+    def timing(values):
+        if not values:
+            return None
+        return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+    def recognized(identities):
+        return sum(v != "Unknown" for faces in identities.values() for v in faces.values())
+
+    return {
+        "frames": {"baseline": base["frames"], "candidate": cand["frames"]},
+        "detection_frames_compared": len(common_frames),
+        "detection_count_agreement": same_box_count / len(common_frames) if common_frames else None,
+        "iou_threshold": iou_threshold,
+        "boxes": {"baseline": base_boxes, "candidate": cand_boxes, "matched": len(matched_ious)},
+        # Share of baseline boxes the candidate also found, and of candidate boxes the baseline had
+        "box_recall": len(matched_ious) / base_boxes if base_boxes else None,
+        "box_precision": len(matched_ious) / cand_boxes if cand_boxes else None,
+        "matched_box_iou": float(np.mean(matched_ious)) if matched_ious else None,
+        "faces_compared": faces_compared,
+        "identity_agreement": same_identity / faces_compared if faces_compared else None,
+        "recognized": {"baseline": recognized(base["identities"]), "candidate": recognized(cand["identities"])},
+        "detect_ms": {"baseline": timing(base["detect_ms"]), "candidate": timing(cand["detect_ms"])},
+        "recognize_ms": {"baseline": timing(base["recognize_ms"]), "candidate": timing(cand["recognize_ms"])},
+    }
+
+
+# =======================
+# Usage
+# =======================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record / replay camera streams for the recognizer")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Record the camera to a file")
+    record_parser.add_argument("output")
+    record_parser.add_argument("--source", type=int, default=0)
+    record_parser.add_argument("--max-frames", type=int)
+    record_parser.add_argument("--duration", type=float, help="Seconds")
+
+    replay_parser = subparsers.add_parser("replay", help="Run the recognizer on a recording")
+    replay_parser.add_argument("recording")
+    replay_parser.add_argument("--embeddings", required=True, help="Folder of .npy embeddings")
+    replay_parser.add_argument("--log", required=True, help="Where to write the frame log")
+    replay_parser.add_argument("--fast", action="store_true", help="Ignore original pacing")
+    replay_parser.add_argument("--display", action="store_true")
+    replay_parser.add_argument("--embedder", default="deepface", choices=["deepface", "onnx"])
+    replay_parser.add_argument("--onnx-model", help="ArcFace .onnx graph for --embedder onnx")
+    replay_parser.add_argument("--detector", default="fast", choices=["fast", "tiled"])
+    replay_parser.add_argument("--aligner", default="none", choices=["none", "aligned"],
+                               help="aligned needs embeddings enrolled from aligned crops")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two frame logs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--iou-threshold", type=float, default=0.5,
+                                help="Minimum box IoU for a face to count as the same in both runs")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_stream(args.output, source=args.source, max_frames=args.max_frames, duration=args.duration)
+    elif args.command == "replay":
+        from embedders import get_embedder
+        from face_alignment import FaceAligner
+        from real_time_recognition2 import OptimizedFaceRecognition
+        from tiled_detection import TiledFaceDetector
+
+        if args.embedder == "onnx":
+            embedder = get_embedder("onnx", model_path=args.onnx_model)
+        else:
+            embedder = get_embedder("deepface", model_name="ArcFace")
+        tiled_detector = TiledFaceDetector() if args.detector == "tiled" else None
+
+        recognizer = OptimizedFaceRecognition(
+            embeddings_folder=args.embeddings,
+            embedder=embedder,
+            tiled_detector=tiled_detector,
+            aligner=FaceAligner() if args.aligner == "aligned" else None
+        )
+        logger = FrameLogger(args.log)
+        try:
+            recognizer.run_realtime(
+                source=ReplaySource(args.recording, realtime=not args.fast),
+                frame_logger=logger,
+                display=args.display
+            )
+        finally:
+            logger.close()
+            if tiled_detector is not None:
+                tiled_detector.close()
+    else:
+        print(json.dumps(compare_logs(args.baseline, args.candidate, args.iou_threshold), indent=2))
@@ -0,0 +1,190 @@
+import cv2
+import numpy as np
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# =======================
+# Tiled face detection
+# =======================
+# The full-frame Haar cascade with minSize=(80, 80) never sees the small
+# faces in the back rows of a large hall, and lowering minSize on the whole
+# frame is slow. Here the frame is split into overlapping tiles which are
+# scanned in parallel; the top (back-of-room) rows are upscaled so small
+# faces reach the cascade's window size, the bottom (front) rows are scanned
+# at native scale. Duplicates from overlapping tiles are merged with NMS.
+#
+# Tiles only look for the small faces the full-frame pass cannot see: their
+# scale pyramid stops at the full-frame pass's minimum face size (mapped to
+# the tile's scale) instead of climbing to the whole upscaled tile, and
+# steps by tile_scale_factor (1.2) rather than 1.1. Seated students barely
+# move, so the tile pass runs only every tile_interval frames (5); frames
+# in between run the full-frame pass and reuse the last tiled small faces.
+#
+# This is not cheap. Measured on one CPU core with 640x480 synthetic noise
+# frames (a worst case for the cascade), 3x3 grid, back rows at 2x:
+#   full frame only                        ~22 fps
+#   tiles, unbounded pyramid, every frame  ~0.8 fps
+#   tiles, bounded pyramid, every frame    ~1.2 fps
+#   tiles, bounded pyramid, every 5 frames ~4.7 fps (stream average)
+# Most of the cost is the upscaled back rows searched down to 12 px faces.
+# Use it only for halls whose back-row faces fall below the full-frame
+# minSize, and give it more cores (max_workers) than this measurement had.
+
+
+def non_max_suppression(boxes, iou_threshold=0.3, containment_threshold=0.7):
+    """Greedy NMS over (x, y, w, h) boxes, larger boxes win.
+
+    A box is also dropped when most of it lies inside an already kept box,
+    which catches the partial faces cut by a tile border.
+    """
+    if len(boxes) == 0:
+        return np.empty((0, 4), dtype=int)
+
+    boxes = np.asarray(boxes, dtype=np.float32)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-areas)
+
+    keep = []
+    while len(order) > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.maximum(0, xx2 - xx1) * np.maximum(0, yy2 - yy1)
+
+        iou = inter / (areas[i] + areas[rest] - inter)
+        contained = inter / areas[rest]
+        order = rest[(iou <= iou_threshold) & (contained <= containment_threshold)]
+
+    return boxes[keep].astype(int)
+
+
+class TiledFaceDetector:
+    """Parallel, overlapping-tile Haar detection with a per-row scale schedule"""
+
+    def __init__(self, cascade_path=None, rows=3, cols=3, overlap=0.2,
+                 back_scale=2.0, front_scale=1.0, tile_min_size=(24, 24),
+                 full_frame_pass=True, full_frame_min_size=(80, 80),
+                 max_workers=4, iou_threshold=0.3, tile_scale_factor=1.2, tile_interval=5):
+        self.cascade_path = cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.rows = rows
+        self.cols = cols
+        self.overlap = overlap
+        # Row 0 (top of the image = back of the room) gets back_scale, the
+        # last row front_scale, rows in between are interpolated
+        self.row_scales = np.linspace(back_scale, front_scale, rows) if rows > 1 else np.array([front_scale])
+        self.tile_min_size = tile_min_size
+        self.full_frame_pass = full_frame_pass
+        self.full_frame_min_size = full_frame_min_size
+        self.iou_threshold = iou_threshold
+        self.tile_scale_factor = tile_scale_factor
+        self.tile_interval = max(1, tile_interval)
+        self._frames = 0
+        self._tile_faces = []  # Small faces from the last tiled frame
+
+        # CascadeClassifier is not safe to share between threads
+        self._local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tile-detect")
+        self.last_stats = {}
+
+    def _cascade(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            self._local.cascade = cascade
+        return cascade
+
+    def tiles(self, height, width):
+        """Overlapping tile rectangles (x0, y0, x1, y1, scale), back rows first"""
+        tile_h = height / (self.rows - (self.rows - 1) * self.overlap)
+        tile_w = width / (self.cols - (self.cols - 1) * self.overlap)
+        step_h = tile_h * (1 - self.overlap)
+        step_w = tile_w * (1 - self.overlap)
+
+        tiles = []
+        for r in range(self.rows):
+            y0 = int(round(r * step_h))
+            y1 = height if r == self.rows - 1 else min(height, int(round(y0 + tile_h)))
+            for c in range(self.cols):
+                x0 = int(round(c * step_w))
+                x1 = width if c == self.cols - 1 else min(width, int(round(x0 + tile_w)))
+                tiles.append((x0, y0, x1, y1, float(self.row_scales[r])))
+        return tiles
+
+    def _tile_max_size(self, scale):
+        """Largest face a tile looks for, in tile pixels: bigger ones are the full-frame pass's"""
+        if not self.full_frame_pass:
+            return ()
+        # Some headroom so faces just above the full-frame minimum are not missed by both passes
+        return tuple(int(np.ceil(side * scale * 1.25)) for side in self.full_frame_min_size)
+
+    def _detect_tile(self, gray, tile):
+        x0, y0, x1, y1, scale = tile
+        roi = gray[y0:y1, x0:x1]
+        if scale != 1.0:
+            roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+
+        faces = self._cascade().detectMultiScale(
+            roi,
+            scaleFactor=self.tile_scale_factor,
+            minNeighbors=5,
+            minSize=self.tile_min_size,
+            maxSize=self._tile_max_size(scale),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        if len(faces) == 0:
+            return []
+
+        # Back to frame coordinates
+        faces = np.asarray(faces, dtype=np.float32) / scale
+        faces[:, 0] += x0
+        faces[:, 1] += y0
+        return faces.tolist()
+
+    def _detect_full_frame(self, gray):
+        faces = self._cascade().detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=self.full_frame_min_size,
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        return [list(face) for face in faces]
+
+    def detect(self, frame):
+        """Detect faces on a BGR frame, returns an (N, 4) array of (x, y, w, h)"""
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        tiled = self._frames % self.tile_interval == 0 or not self.full_frame_pass
+        self._frames += 1
+        tiles = self.tiles(*gray.shape[:2]) if tiled else []
+
+        futures = [self.executor.submit(self._detect_tile, gray, tile) for tile in tiles]
+        full_frame = self.executor.submit(self._detect_full_frame, gray) if self.full_frame_pass else None
+
+        if tiled:
+            self._tile_faces = [face for future in futures for face in future.result()]
+        candidates = list(self._tile_faces)
+        if full_frame is not None:
+            candidates.extend(full_frame.result())
+
+        faces = non_max_suppression(candidates, self.iou_threshold)
+
+        self.last_stats = {
+            "tiled": tiled,
+            "tiles": len(tiles),
+            "candidates": len(candidates),
+            "faces": len(faces),
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+        return faces
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Department, Semester, Subject, Class, ClassStudent, TeacherAssignment,
     ClassSchedule, Session, Attendance, AttendanceChange,
-    AttendanceReport, FaceEmbedding, Notification
+    AttendanceReport, FaceEmbedding, Notification, Job
 )
 
 
@@ -158,3 +158,12 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'title', 'message')
     readonly_fields = ('created_at', 'read_at')
     date_hierarchy = 'created_at'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('kind', 'idempotency_key')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_by')
+    date_hierarchy = 'created_at'
@@ -0,0 +1,82 @@
+"""
+Low-attendance warnings driven by AttendanceReport counters.
+
+Reports only change when a session is finalized, so that is the only time
+warnings are evaluated (by the "reports.low_attendance" job queued after
+the session's rollup, see jobs.py). Each report remembers when its student
+was warned (`low_attendance_warned_at`): a warning is issued once when
+attendance drops below the threshold and the flag is cleared when it
+recovers, so the next drop warns again.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, ExpressionWrapper
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import AttendanceReport, Notification, Subject
+from .notifications import create_notifications
+
+DEFAULT_THRESHOLD = 75.0
+
+
+def get_threshold():
+    return float(getattr(settings, 'LOW_ATTENDANCE_THRESHOLD', DEFAULT_THRESHOLD))
+
+
+def attended_percentage_expression():
+    """Share of held classes attended, counting late arrivals as attended"""
+    return ExpressionWrapper(
+        Cast(F('present_count') + F('late_count'), FloatField()) * 100.0 / F('total_classes_held'),
+        output_field=FloatField()
+    )
+
+
+def evaluate_low_attendance(threshold=None, **report_filters):
+    """Issue warnings for reports that crossed below the threshold.
+
+    `report_filters` narrows the reports looked at (e.g. the subject, class
+    and semester of a session that was just finalized). Returns the number
+    of notifications created.
+    """
+    threshold = get_threshold() if threshold is None else threshold
+    reports = AttendanceReport.objects.filter(total_classes_held__gt=0, **report_filters).alias(
+        attended=attended_percentage_expression()
+    )
+
+    with transaction.atomic():
+        # Recovered students can be warned again on their next drop
+        reports.filter(attended__gte=threshold, low_attendance_warned_at__isnull=False).update(
+            low_attendance_warned_at=None
+        )
+
+        crossed = list(
+            reports.filter(attended__lt=threshold, low_attendance_warned_at__isnull=True)
+            .select_for_update()
+            .annotate(attended_percentage=attended_percentage_expression())
+            .values_list('id', 'student_id', 'subject_id', 'attended_percentage')
+        )
+        if not crossed:
+            return 0
+
+        AttendanceReport.objects.filter(id__in=[row[0] for row in crossed]).update(
+            low_attendance_warned_at=timezone.now()
+        )
+
+        subject_names = dict(
+            Subject.objects.filter(id__in={row[2] for row in crossed}).values_list('id', 'name')
+        )
+        create_notifications([
+            Notification(
+                user_id=student_id,
+                category='alert',
+                title='Low Attendance Warning',
+                message=(
+                    f'Your attendance in {subject_names[subject_id]} is {percentage:.1f}%, '
+                    f'below the required {threshold}%.'
+                ),
+            )
+            for _, student_id, subject_id, percentage in crossed
+        ])
+
+    return len(crossed)
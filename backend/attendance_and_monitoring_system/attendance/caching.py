@@ -0,0 +1,249 @@
+"""
+Cached read models for the attendance app.
+
+Values live in Django's cache framework under the "attendance:" prefix and
+are dropped by the model signals in signals.py when the rows they summarize
+change, so the timeouts only bound how long an entry may sit unused.
+
+CachedResponseMixin caches list/retrieve responses of a ViewSet. Entries are
+keyed by path, query params, the caller's scope and the current version of
+every model the endpoint reads; a save or delete on one of those models
+bumps its version, which orphans the old entries instead of hunting them
+down. The backend is any Django cache alias (RESPONSE_CACHE['ALIAS']):
+locmem in tests and development, Redis (or another shared cache) in
+production.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.response import Response
+
+from users.models import CustomUser
+from .models import Department, Class, Subject
+from .serializers import DepartmentSerializer
+
+DEPARTMENT_STATS_TIMEOUT = 60 * 60
+
+
+def _count_subquery(queryset):
+    """COUNT(*) of a queryset correlated on OuterRef('pk') via its department, as a scalar subquery"""
+    counts = queryset.filter(department=OuterRef('pk')).order_by().values('department').annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def department_stats_key(department_id):
+    return f'attendance:department-stats:{department_id}'
+
+
+def compute_department_statistics(department_id):
+    """Department statistics payload from one query (None if it does not exist)"""
+    department = Department.objects.select_related('hod').annotate(
+        total_classes=_count_subquery(Class.objects.all()),
+        total_subjects=_count_subquery(Subject.objects.all()),
+        total_students=_count_subquery(CustomUser.objects.filter(role='student')),
+        total_teachers=_count_subquery(CustomUser.objects.filter(role='teacher')),
+    ).filter(pk=department_id).first()
+    if department is None:
+        return None
+
+    return {
+        'department': DepartmentSerializer(department).data,
+        'total_classes': department.total_classes,
+        'total_subjects': department.total_subjects,
+        'total_students': department.total_students,
+        'total_teachers': department.total_teachers,
+        'computed_at': timezone.now().isoformat(),
+    }
+
+
+def get_department_statistics(department_id):
+    """Cached department statistics; computes and stores them on a miss"""
+    key = department_stats_key(department_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_department_statistics(department_id)
+        if stats is not None:
+            cache.set(key, stats, getattr(settings, 'DEPARTMENT_STATS_CACHE_TIMEOUT', DEPARTMENT_STATS_TIMEOUT))
+    return stats
+
+
+def invalidate_department_statistics(*department_ids):
+    """Drop the cached statistics once the current transaction commits (see bump_versions)"""
+    keys = [department_stats_key(department_id) for department_id in set(department_ids) if department_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# =======================
+# Response cache
+# =======================
+
+RESPONSE_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 30,
+}
+
+# Models whose writes bump response cache versions (labels as in Model._meta.label)
+VERSIONED_MODELS = set()
+
+
+def response_cache_settings():
+    return {**RESPONSE_CACHE_DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def response_cache():
+    return caches[response_cache_settings()['ALIAS']]
+
+
+def _version_key(label):
+    return f'attendance:response-version:{label}'
+
+
+def get_versions(labels):
+    """Current version of each model label, in one cache round trip"""
+    backend = response_cache()
+    keys = {label: _version_key(label) for label in labels}
+    found = backend.get_many(keys.values())
+    versions = {}
+    for label, key in keys.items():
+        if key not in found:
+            # Start from a fresh value so entries stored under an evicted
+            # version can never be matched again
+            backend.add(key, time.time_ns())
+            found[key] = backend.get(key)
+        versions[label] = found[key]
+    return versions
+
+
+def bump_versions(*labels):
+    """Invalidate every cached response that depends on these models.
+
+    The bump runs when the current transaction commits (at once outside a
+    transaction): bumping earlier would let a concurrent GET store the
+    pre-commit rows under the new version for the whole TIMEOUT.
+    """
+    transaction.on_commit(lambda: _bump_versions(labels))
+
+
+def _bump_versions(labels):
+    backend = response_cache()
+    for label in labels:
+        try:
+            backend.incr(_version_key(label))
+        except ValueError:
+            backend.set(_version_key(label), time.time_ns(), None)
+
+
+def _record(endpoint, outcome):
+    backend = response_cache()
+    for key in (f'attendance:response-metrics:{outcome}', f'attendance:response-metrics:{outcome}:{endpoint}'):
+        try:
+            backend.incr(key)
+        except ValueError:
+            backend.add(key, 1, None)
+
+
+def response_cache_metrics(endpoints):
+    """Hit/miss counters overall and for each endpoint name"""
+    backend = response_cache()
+    names = ['', *(f':{endpoint}' for endpoint in endpoints)]
+    keys = [f'attendance:response-metrics:{outcome}{name}' for name in names for outcome in ('hit', 'miss')]
+    values = backend.get_many(keys)
+
+    def counters(name):
+        hits = values.get(f'attendance:response-metrics:hit{name}', 0)
+        misses = values.get(f'attendance:response-metrics:miss{name}', 0)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+    return {
+        **counters(''),
+        'endpoints': {endpoint: counters(f':{endpoint}') for endpoint in endpoints},
+    }
+
+
+def user_scope(user):
+    """Part of the cache key that captures what a user may see.
+
+    Admins all see the same rows; every other role is filtered by its own
+    id and department in get_queryset(), so the key includes both.
+    """
+    if user.role == 'admin':
+        return 'admin'
+    return f'{user.role}:{user.department_id}:{user.pk}'
+
+
+class CachedResponseMixin:
+    """Cache GET responses of the actions in `cache_actions`.
+
+    `cache_models` lists the model labels the endpoint reads (its own model,
+    annotated/related tables and the tables its get_queryset() filters on).
+    Authentication, permissions and throttling still run on every request;
+    only the queryset and serializer work is skipped on a hit.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_models = ()
+
+    # "ViewSet.action" names of every cached endpoint, for the metrics
+    endpoints = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        VERSIONED_MODELS.update(cls.cache_models)
+        CachedResponseMixin.endpoints.extend(
+            f'{cls.__name__}.{action}' for action in cls.cache_actions
+            if f'{cls.__name__}.{action}' not in CachedResponseMixin.endpoints
+        )
+
+    def response_cache_key(self, request):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        versions = get_versions(self.cache_models)
+        raw = '|'.join([
+            request.path, params, user_scope(request.user),
+            *(f'{label}={versions[label]}' for label in sorted(versions)),
+        ])
+        return 'attendance:response:' + hashlib.sha256(raw.encode()).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Runs after authentication/permission checks: route the GET handler
+        # (list, retrieve or a detail/list @action) through the cache
+        if request.method == 'GET' and self.action in self.cache_actions and response_cache_settings()['ENABLED']:
+            handler = self.get
+            self.get = lambda request, *args, **kwargs: self._cached(handler, request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        outcome = getattr(request, '_response_cache_outcome', None)
+        if outcome:
+            response['X-Cache'] = outcome.upper()
+        return response
+
+    def _cached(self, handler, request, *args, **kwargs):
+        endpoint = f'{type(self).__name__}.{self.action}'
+        key = self.response_cache_key(request)
+        backend = response_cache()
+
+        data = backend.get(key)
+        if data is not None:
+            _record(endpoint, 'hit')
+            request._response_cache_outcome = 'hit'
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        _record(endpoint, 'miss')
+        request._response_cache_outcome = 'miss'
+        # Streaming responses (e.g. ?stream=1) have no data to store
+        if response.status_code == 200 and isinstance(response, Response):
+            backend.set(key, response.data, response_cache_settings()['TIMEOUT'])
+        return response
@@ -0,0 +1,130 @@
+"""
+Attendance exports.
+
+Rows are produced by generators over a single values() query read with
+.iterator(), so memory stays flat whatever the size of the export:
+
+- "long": one line per attendance record
+- "wide": one line per student and one column per session (P / A / L),
+  built from rows ordered by student, holding only the current student
+
+CSV is streamed straight to the client. XLSX (needs openpyxl) is written
+in write-only mode to a temporary file and then streamed from disk.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+
+from .models import Session
+
+EXPORT_LAYOUTS = ('long', 'wide')
+EXPORT_FORMATS = ('csv', 'xlsx')
+CHUNK_SIZE = 2000
+
+STATUS_CODES = {'present': 'P', 'absent': 'A', 'late': 'L'}
+
+LONG_COLUMNS = [
+    ('session_id', 'Session'),
+    ('session__start_time', 'Session start'),
+    ('session__subject__code', 'Subject'),
+    ('session__class_assigned__name', 'Class'),
+    ('session__class_assigned__section', 'Section'),
+    ('student__username', 'Username'),
+    ('student__first_name', 'First name'),
+    ('student__last_name', 'Last name'),
+    ('status', 'Status'),
+    ('marked_at', 'Marked at'),
+    ('late_entry_time', 'Late entry'),
+    ('confidence_score', 'Confidence'),
+]
+
+
+def _cell(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def long_rows(queryset):
+    """Header, then one row per attendance record"""
+    yield [label for _, label in LONG_COLUMNS]
+    fields = [field for field, _ in LONG_COLUMNS]
+    rows = queryset.order_by('session__start_time', 'session_id', 'student__username').values_list(*fields)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [_cell(value) for value in row]
+
+
+def wide_rows(queryset):
+    """Header, then one row per student with a status code per session"""
+    sessions = list(
+        Session.objects.filter(id__in=queryset.values('session_id'))
+        .order_by('start_time', 'id')
+        .values_list('id', 'start_time', 'subject__code')
+    )
+    column = {session_id: index for index, (session_id, _, _) in enumerate(sessions)}
+    yield ['Username', 'First name', 'Last name'] + [
+        f'{code} {start:%Y-%m-%d %H:%M}' for _, start, code in sessions
+    ] + ['Present', 'Late', 'Absent']
+
+    rows = queryset.order_by('student__username', 'student_id').values_list(
+        'student_id', 'student__username', 'student__first_name', 'student__last_name', 'session_id', 'status'
+    )
+    current, line = None, None
+
+    def finish(line):
+        cells = line[3:]
+        return line + [cells.count('P'), cells.count('L'), cells.count('A')]
+
+    for student_id, username, first_name, last_name, session_id, status in rows.iterator(chunk_size=CHUNK_SIZE):
+        if student_id != current:
+            if line is not None:
+                yield finish(line)
+            current = student_id
+            line = [username, first_name, last_name] + [''] * len(sessions)
+        line[3 + column[session_id]] = STATUS_CODES.get(status, status)
+    if line is not None:
+        yield finish(line)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename):
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(rows, filename):
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ImportError("XLSX export needs openpyxl: pip install openpyxl") from e
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Attendance')
+    for row in rows:
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_response(queryset, layout='long', file_format='csv', filename='attendance'):
+    rows = wide_rows(queryset) if layout == 'wide' else long_rows(queryset)
+    if file_format == 'xlsx':
+        return xlsx_response(rows, filename)
+    return csv_response(rows, filename)
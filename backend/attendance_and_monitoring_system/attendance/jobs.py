@@ -0,0 +1,273 @@
+"""
+Database-backed background jobs.
+
+Heavy work (low-attendance warnings when a session ends, bulk report
+rebuilds) is written to the Job table instead of running in the request,
+and `python manage.py run_jobs` workers execute it:
+
+- enqueue() inserts the job in the caller's transaction, so work is never
+  lost or run for a rolled-back write. An idempotency key returns the
+  existing job instead of adding a second one; keys are scoped to the
+  creating user and the job kind.
+- Workers claim the oldest due job with SELECT ... FOR UPDATE SKIP LOCKED
+  plus a conditional status update, so several workers never run the same
+  job (the update alone is enough on SQLite, which has no row locks).
+- A handler runs in a transaction together with its "succeeded" update.
+  Failures are retried with exponential backoff until max_attempts; jobs
+  left running by a dead worker are requeued after STALE_AFTER seconds.
+
+Queueing is opt-in: unless settings.BACKGROUND_JOBS['ENABLED'] is set (env
+BACKGROUND_JOBS_ENABLED=True, with at least one run_jobs worker running),
+jobs run inline. Inline mode is synchronous: the job still runs in the
+request that enqueued it, only after the caller's transaction commits (so
+outside any row locks it holds), and a failure marks the job failed at once
+because no worker exists to retry it.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_JOBS_DEFAULTS = {
+    'ENABLED': False,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF': 30,  # seconds, doubled on every further attempt
+    'STALE_AFTER': 600,
+    'POLL_INTERVAL': 2,
+}
+
+HANDLERS = {}
+
+
+def background_jobs_settings():
+    return {**BACKGROUND_JOBS_DEFAULTS, **getattr(settings, 'BACKGROUND_JOBS', {})}
+
+
+def job_handler(kind):
+    """Register a function as the handler of a job kind; its return value is stored as the result"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# =======================
+# Enqueueing
+# =======================
+
+def scoped_idempotency_key(kind, idempotency_key, created_by=None):
+    """Stored form of a key: the same key from another user or for another kind is another job"""
+    owner = created_by.pk if created_by is not None else '-'
+    return f'{owner}:{kind}:{idempotency_key}'
+
+
+def enqueue(kind, payload=None, idempotency_key=None, created_by=None, max_attempts=None):
+    """Queue a job and return it; the caller's existing job is returned for a known idempotency key"""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+
+    config = background_jobs_settings()
+    if idempotency_key:
+        idempotency_key = scoped_idempotency_key(kind, idempotency_key, created_by)
+        existing = Job.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing
+
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(
+                kind=kind,
+                payload=payload or {},
+                idempotency_key=idempotency_key or None,
+                created_by=created_by,
+                max_attempts=max_attempts or config['MAX_ATTEMPTS'],
+            )
+    except IntegrityError:
+        # Another request enqueued the same key in the meantime
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+    if not config['ENABLED']:
+        # Runs immediately outside an atomic block, otherwise once the caller commits
+        transaction.on_commit(lambda: run_job(claim_job(pk=job.pk, worker='inline'), retry=False))
+        job.refresh_from_db()
+    return job
+
+
+# =======================
+# Running (workers)
+# =======================
+
+def claim_job(worker=None, kinds=None, pk=None):
+    """Mark the oldest due job as running and return it, or None if there is none"""
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = Job.objects.select_for_update(skip_locked=True).filter(status='queued', run_after__lte=now)
+        if pk is not None:
+            candidates = candidates.filter(pk=pk)
+        if kinds:
+            candidates = candidates.filter(kind__in=kinds)
+        job = candidates.order_by('run_after', 'id').first()
+        if job is None:
+            return None
+
+        claimed = Job.objects.filter(pk=job.pk, status='queued').update(
+            status='running', attempts=job.attempts + 1, locked_by=worker or worker_name(), started_at=now
+        )
+        if not claimed:
+            return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job, retry=True):
+    """Execute a claimed job and record its outcome; returns the final status
+
+    With retry=False (inline mode) a failure is final instead of requeued.
+    """
+    if job is None:
+        return None
+
+    try:
+        with transaction.atomic():
+            result = HANDLERS[job.kind](**job.payload)
+            Job.objects.filter(pk=job.pk).update(
+                status='succeeded', result=result, last_error='', finished_at=timezone.now()
+            )
+        return 'succeeded'
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.kind, job.attempts)
+        error = traceback.format_exc()
+
+    now = timezone.now()
+    if not retry or job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(status='failed', last_error=error, finished_at=now)
+        return 'failed'
+
+    backoff = background_jobs_settings()['RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+    Job.objects.filter(pk=job.pk).update(
+        status='queued', last_error=error, locked_by='', run_after=now + timedelta(seconds=backoff)
+    )
+    return 'queued'
+
+
+def requeue_stale(stale_after=None):
+    """Give jobs left running by a dead worker back to the queue (or fail them)"""
+    stale_after = background_jobs_settings()['STALE_AFTER'] if stale_after is None else stale_after
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status='running', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Worker stopped while running the job', finished_at=timezone.now()
+    )
+    requeued = stale.update(status='queued', locked_by='', run_after=timezone.now())
+    return requeued + failed
+
+
+def run_pending(worker=None, kinds=None, limit=None):
+    """Run due jobs until none is left (or `limit` ran); returns the number run"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job(worker=worker, kinds=kinds)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(kinds=None, poll_interval=None, stop=lambda: False):
+    """Worker loop used by `manage.py run_jobs`"""
+    worker = worker_name()
+    poll_interval = background_jobs_settings()['POLL_INTERVAL'] if poll_interval is None else poll_interval
+    while not stop():
+        requeue_stale()
+        if not run_pending(worker=worker, kinds=kinds, limit=100):
+            time.sleep(poll_interval)
+
+
+# =======================
+# Metrics
+# =======================
+
+def job_metrics(window=timedelta(hours=1)):
+    """Queue depth per kind and wait / run times of the jobs finished within `window`"""
+    now = timezone.now()
+    by_kind = {}
+    depth = Job.objects.values('kind').annotate(
+        queued=Count('id', filter=Q(status='queued')),
+        due=Count('id', filter=Q(status='queued', run_after__lte=now)),
+        running=Count('id', filter=Q(status='running')),
+        failed=Count('id', filter=Q(status='failed')),
+        oldest_due=Min('run_after', filter=Q(status='queued', run_after__lte=now)),
+    ).order_by('kind')
+    for row in depth:
+        kind = row.pop('kind')
+        oldest = row.pop('oldest_due')
+        by_kind[kind] = {
+            **row,
+            'oldest_due_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+            'finished': 0, 'wait_ms_avg': None, 'run_ms_avg': None, 'run_ms_max': None,
+        }
+
+    finished = Job.objects.filter(
+        status__in=('succeeded', 'failed'), finished_at__gte=now - window
+    ).values_list('kind', 'created_at', 'started_at', 'finished_at')
+    timings = {}
+    for kind, created_at, started_at, finished_at in finished.iterator():
+        waits, runs = timings.setdefault(kind, ([], []))
+        waits.append((started_at - created_at).total_seconds() * 1000)
+        runs.append((finished_at - started_at).total_seconds() * 1000)
+    for kind, (waits, runs) in timings.items():
+        by_kind.setdefault(kind, {}).update({
+            'finished': len(runs),
+            'wait_ms_avg': round(sum(waits) / len(waits), 1),
+            'run_ms_avg': round(sum(runs) / len(runs), 1),
+            'run_ms_max': round(max(runs), 1),
+        })
+
+    return {
+        'queued': sum(kind.get('queued', 0) for kind in by_kind.values()),
+        'running': sum(kind.get('running', 0) for kind in by_kind.values()),
+        'failed': sum(kind.get('failed', 0) for kind in by_kind.values()),
+        'window_seconds': int(window.total_seconds()),
+        'kinds': by_kind,
+    }
+
+
+# =======================
+# Handlers
+# =======================
+
+@job_handler('reports.low_attendance')
+def low_attendance_job(threshold=None, **report_filters):
+    from .alerts import evaluate_low_attendance
+
+    return {'warnings_created': evaluate_low_attendance(threshold=threshold, **report_filters)}
+
+
+@job_handler('reports.rebuild')
+def rebuild_reports_job(**scope):
+    from .reports import rebuild_reports
+
+    started = time.perf_counter()
+    result = rebuild_reports(**scope)
+    return {
+        'scope': scope,
+        **result,
+        'rows_touched': result['created'] + result['updated'] + result['deleted'],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,378 @@
+"""
+Live updates pushed to dashboards over Server-Sent Events.
+
+Views call publish_event() when attendance is marked, a session starts or
+ends, or a change is approved. Events are delivered after the transaction
+commits to every subscriber of the event's topics: "session:<id>",
+"class:<id>" and "department:<id>".
+
+Dashboards connect to LIVE_UPDATES_PATH (served from asgi.py, not the
+Django URLconf, so it needs an ASGI server such as uvicorn; runserver
+never serves it) with an EventSource:
+
+    /api/live/?token=<access token>&session=12&class=3&department=1
+
+Cross-origin dashboards are allowed by the same CORS settings as the API.
+
+The broker is chosen by settings.LIVE_UPDATES['BROKER']:
+- "memory": in-process fan-out, for tests and single-worker deployments
+- "redis": Redis pub/sub (needs the `redis` package), so events published
+  by any worker reach subscribers connected to any other worker
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from .models import Class, ClassStudent, Session
+
+logger = logging.getLogger(__name__)
+
+LIVE_UPDATES_PATH = '/api/live/'
+TOPIC_KINDS = ('session', 'class', 'department')
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 1000
+
+
+def live_updates_settings():
+    return {'BROKER': 'memory', 'REDIS_URL': 'redis://localhost:6379/0', **getattr(settings, 'LIVE_UPDATES', {})}
+
+
+def topics_for(session_id=None, class_id=None, department_id=None):
+    topics = []
+    for kind, value in (('session', session_id), ('class', class_id), ('department', department_id)):
+        if value:
+            topics.append(f'{kind}:{value}')
+    return topics
+
+
+# =======================
+# Brokers
+# =======================
+
+class Subscription:
+    """Queue of the events published to a set of topics, owned by one connection"""
+
+    def __init__(self, topics, on_close=None):
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._on_close = on_close
+        self._seen = deque(maxlen=256)  # an event published to two subscribed topics arrives once
+
+    def deliver(self, message):
+        """Thread-safe: called from whichever thread published the event"""
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if message['id'] in self._seen:
+            return
+        self._seen.append(message['id'])
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning('Live update subscriber is too slow, dropping %s', message['type'])
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        if self._on_close:
+            await self._on_close(self)
+
+
+class InMemoryBroker:
+    """Fan-out inside one process"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, topics, message):
+        with self._lock:
+            subscribers = set().union(*(self._subscribers.get(topic, ()) for topic in topics))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    async def subscribe(self, topics):
+        subscription = Subscription(topics, on_close=self._unsubscribe)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    async def _unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers[topic].discard(subscription)
+                if not self._subscribers[topic]:
+                    del self._subscribers[topic]
+
+
+class RedisBroker:
+    """Redis pub/sub, shared by every worker pointing at the same server"""
+
+    channel_prefix = 'attendance:live:'
+
+    def __init__(self, url):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as e:
+            raise ImportError("LIVE_UPDATES['BROKER'] = 'redis' needs the redis package: pip install redis") from e
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self._async_redis = redis.asyncio
+
+    def publish(self, topics, message):
+        data = json.dumps(message)
+        for topic in topics:
+            self.client.publish(self.channel_prefix + topic, data)
+
+    async def subscribe(self, topics):
+        connection = self._async_redis.Redis.from_url(self.url)
+        pubsub = connection.pubsub()
+        await pubsub.subscribe(*(self.channel_prefix + topic for topic in topics))
+
+        async def close(subscription):
+            reader.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.close()
+            await connection.close()
+
+        subscription = Subscription(topics, on_close=close)
+
+        async def read():
+            async for item in pubsub.listen():
+                if item['type'] == 'message':
+                    subscription._put(json.loads(item['data']))
+
+        reader = asyncio.create_task(read())
+        return subscription
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            config = live_updates_settings()
+            if config['BROKER'] == 'redis':
+                _broker = RedisBroker(config['REDIS_URL'])
+            elif config['BROKER'] == 'memory':
+                _broker = InMemoryBroker()
+            else:
+                raise ValueError(f"Unknown LIVE_UPDATES broker: {config['BROKER']}")
+        return _broker
+
+
+def reset_broker():
+    """Forget the broker so the next get_broker() reads the settings again (tests)"""
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+# =======================
+# Publishing (sync, from views)
+# =======================
+
+def publish_event(event_type, data, session_id=None, class_id=None, department_id=None):
+    """Push an event to the scoped topics once the current transaction commits"""
+    topics = topics_for(session_id, class_id, department_id)
+    if not topics:
+        return
+    message = {
+        'id': uuid.uuid4().hex,
+        'type': event_type,
+        'at': timezone.now().isoformat(),
+        'topics': topics,
+        'data': data,
+    }
+
+    def send():
+        try:
+            get_broker().publish(topics, message)
+        except Exception:
+            # Live updates are best effort; the write already succeeded
+            logger.exception('Could not publish %s', event_type)
+
+    transaction.on_commit(send)
+
+
+def publish_session_event(event_type, session, **data):
+    publish_event(
+        event_type,
+        {'session_id': session.id, **data},
+        session_id=session.id,
+        class_id=session.class_assigned_id,
+        department_id=session.department_id,
+    )
+
+
+# =======================
+# Subscribing (ASGI)
+# =======================
+
+def authenticate_token(token):
+    """User for a simplejwt access token, or None"""
+    try:
+        user_id = AccessToken(token)['user_id']
+    except (TokenError, KeyError):
+        return None
+    return CustomUser.objects.filter(pk=user_id, is_active=True).first()
+
+
+def authorize_topics(user, requested):
+    """Whether the user may follow every requested (kind, id) pair.
+
+    Admins see everything, HODs and teachers their department's classes
+    and sessions, students the classes they are enrolled in and their
+    sessions.
+    """
+    ids = defaultdict(set)
+    for kind, value in requested:
+        ids[kind].add(value)
+
+    if user.role == 'admin':
+        return True
+
+    if user.role in ('hod', 'teacher'):
+        if not user.department_id:
+            return False
+        if ids['department'] - {user.department_id}:
+            return False
+        if len(ids['class']) != Class.objects.filter(id__in=ids['class'], department_id=user.department_id).count():
+            return False
+        return len(ids['session']) == Session.objects.filter(
+            id__in=ids['session'], department_id=user.department_id
+        ).count()
+
+    if user.role == 'student':
+        if ids['department']:
+            return False
+        enrolled = ClassStudent.objects.filter(student=user, enrollment_status='active')
+        if len(ids['class']) != enrolled.filter(class_assigned_id__in=ids['class']).count():
+            return False
+        return len(ids['session']) == Session.objects.filter(
+            id__in=ids['session'], class_assigned_id__in=enrolled.values('class_assigned_id')
+        ).count()
+
+    return False
+
+
+def parse_topics(query_string):
+    """(token, [(kind, id), ...]) from the query string, or raise ValueError"""
+    params = parse_qs(query_string.decode())
+    token = (params.get('token') or [None])[0]
+    requested = []
+    for kind in TOPIC_KINDS:
+        for value in params.get(kind, []):
+            for part in value.split(','):
+                if part:
+                    requested.append((kind, int(part)))
+    return token, requested
+
+
+def cors_headers(scope):
+    """CORS response headers for the request's Origin.
+
+    This app runs before Django, so django-cors-headers never sees its
+    requests; the same settings (CORS_ALLOWED_ORIGINS, CORS_ALLOW_ALL_ORIGINS,
+    CORS_ALLOW_CREDENTIALS) are applied here instead.
+    """
+    origin = dict(scope.get('headers') or []).get(b'origin')
+    if not origin:
+        return []
+    allow_all = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+    if not allow_all and origin.decode('latin-1') not in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+        return [(b'vary', b'Origin')]
+    headers = [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def _respond(scope, send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *cors_headers(scope)],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+def format_event(message):
+    return (
+        f"id: {message['id']}\n"
+        f"event: {message['type']}\n"
+        f"data: {json.dumps(message)}\n\n"
+    ).encode()
+
+
+async def live_updates_application(scope, receive, send):
+    """ASGI app streaming events for the requested topics as text/event-stream"""
+    if scope['method'] != 'GET':
+        return await _respond(scope, send, 405, {'error': 'Method not allowed'})
+
+    try:
+        token, requested = parse_topics(scope.get('query_string', b''))
+    except ValueError:
+        return await _respond(scope, send, 400, {'error': 'session, class and department must be integer ids'})
+    if not requested:
+        return await _respond(scope, send, 400, {'error': 'Subscribe to at least one session, class or department'})
+
+    user = await sync_to_async(authenticate_token)(token) if token else None
+    if user is None:
+        return await _respond(scope, send, 401, {'error': 'A valid access token is required'})
+    if not await sync_to_async(authorize_topics)(user, requested):
+        return await _respond(scope, send, 403, {'error': 'Permission denied'})
+
+    subscription = await get_broker().subscribe([f'{kind}:{value}' for kind, value in requested])
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            *cors_headers(scope),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 5000\n: connected\n\n', 'more_body': True})
+
+    disconnect = asyncio.ensure_future(receive())
+    try:
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {message, disconnect}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                if disconnect.result()['type'] == 'http.disconnect':
+                    message.cancel()
+                    break
+                disconnect = asyncio.ensure_future(receive())
+            if message in done:
+                await send({'type': 'http.response.body', 'body': format_event(message.result()), 'more_body': True})
+            else:
+                message.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+    finally:
+        disconnect.cancel()
+        await subscription.close()
@@ -0,0 +1,153 @@
+import json
+import math
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from attendance.models import Attendance, Class, ClassStudent, Department, Semester, Session, Subject
+from attendance.reports import rebuild_reports
+from attendance.views import AttendanceReportViewSet, AttendanceViewSet, SessionViewSet
+from users.models import CustomUser
+
+STUDENTS = 50
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the model serializers against the lean values() serializers used by the attendance, '
+        'session and report lists, on synthetic data that is rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Attendance and report rows to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per serializer; the fastest is kept')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                admin = self.seed(options['rows'])
+                request = SimpleNamespace(user=admin, query_params={})
+                for name, viewset_class in [
+                    ('attendance', AttendanceViewSet),
+                    ('sessions', SessionViewSet),
+                    ('attendance-reports', AttendanceReportViewSet),
+                ]:
+                    queryset = viewset_class(request=request, action='list').get_queryset()
+                    results.append(self.compare(name, queryset, viewset_class, options['repeat']))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'list':<20}{'rows':>7}{'model us/row':>14}{'lean us/row':>13}"
+            f"{'serialize x':>13}{'end-to-end x':>14}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['list']:<20}{result['rows']:>7}{result['model']['us_per_row']:>14}"
+                f"{result['lean']['us_per_row']:>13}{result['serialize_speedup']:>12}x"
+                f"{result['speedup']:>13}x"
+            )
+
+    def seed(self, rows):
+        """STUDENTS students, one finalized session (and subject) per STUDENTS attendance rows"""
+        sessions = max(1, math.ceil(rows / STUDENTS))
+        hod = CustomUser.objects.create(username='bench_hod', role='hod', first_name='Bench', last_name='Hod')
+        admin = CustomUser.objects.create(username='bench_admin', role='admin')
+        teacher = CustomUser.objects.create(username='bench_teacher', role='teacher', first_name='Bench', last_name='Teacher')
+        department = Department.objects.create(name='Benchmark', code='BENCH', hod=hod)
+        semester = Semester.objects.create(
+            number=1, department=department, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        klass = Class.objects.create(name='BENCH', section='A', department=department, semester=semester)
+        students = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench_student{i}', role='student', first_name=f'Student{i}', last_name='Bench',
+                       department=department, semester=semester)
+            for i in range(STUDENTS)
+        ])
+        ClassStudent.objects.bulk_create([ClassStudent(student=student, class_assigned=klass) for student in students])
+        subjects = Subject.objects.bulk_create([
+            Subject(name=f'Benchmark {i}', code=f'BENCH{i}', department=department, semester=semester)
+            for i in range(sessions)
+        ])
+
+        now = timezone.now()
+        created = Session.objects.bulk_create([
+            Session(
+                teacher=teacher, subject=subject, class_assigned=klass, department=department,
+                start_time=now - timedelta(days=i), end_time=now - timedelta(days=i) + timedelta(hours=1),
+                is_active=False, attendance_finalized=True, total_students=STUDENTS,
+            )
+            for i, subject in enumerate(subjects)
+        ])
+        statuses = ('present', 'present', 'present', 'absent', 'late')
+        Attendance.objects.bulk_create([
+            Attendance(
+                student=student, session=session, status=statuses[(i + j) % len(statuses)], marked_by=teacher,
+                marked_at=session.start_time, confidence_score=0.9,
+            )
+            for i, session in enumerate(created)
+            for j, student in enumerate(students)
+        ], batch_size=1000)
+        rebuild_reports(class_id=klass.id)
+        return admin
+
+    def compare(self, name, queryset, viewset_class, repeat):
+        model_serializer = viewset_class.serializer_class
+        lean_serializer = viewset_class.lean_serializer_class
+
+        def model():
+            rows = list(queryset.all())  # a fresh clone: no result cache between runs
+            started = time.perf_counter()
+            model_serializer(rows, many=True).data
+            return rows, started
+
+        def lean():
+            rows = list(lean_serializer.values(queryset))
+            started = time.perf_counter()
+            lean_serializer(rows).data
+            return rows, started
+
+        model_timing = self.time(model, repeat)
+        lean_timing = self.time(lean, repeat)
+        return {
+            'list': name,
+            'rows': model_timing['rows'],
+            'model': model_timing,
+            'lean': lean_timing,
+            'serialize_speedup': round(model_timing['serialize_ms'] / max(lean_timing['serialize_ms'], 0.001), 1),
+            'speedup': round(model_timing['total_ms'] / max(lean_timing['total_ms'], 0.001), 1),
+        }
+
+    def time(self, run, repeat):
+        """Fastest of `repeat` runs, split into fetching rows and serializing them"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows, serialize_started = run()
+            finished = time.perf_counter()
+            timing = (finished - started, finished - serialize_started, len(rows))
+            if best is None or timing[0] < best[0]:
+                best = timing
+        total, serialize, rows = best
+        return {
+            'rows': rows,
+            'total_ms': round(total * 1000, 2),
+            'fetch_ms': round((total - serialize) * 1000, 2),
+            'serialize_ms': round(serialize * 1000, 2),
+            'us_per_row': round(total * 1_000_000 / max(rows, 1), 1),
+        }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from attendance.alerts import evaluate_low_attendance, get_threshold
+
+
+class Command(BaseCommand):
+    help = 'Issue low attendance warnings for every report below the threshold (once per crossing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, help='Percentage (defaults to LOW_ATTENDANCE_THRESHOLD)')
+        parser.add_argument('--subject', type=int, help='Only reports of this subject id')
+        parser.add_argument('--class', dest='class_id', type=int, help='Only reports of this class id')
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['subject']:
+            filters['subject_id'] = options['subject']
+        if options['class_id']:
+            filters['class_assigned_id'] = options['class_id']
+
+        threshold = options['threshold'] if options['threshold'] is not None else get_threshold()
+        created = evaluate_low_attendance(threshold=threshold, **filters)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} low attendance warning(s) (threshold {threshold}%)'))
@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from attendance.jobs import HANDLERS, requeue_stale, run_pending, work
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (report rollups, warnings, report rebuilds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due, then exit')
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(HANDLERS), help='Only these job kinds')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            requeue_stale()
+            count = run_pending(kinds=options['kinds'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} job(s)'))
+            return
+
+        stopping = []
+
+        def stop(signum, frame):
+            # Finish the current job, then leave the loop
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write('Waiting for jobs (Ctrl-C to stop)')
+        work(kinds=options['kinds'], poll_interval=options['poll_interval'], stop=lambda: bool(stopping))
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
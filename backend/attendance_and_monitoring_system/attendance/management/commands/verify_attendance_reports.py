@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from attendance.reports import diff_reports, rebuild_reports
+
+
+class Command(BaseCommand):
+    help = 'Compare AttendanceReport rows with the attendance they summarize; --rebuild repairs drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--department', type=int, help='Only classes of this department id')
+        parser.add_argument('--semester', type=int, help='Only classes of this semester id')
+        parser.add_argument('--class', dest='class_id', type=int, help='Only this class id')
+        parser.add_argument('--subject', type=int, help='Only this subject id')
+        parser.add_argument('--rebuild', action='store_true', help='Rewrite drifted reports from attendance')
+        parser.add_argument('--show', type=int, default=20, help='How many drifted reports to list')
+
+    def handle(self, *args, **options):
+        scope = {
+            'department_id': options['department'],
+            'semester_id': options['semester'],
+            'class_id': options['class_id'],
+            'subject_id': options['subject'],
+        }
+
+        expected, missing, stale, orphaned = diff_reports(**scope)
+        self.stdout.write(
+            f'{len(expected)} expected report(s): {len(missing)} missing, '
+            f'{len(stale)} stale, {len(orphaned)} without finalized attendance'
+        )
+        for report_id, (key, stored, actual) in list(stale.items())[:options['show']]:
+            self.stdout.write(f'  report {report_id} {key}: stored {stored} != actual {actual}')
+        for key in missing[:options['show']]:
+            self.stdout.write(f'  missing {key}: {expected[key]}')
+
+        drifted = bool(missing or stale or orphaned)
+        if options['rebuild'] and drifted:
+            result = rebuild_reports(**scope)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt: {result['created']} created, {result['updated']} updated, {result['deleted']} deleted"
+            ))
+        elif drifted:
+            self.stdout.write(self.style.WARNING('Reports have drifted; run with --rebuild to repair'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Reports are up to date'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_alter_department_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancereport',
+            name='low_attendance_warned_at',
+            field=models.DateTimeField(blank=True, help_text='When the student was last warned; cleared once attendance recovers', null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_attendancereport_low_attendance_warned_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['marked_at', 'id'], name='attendance__marked__6fec3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancechange',
+            index=models.Index(fields=['changed_at', 'id'], name='attendance__changed_7a7adc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='attendance__user_id_37d004_idx'),
+        ),
+    ]
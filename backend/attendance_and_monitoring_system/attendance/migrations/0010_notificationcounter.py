@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Notification = apps.get_model('attendance', 'Notification')
+    NotificationCounter = apps.get_model('attendance', 'NotificationCounter')
+    unread = (
+        Notification.objects.filter(is_read=False)
+        .values('user_id').annotate(unread=models.Count('id')).order_by()
+    )
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=row['user_id'], unread=row['unread']) for row in unread.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_customuser_semester'),
+        ('attendance', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def relabel_report_semesters(apps, schema_editor):
+    """Move reports to the semester label rollups now use (the class's semester number).
+
+    Reports used to be keyed by str(Semester) ("CE - Semester 1 (2024-2025)")
+    or by whatever label a client passed to regenerate, so a student could
+    have an old-label row next to one created since the change. Rows with
+    another label are removed and their key is recomputed from attendance of
+    finalized sessions, which merges both rows without counting a session
+    twice.
+    """
+    AttendanceReport = apps.get_model('attendance', 'AttendanceReport')
+    Attendance = apps.get_model('attendance', 'Attendance')
+    Class = apps.get_model('attendance', 'Class')
+
+    labels = {
+        class_id: str(number) if number is not None else ''
+        for class_id, number in Class.objects.values_list('id', 'semester__number')
+    }
+
+    stale_ids = []
+    warned = {}  # (subject_id, class_id) -> {student_id: warned_at}
+    for report in AttendanceReport.objects.order_by('id').iterator():
+        if report.semester == labels.get(report.class_assigned_id, ''):
+            continue
+        stale_ids.append(report.id)
+        students = warned.setdefault((report.subject_id, report.class_assigned_id), {})
+        students[report.student_id] = students.get(report.student_id) or report.low_attendance_warned_at
+    if not stale_ids:
+        return
+
+    AttendanceReport.objects.filter(id__in=stale_ids).delete()
+
+    for (subject_id, class_id), students in warned.items():
+        label = labels.get(class_id, '')
+        counts = defaultdict(lambda: {'total': 0, 'present': 0, 'absent': 0, 'late': 0})
+        rows = (
+            Attendance.objects.filter(
+                student_id__in=students, session__subject_id=subject_id,
+                session__class_assigned_id=class_id, session__attendance_finalized=True,
+            )
+            .values('student_id')
+            .annotate(
+                total=Count('id'),
+                present=Count('id', filter=Q(status='present')),
+                absent=Count('id', filter=Q(status='absent')),
+                late=Count('id', filter=Q(status='late')),
+            )
+            .order_by()
+        )
+        for row in rows:
+            counts[row['student_id']] = row
+
+        for student_id, warned_at in students.items():
+            row = counts[student_id]
+            if not row['total']:
+                AttendanceReport.objects.filter(
+                    student_id=student_id, subject_id=subject_id, class_assigned_id=class_id, semester=label
+                ).delete()
+                continue
+            report, _ = AttendanceReport.objects.update_or_create(
+                student_id=student_id, subject_id=subject_id, class_assigned_id=class_id, semester=label,
+                defaults={
+                    'total_classes_held': row['total'],
+                    'present_count': row['present'],
+                    'absent_count': row['absent'],
+                    'late_count': row['late'],
+                    'percentage': row['present'] / row['total'] * 100,
+                },
+            )
+            if warned_at and report.low_attendance_warned_at is None:
+                report.low_attendance_warned_at = warned_at
+                report.save(update_fields=['low_attendance_warned_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(relabel_report_semesters, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 
 # --- Updated Models for Khwopa Engineering College Scenario ---
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -247,11 +248,17 @@ class Attendance(models.Model):
             models.Index(fields=['student']),
             models.Index(fields=['session']),
             models.Index(fields=['status']),
+            models.Index(fields=['marked_at', 'id']),  # keyset pagination
         ]
 
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.session.subject.code} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        # Report deltas are applied by post_save (see signals.py); keep them in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class AttendanceChange(models.Model):
     attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, related_name='changes')
     changed_by = models.ForeignKey(
@@ -278,6 +285,9 @@ class AttendanceChange(models.Model):
 
     class Meta:
         ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['changed_at', 'id']),  # keyset pagination
+        ]
 
     def __str__(self):
         return f"Change: {self.attendance} {self.old_status}->{self.new_status}"
@@ -297,6 +307,11 @@ class AttendanceReport(models.Model):
     absent_count = models.IntegerField(default=0)
     late_count = models.IntegerField(default=0)
     percentage = models.FloatField(default=0.0)
+    low_attendance_warned_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the student was last warned; cleared once attendance recovers"
+    )
     generated_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -306,6 +321,11 @@ class AttendanceReport(models.Model):
     def __str__(self):
         return f"Report: {self.student.get_full_name()} {self.subject.code} {self.percentage}%"
 
+    @staticmethod
+    def semester_label(class_assigned):
+        """Value stored in `semester` for reports of a class (its semester number)"""
+        return str(class_assigned.semester.number) if class_assigned.semester_id else ''
+
 class FaceEmbedding(models.Model):
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -361,7 +381,67 @@ class Notification(models.Model):
             models.Index(fields=['user']),
             models.Index(fields=['is_read']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at', 'id']),  # keyset pagination per user
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.title}"
+
+class NotificationCounter(models.Model):
+    """Unread notifications per user, kept in step by attendance/notifications.py and signals"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+class Job(models.Model):
+    """Background work item, run by `manage.py run_jobs` (see attendance/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    idempotency_key = models.CharField(
+        max_length=200,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Enqueueing again with the same key returns the existing job"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),  # claiming the next due job
+            models.Index(fields=['kind', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
@@ -0,0 +1,114 @@
+"""
+Notification fan-out and unread counters.
+
+Announcements and alerts for a whole class or department are written with
+bulk_create, and every user's unread total lives in NotificationCounter,
+so unread_count() is a primary-key lookup instead of a COUNT:
+
+- create_notifications() and mark_read() adjust the counters themselves,
+  with one UPDATE per distinct delta
+- single Notification saves and deletes (admin, API, cascades) are covered
+  by the signals in signals.py
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from users.models import CustomUser
+from .models import ClassStudent, Notification, NotificationCounter
+
+BATCH_SIZE = 1000
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def adjust_unread(deltas):
+    """Apply {user_id: delta} to the unread counters (never below zero)"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        for chunk in _chunks(user_ids):
+            NotificationCounter.objects.filter(user_id__in=chunk).update(unread=Greatest(F('unread') + delta, 0))
+
+
+def create_notifications(notifications):
+    """bulk_create unsaved Notification objects and count them as unread"""
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+        adjust_unread(Counter(notification.user_id for notification in created if not notification.is_read))
+    return created
+
+
+def notify_users(user_ids, category, title, message, related_attendance=None):
+    """Send the same notification to every user; returns the number sent"""
+    return len(create_notifications([
+        Notification(
+            user_id=user_id, category=category, title=title, message=message,
+            related_attendance=related_attendance,
+        )
+        for user_id in dict.fromkeys(user_ids)
+    ]))
+
+
+def class_recipients(class_id):
+    """Ids of the students actively enrolled in a class"""
+    return ClassStudent.objects.filter(
+        class_assigned_id=class_id, enrollment_status='active', student__is_active=True
+    ).values_list('student_id', flat=True)
+
+
+def department_recipients(department_id, roles=('student',)):
+    """Ids of the active users of a department with one of the roles"""
+    return CustomUser.objects.filter(
+        department_id=department_id, role__in=roles, is_active=True
+    ).values_list('id', flat=True)
+
+
+def mark_read(user, notification_ids=None):
+    """Mark the user's unread notifications (all, or the given ids) as read; returns how many"""
+    with transaction.atomic():
+        unread = Notification.objects.filter(user=user, is_read=False)
+        if notification_ids is not None:
+            unread = unread.filter(id__in=notification_ids)
+        count = unread.update(is_read=True, read_at=timezone.now())
+        adjust_unread({user.pk: -count})
+    return count
+
+
+def unread_count(user):
+    return NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first() or 0
+
+
+def recount_unread(user_ids=None):
+    """Rebuild counters from the notifications table (repair); returns the users fixed"""
+    actual = Notification.objects.filter(is_read=False)
+    counters = NotificationCounter.objects.all()
+    if user_ids is not None:
+        actual = actual.filter(user_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+    expected = dict(actual.values('user_id').annotate(n=Count('id')).values_list('user_id', 'n').order_by())
+    stored = dict(counters.values_list('user_id', 'unread'))
+
+    deltas = {
+        user_id: expected.get(user_id, 0) - stored.get(user_id, 0)
+        for user_id in set(expected) | set(stored)
+    }
+    adjust_unread(deltas)
+    return sum(1 for delta in deltas.values() if delta)
@@ -0,0 +1,169 @@
+"""
+Listing helpers for the large, append-mostly tables (attendance, changes,
+notifications).
+
+KeysetPagination pages on a unique (timestamp, id) key instead of
+COUNT + OFFSET, so every page costs the same at any depth. Requests that
+still pass `page` or `ordering` get the project's PageNumberPagination, so
+existing page-based screens keep working.
+
+NDJSONStreamMixin adds `?stream=1` to a list action: the whole filtered
+queryset is written as newline-delimited JSON from a server-side iterator,
+one row per line, without pagination.
+
+LeanListMixin serves the list action from values() rows through a
+LeanSerializer (same output, no model instances or serializer fields).
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first cursor pagination on (view.cursor_field, id)"""
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    legacy_query_params = ('page', 'ordering')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.legacy = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, value, pk, reverse):
+        payload = json.dumps({'v': value.isoformat(), 'i': pk, 'r': reverse})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(raw.encode()))
+            return datetime.fromisoformat(payload['v']), int(payload['i']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def cursor_url(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        if isinstance(row, dict):
+            # values() rows from LeanListMixin
+            cursor = self.encode_cursor(row[self.field], row['id'], reverse)
+        else:
+            cursor = self.encode_cursor(getattr(row, self.field), row.pk, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if any(param in request.query_params for param in self.legacy_query_params):
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.field = view.cursor_field
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        ordered = queryset.order_by(f'-{self.field}', '-pk')
+        reverse = False
+        if cursor is not None:
+            value, pk, reverse = cursor
+            if reverse:
+                # Walking back towards newer rows: ascending, then flipped
+                ordered = queryset.order_by(self.field, 'pk').filter(
+                    Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'pk__gt': pk})
+                )
+            else:
+                ordered = ordered.filter(
+                    Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'pk__lt': pk})
+                )
+
+        rows = list(ordered[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        self.next_url = self.previous_url = None
+        if rows:
+            if more or reverse:
+                self.next_url = self.cursor_url(rows[-1], reverse=False)
+            if cursor is not None and (more or not reverse):
+                self.previous_url = self.cursor_url(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({'next': self.next_url, 'previous': self.previous_url, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class NDJSONStreamMixin:
+    """`?stream=1` on list: every row of the filtered queryset as NDJSON.
+
+    `stream_fields` are read with values() so no model instances or
+    serializers are built; rows come from .iterator() in chunks.
+    """
+    stream_fields = ()
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by(f'-{self.cursor_field}', '-pk')
+        rows = queryset.values(*self.stream_fields).iterator(chunk_size=self.stream_chunk_size)
+        encoder = DjangoJSONEncoder()
+
+        def lines():
+            for row in rows:
+                yield encoder.encode(row) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+class LeanListMixin:
+    """List through `lean_serializer_class` (a LeanSerializer) instead of the model serializer.
+
+    Filtering, ordering and pagination are unchanged; the page is read with
+    values() and every row is built as a plain dict.
+    """
+    lean_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.lean_serializer_class
+        if serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = serializer_class.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page).data)
+        return Response(serializer_class(queryset).data)
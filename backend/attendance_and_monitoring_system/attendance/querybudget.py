@@ -0,0 +1,135 @@
+"""
+Per-request SQL query budgets.
+
+QueryRecorder wraps every database connection with execute_wrapper() and
+records each statement's SQL and duration (it works with DEBUG off). A
+statement's signature is its SQL with the parameters left as
+placeholders, so an N+1 shows up as one signature executed many times.
+
+QueryBudgetMiddleware records every request and
+- adds X-Query-Count, X-Query-Time-Ms and X-Query-Duplicates headers when
+  QUERY_BUDGET['HEADERS'] is on (DEBUG by default)
+- logs a warning with the most repeated signatures when a request runs
+  more queries than its budget: the view's `query_budget` attribute, else
+  QUERY_BUDGET['DEFAULT']
+
+Queries run while a streaming response is being consumed happen after the
+middleware returns and are not counted.
+
+QueryBudgetTestMixin.assertQueryBudget() is the test-side counterpart: it
+fails with the duplicated signatures instead of just the count.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_DEFAULTS = {
+    'ENABLED': True,
+    'DEFAULT': 25,
+    'HEADERS': None,  # None: follow settings.DEBUG
+}
+
+
+def query_budget_settings():
+    config = {**QUERY_BUDGET_DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+    if config['HEADERS'] is None:
+        config['HEADERS'] = settings.DEBUG
+    return config
+
+
+class QueryRecorder:
+    """Context manager recording (signature, milliseconds) for every statement on every connection"""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return round(sum(ms for _, ms in self.queries), 2)
+
+    def duplicates(self):
+        """[(signature, times)] for statements run more than once, most repeated first"""
+        return [(sql, times) for sql, times in Counter(sql for sql, _ in self.queries).most_common() if times > 1]
+
+    def duplicate_count(self):
+        """Statements that repeated an earlier signature"""
+        return sum(times - 1 for _, times in self.duplicates())
+
+    def report(self, limit=5):
+        lines = [f'{self.count} queries in {self.total_ms} ms, {self.duplicate_count()} duplicated']
+        for sql, times in self.duplicates()[:limit]:
+            lines.append(f'  {times}x {sql[:300]}')
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = query_budget_settings()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if config['HEADERS']:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = str(recorder.total_ms)
+            response['X-Query-Duplicates'] = str(recorder.duplicate_count())
+
+        budget = getattr(request, 'query_budget', None) or config['DEFAULT']
+        if recorder.count > budget:
+            logger.warning(
+                'Query budget exceeded: %s %s ran %s (budget %s)',
+                request.method, request.path, recorder.report(), budget
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF views keep their class on the function; a class may set query_budget
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        request.query_budget = getattr(view_class, 'query_budget', None)
+
+
+class QueryBudgetTestMixin:
+    """assertQueryBudget(n): like assertNumQueries, but an upper bound that names the N+1"""
+
+    def assertQueryBudget(self, budget):
+        test = self
+
+        class Budget(QueryRecorder):
+            def __exit__(self, exc_type, *exc_info):
+                super().__exit__(exc_type, *exc_info)
+                if exc_type is None and self.count > budget:
+                    test.fail(f'Over the query budget of {budget}: {self.report()}')
+
+        return Budget()
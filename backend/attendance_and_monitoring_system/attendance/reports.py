@@ -0,0 +1,314 @@
+"""
+Attendance report rollups.
+
+Reports are keyed by (student, subject, class, semester label) and hold the
+running counts for finalized sessions. They are materialized: ending a
+session rolls its attendance in, and every later Attendance insert, update
+or delete in a finalized session is applied as a delta by the signals in
+signals.py, inside the same transaction as the write. Counters are always
+changed with database-side F() expressions so concurrent writers cannot
+lose increments. diff_reports()/rebuild_reports() recompute them from
+scratch to detect and repair drift.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, FloatField, Case, When, Value, Count, Q
+from django.db.models.functions import Cast, TruncDate, TruncWeek
+
+from .models import Attendance, AttendanceReport, Session
+
+STATUS_COUNTERS = {
+    'present': 'present_count',
+    'absent': 'absent_count',
+    'late': 'late_count',
+}
+
+
+def percentage_expression(present_delta=0, total_delta=0):
+    """present_count / total_classes_held * 100, computed by the database.
+
+    The deltas let an UPDATE that also changes the counters compute the
+    percentage from the new values (SET expressions see the old row).
+    """
+    present = F('present_count') + present_delta if present_delta else F('present_count')
+    total = F('total_classes_held') + total_delta if total_delta else F('total_classes_held')
+    return Case(
+        When(total_classes_held__gt=-total_delta,
+             then=Cast(present, FloatField()) * 100.0 / total),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def report_key(session):
+    """Filter kwargs (minus student) for the reports a session rolls up into"""
+    return {
+        'subject_id': session.subject_id,
+        'class_assigned_id': session.class_assigned_id,
+        'semester': AttendanceReport.semester_label(session.class_assigned),
+    }
+
+
+def ensure_reports(key, student_ids):
+    """Create the missing report rows for these students in one bulk insert"""
+    existing = set(
+        AttendanceReport.objects.filter(student_id__in=student_ids, **key).values_list('student_id', flat=True)
+    )
+    missing = [
+        AttendanceReport(student_id=student_id, **key)
+        for student_id in student_ids if student_id not in existing
+    ]
+    if missing:
+        AttendanceReport.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def session_report_key(session_id):
+    """(finalized, report key) for a session, read in one query"""
+    row = Session.objects.filter(pk=session_id).values(
+        'attendance_finalized', 'subject_id', 'class_assigned_id', 'class_assigned__semester__number'
+    ).first()
+    if row is None:
+        return False, None
+    number = row['class_assigned__semester__number']
+    return row['attendance_finalized'], {
+        'subject_id': row['subject_id'],
+        'class_assigned_id': row['class_assigned_id'],
+        'semester': str(number) if number is not None else '',
+    }
+
+
+def apply_transitions(key, transitions):
+    """Apply attendance status transitions to the reports under `key` as deltas.
+
+    `transitions` is an iterable of (student_id, old_status, new_status),
+    where old_status is None for a new attendance row and new_status is None
+    for a deleted one. Rows are grouped by transition, so the work is one
+    UPDATE per distinct (old, new) pair whatever the number of students.
+    """
+    groups = defaultdict(list)
+    for student_id, old_status, new_status in transitions:
+        if old_status != new_status:
+            groups[(old_status, new_status)].append(student_id)
+    if not groups:
+        return
+
+    with transaction.atomic():
+        added = [student_id for (old, _), ids in groups.items() if old is None for student_id in ids]
+        if added:
+            ensure_reports(key, added)
+
+        for (old_status, new_status), student_ids in groups.items():
+            total_delta = (old_status is None) - (new_status is None)
+            status_deltas = defaultdict(int)
+            if old_status in STATUS_COUNTERS:
+                status_deltas[STATUS_COUNTERS[old_status]] -= 1
+            if new_status in STATUS_COUNTERS:
+                status_deltas[STATUS_COUNTERS[new_status]] += 1
+
+            changes = {name: F(name) + delta for name, delta in status_deltas.items() if delta}
+            if total_delta:
+                changes['total_classes_held'] = F('total_classes_held') + total_delta
+            changes['percentage'] = percentage_expression(
+                present_delta=status_deltas['present_count'], total_delta=total_delta
+            )
+            AttendanceReport.objects.filter(student_id__in=student_ids, **key).update(**changes)
+
+
+def rollup_session(session):
+    """Add one finalized session's attendance to every affected report.
+
+    Runs a fixed number of queries regardless of class size: one read of the
+    attendance rows, one read + one bulk insert for missing reports and one
+    UPDATE per status.
+    """
+    rows = list(Attendance.objects.filter(session=session).values_list('student_id', 'status'))
+    apply_transitions(report_key(session), [(student_id, None, status) for student_id, status in rows])
+    return len(rows)
+
+
+def attendance_report_changed(previous, current):
+    """Keep reports current after one Attendance write.
+
+    `previous` and `current` are (student_id, session_id, status) tuples, or
+    None for an insert / delete. Only finalized sessions count towards
+    reports; attendance of open sessions is added when they are ended.
+    """
+    if previous and current and previous[:2] != current[:2]:
+        # Moved to another student or session: a delete plus an insert
+        attendance_report_changed(previous, None)
+        attendance_report_changed(None, current)
+        return
+
+    row = current or previous
+    finalized, key = session_report_key(row[1])
+    if not finalized:
+        return
+    apply_transitions(key, [(row[0], previous and previous[2], current and current[2])])
+
+
+def report_scope(department_id=None, semester_id=None, class_id=None, subject_id=None):
+    """Matching (attendance filters, report filters) for a subset of reports"""
+    attendance_filters, report_filters = {}, {}
+    if department_id:
+        attendance_filters['session__class_assigned__department_id'] = department_id
+        report_filters['class_assigned__department_id'] = department_id
+    if semester_id:
+        attendance_filters['session__class_assigned__semester_id'] = semester_id
+        report_filters['class_assigned__semester_id'] = semester_id
+    if class_id:
+        attendance_filters['session__class_assigned_id'] = class_id
+        report_filters['class_assigned_id'] = class_id
+    if subject_id:
+        attendance_filters['session__subject_id'] = subject_id
+        report_filters['subject_id'] = subject_id
+    return attendance_filters, report_filters
+
+
+def expected_reports(attendance_filters):
+    """Report counts recomputed from finalized attendance in one grouped query"""
+    rows = Attendance.objects.filter(session__attendance_finalized=True, **attendance_filters).values(
+        'student_id',
+        subject=F('session__subject_id'),
+        class_assigned=F('session__class_assigned_id'),
+        semester_number=F('session__class_assigned__semester__number'),
+    ).annotate(**status_buckets()).order_by()
+
+    expected = {}
+    for row in rows:
+        semester = str(row['semester_number']) if row['semester_number'] is not None else ''
+        key = (row['student_id'], row['subject'], row['class_assigned'], semester)
+        expected[key] = {
+            'total_classes_held': row['total'],
+            'present_count': row['present'],
+            'absent_count': row['absent'],
+            'late_count': row['late'],
+        }
+    return expected
+
+
+def diff_reports(**scope):
+    """Compare stored reports with a recomputation.
+
+    Returns (expected, missing, stale, orphaned): `missing` are keys with
+    attendance but no report, `stale` maps report ids to (key, stored,
+    expected) counts that disagree and `orphaned` are ids of reports
+    without any finalized attendance.
+    """
+    attendance_filters, report_filters = report_scope(**scope)
+    expected = expected_reports(attendance_filters)
+    counters = ['total_classes_held', 'present_count', 'absent_count', 'late_count']
+
+    seen, stale, orphaned = set(), {}, []
+    stored_rows = AttendanceReport.objects.filter(**report_filters).values(
+        'id', 'student_id', 'subject_id', 'class_assigned_id', 'semester', *counters
+    )
+    for row in stored_rows:
+        key = (row['student_id'], row['subject_id'], row['class_assigned_id'], row['semester'])
+        if key not in expected:
+            orphaned.append(row['id'])
+            continue
+        seen.add(key)
+        stored = {name: row[name] for name in counters}
+        if stored != expected[key]:
+            stale[row['id']] = (key, stored, expected[key])
+
+    missing = [key for key in expected if key not in seen]
+    return expected, missing, stale, orphaned
+
+
+def rebuild_reports(**scope):
+    """Rewrite every report in scope from attendance with bulk operations.
+
+    Takes the same subset arguments as report_scope(). Reads are one grouped
+    aggregate plus one scan of the stored reports; only rows that differ are
+    written, in batched upserts, and reports left without attendance are
+    deleted.
+    """
+    with transaction.atomic():
+        expected, missing, stale, orphaned = diff_reports(**scope)
+        changed = set(missing) | {key for key, _, _ in stale.values()}
+
+        if changed:
+            AttendanceReport.objects.bulk_create(
+                [
+                    AttendanceReport(
+                        student_id=key[0], subject_id=key[1], class_assigned_id=key[2], semester=key[3],
+                        percentage=(counts['present_count'] / counts['total_classes_held'] * 100)
+                        if counts['total_classes_held'] else 0.0,
+                        **counts
+                    )
+                    for key, counts in expected.items() if key in changed
+                ],
+                update_conflicts=True,
+                unique_fields=['student', 'subject', 'class_assigned', 'semester'],
+                update_fields=['total_classes_held', 'present_count', 'absent_count', 'late_count', 'percentage'],
+                batch_size=500,
+            )
+        if orphaned:
+            AttendanceReport.objects.filter(id__in=orphaned).delete()
+
+    return {
+        'expected': len(expected),
+        'created': len(missing),
+        'updated': len(stale),
+        'deleted': len(orphaned),
+        'unchanged': len(expected) - len(missing) - len(stale),
+    }
+
+
+# group_by name -> (output key -> expression) for attendance_statistics
+STATISTICS_GROUPS = {
+    'subject': {
+        'subject_id': F('session__subject_id'),
+        'subject_code': F('session__subject__code'),
+        'subject_name': F('session__subject__name'),
+    },
+    'class': {
+        'class_id': F('session__class_assigned_id'),
+        'class_name': F('session__class_assigned__name'),
+        'class_section': F('session__class_assigned__section'),
+    },
+    'day': {
+        'date': TruncDate('marked_at'),
+    },
+    'week': {
+        'week_start': TruncWeek('marked_at'),
+    },
+}
+
+
+def status_buckets():
+    """Conditional counts for every attendance status, computed in one pass"""
+    buckets = {'total': Count('id')}
+    for status in STATUS_COUNTERS:
+        buckets[status] = Count('id', filter=Q(status=status))
+    return buckets
+
+
+def _with_percentage(row):
+    row['percentage'] = round(row['present'] / row['total'] * 100, 2) if row['total'] else 0
+    return row
+
+
+def attendance_statistics(queryset, group_by=None):
+    """Totals per status for an Attendance queryset, optionally per group.
+
+    Always a single query: the ungrouped form is one aggregate, the grouped
+    form is one GROUP BY whose rows are also summed for the overall totals.
+    """
+    queryset = queryset.order_by()
+    if group_by is None:
+        return _with_percentage(queryset.aggregate(**status_buckets()))
+
+    keys = STATISTICS_GROUPS[group_by]
+    groups = [
+        _with_percentage(row)
+        for row in queryset.values(**keys).annotate(**status_buckets()).order_by(*keys)
+    ]
+    for row in groups:
+        if 'week_start' in row and hasattr(row['week_start'], 'date'):
+            row['week_start'] = row['week_start'].date()
+
+    overall = {name: sum(row[name] for row in groups) for name in status_buckets()}
+    return {**_with_percentage(overall), 'group_by': group_by, 'groups': groups}
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     Department, Semester, Subject, Class, ClassStudent, TeacherAssignment,
     ClassSchedule, Session, Attendance, AttendanceChange,
-    AttendanceReport, FaceEmbedding, Notification
+    AttendanceReport, FaceEmbedding, Notification, Job
 )
 from users.models import CustomUser
 
@@ -101,6 +101,10 @@ class ClassSerializer(serializers.ModelSerializer):
         return obj.semester.number if obj.semester else None
     
     def get_student_count(self, obj):
+        # Annotated by ClassViewSet; fall back to a query for plain instances
+        annotated = getattr(obj, 'student_count', None)
+        if annotated is not None:
+            return annotated
         return obj.enrolled_students.filter(enrollment_status='active').count()
 
 
@@ -119,7 +123,10 @@ class ClassDetailSerializer(serializers.ModelSerializer):
         return obj.department.name if obj.department else None
     
     def get_enrolled_students(self, obj):
-        students = obj.enrolled_students.filter(enrollment_status='active').select_related('student')
+        # Prefetched by ClassViewSet.retrieve as active_enrollments
+        students = getattr(obj, 'active_enrollments', None)
+        if students is None:
+            students = obj.enrolled_students.filter(enrollment_status='active').select_related('student')
         return [
             {
                 'id': cs.student.id,
@@ -204,14 +211,21 @@ class SessionSerializer(serializers.ModelSerializer):
     def get_department_name(self, obj):
         return obj.department.name if obj.department else None
     
+    def _status_count(self, obj, status):
+        # SessionViewSet annotates <status>_count; fall back to a query for plain instances
+        annotated = getattr(obj, f'{status}_count', None)
+        if annotated is not None:
+            return annotated
+        return obj.attendances.filter(status=status).count()
+    
     def get_present_count(self, obj):
-        return obj.attendances.filter(status='present').count()
+        return self._status_count(obj, 'present')
     
     def get_absent_count(self, obj):
-        return obj.attendances.filter(status='absent').count()
+        return self._status_count(obj, 'absent')
     
     def get_late_count(self, obj):
-        return obj.attendances.filter(status='late').count()
+        return self._status_count(obj, 'late')
 
 
 class AttendanceSerializer(serializers.ModelSerializer):
@@ -235,6 +249,18 @@ class AttendanceSerializer(serializers.ModelSerializer):
         return value
 
 
+class AttendanceMarkResultSerializer(serializers.Serializer):
+    """Lean per-row result for bulk marking, built from values() rows"""
+    id = serializers.IntegerField()
+    student = serializers.IntegerField(source='student_id')
+    session = serializers.IntegerField(source='session_id')
+    status = serializers.CharField()
+    detected_time = serializers.DateTimeField(allow_null=True)
+    late_entry_time = serializers.DateTimeField(allow_null=True)
+    marked_at = serializers.DateTimeField()
+    confidence_score = serializers.FloatField(allow_null=True)
+
+
 class AttendanceChangeSerializer(serializers.ModelSerializer):
     """Serializer for AttendanceChange model"""
     changed_by_name = serializers.SerializerMethodField()
@@ -304,6 +330,19 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at']
 
 
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background Job status"""
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True, default=None)
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'run_after', 'result', 'last_error',
+            'created_by', 'created_by_name', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
 class AttendanceStatisticsSerializer(serializers.Serializer):
     """Serializer for attendance statistics"""
     total = serializers.IntegerField()
@@ -313,3 +352,142 @@ class AttendanceStatisticsSerializer(serializers.Serializer):
     percentage = serializers.FloatField()
     subject = serializers.CharField(required=False)
     date = serializers.DateField(required=False)
+
+
+# =======================
+# Lean list serializers
+# =======================
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _datetime(value):
+    """Same output as a DRF DateTimeField (ISO 8601 in the current time zone)"""
+    return _datetime_field.to_representation(value) if value is not None else None
+
+
+def _full_name(first_name, last_name):
+    """AbstractUser.get_full_name() from values() columns; None when there is no user"""
+    if first_name is None and last_name is None:
+        return None
+    return f'{first_name} {last_name}'.strip()
+
+
+class LeanSerializer:
+    """Read-only list serializer over values() rows.
+
+    `value_fields` are the lookups one row needs, read with a single values()
+    query; to_representation() turns a row into the same dict (keys and
+    formats) as the model serializer it stands in for, without building
+    model instances or running every cell through a serializer field.
+    Used by LeanListMixin for list actions on large tables.
+    """
+    value_fields = ()
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.value_fields)
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.rows]
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+
+class AttendanceListSerializer(LeanSerializer):
+    """AttendanceSerializer output for list responses"""
+    value_fields = (
+        'id', 'student_id', 'student__first_name', 'student__last_name', 'student__username', 'session_id',
+        'session__subject__name', 'session__subject__code', 'session__start_time', 'status', 'detected_time',
+        'marked_at', 'marked_by_id', 'marked_by__first_name', 'marked_by__last_name', 'notes',
+        'confidence_score', 'is_verified',
+    )
+    status_labels = dict(Attendance.STATUS_CHOICES)
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'student': row['student_id'],
+            'student_name': _full_name(row['student__first_name'], row['student__last_name']),
+            'student_username': row['student__username'],
+            'session': row['session_id'],
+            'subject_name': row['session__subject__name'],
+            'subject_code': row['session__subject__code'],
+            'session_date': _datetime(row['session__start_time']),
+            'status': row['status'],
+            'status_display': str(self.status_labels.get(row['status'], row['status'])),
+            'detected_time': _datetime(row['detected_time']),
+            'marked_at': _datetime(row['marked_at']),
+            'marked_by': row['marked_by_id'],
+            'marked_by_name': _full_name(row['marked_by__first_name'], row['marked_by__last_name']),
+            'notes': row['notes'],
+            'confidence_score': row['confidence_score'],
+            'is_verified': row['is_verified'],
+        }
+
+
+class SessionListSerializer(LeanSerializer):
+    """SessionSerializer output for list responses (needs the SessionViewSet status-count annotations)"""
+    value_fields = (
+        'id', 'teacher_id', 'teacher__first_name', 'teacher__last_name', 'subject_id', 'subject__name',
+        'subject__code', 'class_assigned_id', 'class_assigned__name', 'class_assigned__section', 'department_id',
+        'department__name', 'start_time', 'end_time', 'is_active', 'attendance_finalized', 'total_students',
+        'camera_feed_id', 'present_count', 'absent_count', 'late_count', 'created_at',
+    )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'teacher': row['teacher_id'],
+            'teacher_name': _full_name(row['teacher__first_name'], row['teacher__last_name']),
+            'subject': row['subject_id'],
+            'subject_name': row['subject__name'],
+            'subject_code': row['subject__code'],
+            'class_assigned': row['class_assigned_id'],
+            'class_name': row['class_assigned__name'],
+            'class_section': row['class_assigned__section'],
+            'department': row['department_id'],
+            'department_name': row['department__name'],
+            'start_time': _datetime(row['start_time']),
+            'end_time': _datetime(row['end_time']),
+            'is_active': row['is_active'],
+            'attendance_finalized': row['attendance_finalized'],
+            'total_students': row['total_students'],
+            'camera_feed_id': row['camera_feed_id'],
+            'present_count': row['present_count'],
+            'absent_count': row['absent_count'],
+            'late_count': row['late_count'],
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class AttendanceReportListSerializer(LeanSerializer):
+    """AttendanceReportSerializer output for list responses"""
+    value_fields = (
+        'id', 'student_id', 'student__first_name', 'student__last_name', 'subject_id', 'subject__name',
+        'class_assigned_id', 'class_assigned__name', 'class_assigned__section', 'semester', 'total_classes_held',
+        'present_count', 'absent_count', 'late_count', 'percentage', 'generated_at',
+    )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'student': row['student_id'],
+            'student_name': _full_name(row['student__first_name'], row['student__last_name']),
+            'subject': row['subject_id'],
+            'subject_name': row['subject__name'],
+            'class_assigned': row['class_assigned_id'],
+            'class_name': f"{row['class_assigned__name']} - {row['class_assigned__section']}",
+            'semester': row['semester'],
+            'total_classes_held': row['total_classes_held'],
+            'present_count': row['present_count'],
+            'absent_count': row['absent_count'],
+            'late_count': row['late_count'],
+            'percentage': row['percentage'],
+            'generated_at': _datetime(row['generated_at']),
+        }
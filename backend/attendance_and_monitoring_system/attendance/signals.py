@@ -0,0 +1,125 @@
+"""
+Model signals for the attendance app.
+
+Attendance writes are mirrored into AttendanceReport as deltas (see
+reports.py). Attendance.save() runs in a transaction and deletes already
+do, so the report update commits or rolls back together with the write.
+
+Single Notification saves and deletes keep the unread counters in step
+(bulk paths go through notifications.py, which adjusts them itself).
+
+Department, class, subject and user writes drop the cached department
+statistics they feed into, and any write to a model listed by a cached
+endpoint bumps that model's response cache version (see caching.py).
+"""
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .caching import VERSIONED_MODELS, bump_versions, invalidate_department_statistics
+from .models import Attendance, Department, Class, Subject, Notification
+from .notifications import adjust_unread
+from .reports import attendance_report_changed
+
+
+def _snapshot(attendance):
+    return (attendance.student_id, attendance.session_id, attendance.status)
+
+
+@receiver(pre_save, sender=Attendance)
+def remember_previous_attendance(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._report_previous = None
+        return
+    instance._report_previous = Attendance.objects.filter(pk=instance.pk).values_list(
+        'student_id', 'session_id', 'status'
+    ).first()
+
+
+@receiver(post_save, sender=Attendance)
+def update_reports_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_report_previous', None)
+    attendance_report_changed(previous, _snapshot(instance))
+
+
+@receiver(post_delete, sender=Attendance)
+def update_reports_on_delete(sender, instance, **kwargs):
+    attendance_report_changed(_snapshot(instance), None)
+
+
+@receiver(pre_save, sender=Notification)
+def remember_previous_read_state(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._previous_is_read = None
+        return
+    instance._previous_is_read = Notification.objects.filter(pk=instance.pk).values_list('is_read', flat=True).first()
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    was_unread = False if created else getattr(instance, '_previous_is_read', None) is False
+    adjust_unread({instance.user_id: int(not instance.is_read) - int(was_unread)})
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread({instance.user_id: -1})
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_department(sender, instance, **kwargs):
+    invalidate_department_statistics(instance.pk)
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_department_of_row(sender, instance, **kwargs):
+    invalidate_department_statistics(instance.department_id)
+
+
+@receiver(pre_save, sender='users.CustomUser')
+def remember_previous_user_department(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Saves that cannot move the user between departments or roles (e.g. last_login) are skipped
+    instance._stats_previous_department = None
+    if raw or instance.pk is None or (update_fields and not {'department', 'role'} & set(update_fields)):
+        return
+    instance._stats_previous_department = sender.objects.filter(pk=instance.pk).values_list(
+        'department_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender='users.CustomUser')
+def invalidate_user_department(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields and not {'department', 'role'} & set(update_fields):
+        return
+    invalidate_department_statistics(instance.department_id, getattr(instance, '_stats_previous_department', None))
+
+
+@receiver(post_delete, sender='users.CustomUser')
+def invalidate_deleted_user_department(sender, instance, **kwargs):
+    invalidate_department_statistics(instance.department_id)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_response_cache_version(sender, update_fields=None, **kwargs):
+    if sender._meta.label not in VERSIONED_MODELS:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_versions(sender._meta.label)
+
+
+@receiver(m2m_changed)
+def bump_response_cache_version_m2m(sender, instance, action, model, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        labels = {type(instance)._meta.label, model._meta.label} & VERSIONED_MODELS
+        if labels:
+            bump_versions(*labels)
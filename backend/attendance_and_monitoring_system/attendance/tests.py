@@ -1,3 +1,1311 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import io
+import json
+import pickle
+import tempfile
+import time
+from datetime import date, time as clock, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from .models import (
+    Department, Semester, Subject, Class, ClassStudent, Session, Attendance, AttendanceChange,
+    AttendanceReport, Notification, Job, ClassSchedule, TeacherAssignment, FaceEmbedding
+)
+from .jobs import HANDLERS, claim_job, enqueue, job_handler, requeue_stale, run_job, run_pending
+from .notifications import recount_unread
+from .caching import get_versions
+from .querybudget import QueryBudgetTestMixin
+from . import urls as attendance_urls
+from users import urls as users_urls
+from .live import LIVE_UPDATES_PATH, live_updates_application, reset_broker
+from .reports import diff_reports, rebuild_reports, rollup_session
+from .serializers import AttendanceReportSerializer, AttendanceSerializer, SessionSerializer
+from .throttling import UserRateThrottle
+from .views import AttendanceViewSet
+
+
+class AttendanceAPITestCase(APITestCase):
+    """Shared fixture: one department with a class, a subject, a teacher and students"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hod = CustomUser.objects.create_user(username='hod', password='pass12345', role='hod')
+        cls.department = Department.objects.create(name='Computer Engineering', code='CE', hod=cls.hod)
+        cls.hod.department = cls.department
+        cls.hod.save()
+
+        cls.semester = Semester.objects.create(
+            number=1, department=cls.department,
+            start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cls.subject = Subject.objects.create(
+            name='Programming', code='CE101', department=cls.department, semester=cls.semester
+        )
+        cls.klass = Class.objects.create(
+            name='BCE', section='A', department=cls.department, semester=cls.semester
+        )
+        cls.klass.subjects.add(cls.subject)
+
+        cls.teacher = CustomUser.objects.create_user(
+            username='teacher', password='pass12345', role='teacher', department=cls.department
+        )
+        cls.admin = CustomUser.objects.create_user(username='admin', password='pass12345', role='admin')
+
+        cls.students = []
+        for i in range(5):
+            student = CustomUser.objects.create_user(
+                username=f'student{i}', password='pass12345', role='student',
+                department=cls.department, semester=cls.semester
+            )
+            ClassStudent.objects.create(student=student, class_assigned=cls.klass)
+            cls.students.append(student)
+
+    @classmethod
+    def create_session(cls, statuses=('present', 'absent', 'late'), **kwargs):
+        """A session for the shared class with one attendance row per status given"""
+        defaults = {
+            'teacher': cls.teacher,
+            'subject': cls.subject,
+            'class_assigned': cls.klass,
+            'department': cls.department,
+            'start_time': timezone.now() - timedelta(hours=1),
+            'total_students': len(cls.students),
+        }
+        defaults.update(kwargs)
+        session = Session.objects.create(**defaults)
+        for student, status in zip(cls.students, statuses):
+            Attendance.objects.create(student=student, session=session, status=status, marked_by=cls.teacher)
+        return session
+
+    def setUp(self):
+        # Cached responses, versions and throttle counters must not leak between tests
+        for backend in caches.all():
+            backend.clear()
+
+    def count_queries(self, method, url, data=None):
+        """Perform a request and return (response, number of SQL queries)"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(ctx.captured_queries)
+
+
+class SessionListQueryTests(AttendanceAPITestCase):
+    """SessionViewSet list computes status counts in the main query"""
+
+    url = '/api/attendance/sessions/'
+
+    def test_status_counts_are_annotated(self):
+        self.create_session(statuses=('present', 'present', 'late', 'absent'))
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual((row['present_count'], row['absent_count'], row['late_count']), (2, 1, 1))
+        self.assertEqual(row['department_name'], 'Computer Engineering')
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.force_authenticate(self.admin)
+        self.create_session()
+        _, few = self.count_queries('get', self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                self.create_session()
+        _, many = self.count_queries('get', self.url)
+
+        self.assertEqual(few, many)
+
+    def test_active_sessions_lists_every_active_session(self):
+        active = self.create_session()
+        self.create_session(is_active=False)
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(self.url + 'active_sessions/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([session['id'] for session in response.data], [active.id])
+
+
+class ClassListQueryTests(AttendanceAPITestCase):
+    """ClassViewSet list/retrieve do not issue per-class or per-subject queries"""
+
+    url = '/api/attendance/classes/'
+
+    # Pinned budget for a page of classes, independent of how many classes
+    # and subjects there are: count, classes, prefetched subjects
+    LIST_QUERY_BUDGET = 3
+
+    @classmethod
+    def add_classes(cls, count):
+        for i in range(count):
+            klass = Class.objects.create(
+                name=f'BCE-{i}', section='B', department=cls.department, semester=cls.semester
+            )
+            for j in range(3):
+                subject = Subject.objects.create(
+                    name=f'Subject {i}-{j}', code=f'CE-{i}-{j}',
+                    department=cls.department, semester=cls.semester
+                )
+                klass.subjects.add(subject)
+            ClassStudent.objects.create(student=cls.students[i % len(cls.students)], class_assigned=klass)
+
+    def test_student_count_is_annotated(self):
+        ClassStudent.objects.filter(student=self.students[0]).update(enrollment_status='dropped')
+        self.client.force_authenticate(self.hod)
+
+        response = self.client.get(self.url)
+
+        row = next(r for r in response.data['results'] if r['id'] == self.klass.id)
+        self.assertEqual(row['student_count'], len(self.students) - 1)
+        self.assertEqual(row['subjects'][0]['department_name'], 'Computer Engineering')
+        self.assertEqual(row['subjects'][0]['semester_number'], 1)
+
+    def test_list_query_count_is_pinned(self):
+        self.add_classes(10)
+        self.client.force_authenticate(self.hod)
+
+        response, queries = self.count_queries('get', self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 11)
+        self.assertLessEqual(queries, self.LIST_QUERY_BUDGET)
+
+    def test_retrieve_prefetches_enrolled_students(self):
+        self.client.force_authenticate(self.hod)
+
+        response, queries = self.count_queries('get', f'{self.url}{self.klass.id}/')
+
+        self.assertEqual(len(response.data['enrolled_students']), len(self.students))
+        self.assertLessEqual(queries, self.LIST_QUERY_BUDGET)
+
+
+@override_settings(BACKGROUND_JOBS={'ENABLED': True})
+class EndSessionRollupTests(AttendanceAPITestCase):
+    """end_session rolls attendance into reports with a fixed number of queries"""
+
+    def end_session(self, session):
+        result = self.count_queries('post', f'/api/attendance/sessions/{session.id}/end_session/')
+        run_pending()
+        return result
+
+    def test_reports_are_created_then_incremented(self):
+        self.client.force_authenticate(self.teacher)
+        self.end_session(self.create_session(statuses=('present', 'absent', 'late', 'present')))
+        response, _ = self.end_session(self.create_session(statuses=('present', 'present', 'absent', 'absent')))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_active'])
+        report = AttendanceReport.objects.get(student=self.students[0], subject=self.subject)
+        self.assertEqual((report.total_classes_held, report.present_count), (2, 2))
+        self.assertEqual(report.semester, '1')
+        self.assertEqual(report.percentage, 100.0)
+        report = AttendanceReport.objects.get(student=self.students[2], subject=self.subject)
+        self.assertEqual((report.late_count, report.absent_count, report.percentage), (1, 1, 0.0))
+        report = AttendanceReport.objects.get(student=self.students[1], subject=self.subject)
+        self.assertEqual(report.percentage, 50.0)
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self.client.force_authenticate(self.teacher)
+        # One UPDATE per distinct status, so keep the same statuses and vary the head count
+        _, few = self.end_session(self.create_session(statuses=('present', 'absent', 'late')))
+        _, many = self.end_session(self.create_session(statuses=('present', 'absent', 'late', 'present', 'late')))
+
+        self.assertEqual(few, many)
+
+    def test_writes_before_the_warning_job_runs_are_counted_once(self):
+        session = self.create_session(statuses=('present', 'absent'))
+        self.client.force_authenticate(self.teacher)
+        self.client.post(f'/api/attendance/sessions/{session.id}/end_session/')
+
+        # Both land before any worker runs: an approved correction and the
+        # frontend's markMultiple right after endSession
+        change = AttendanceChange.objects.create(
+            attendance=Attendance.objects.get(session=session, student=self.students[1]),
+            changed_by=self.teacher, old_status='absent', new_status='present', reason='Late upload'
+        )
+        self.client.force_authenticate(self.hod)
+        self.client.post(f'/api/attendance/attendance-changes/{change.id}/approve/')
+        self.client.force_authenticate(self.teacher)
+        self.client.post('/api/attendance/attendance/mark_multiple/', {
+            'session_id': session.id, 'attendances': [{'student_id': self.students[2].id, 'status': 'present'}]
+        }, format='json')
+        run_pending()
+
+        report = AttendanceReport.objects.get(student=self.students[1], subject=self.subject)
+        self.assertEqual(
+            (report.total_classes_held, report.present_count, report.absent_count, report.percentage),
+            (1, 1, 0, 100.0)
+        )
+        self.assertEqual(AttendanceReport.objects.get(student=self.students[2]).total_classes_held, 1)
+        _, missing, stale, orphaned = diff_reports()
+        self.assertEqual((missing, stale, orphaned), ([], {}, []))
+
+    def test_ending_twice_is_rejected(self):
+        session = self.create_session()
+        self.client.force_authenticate(self.teacher)
+        self.end_session(session)
+
+        response, _ = self.end_session(session)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AttendanceReport.objects.get(student=self.students[0]).total_classes_held, 1)
+
+
+class MarkMultipleTests(AttendanceAPITestCase):
+    """mark_multiple upserts the whole batch at once and reports bad rows"""
+
+    url = '/api/attendance/attendance/mark_multiple/'
+
+    def mark(self, session, rows):
+        return self.count_queries('post', self.url, {'session_id': session.id, 'attendances': rows})
+
+    def test_upserts_and_applies_grace_period(self):
+        session = self.create_session(statuses=('absent',), start_time=timezone.now() - timedelta(hours=1))
+        self.client.force_authenticate(self.teacher)
+        on_time = (session.start_time + timedelta(minutes=5)).isoformat()
+        after_grace = (session.start_time + timedelta(minutes=30)).isoformat()
+
+        response, _ = self.mark(session, [
+            {'student_id': self.students[0].id, 'status': 'present', 'detected_time': on_time},
+            {'student_id': self.students[1].id, 'status': 'present', 'detected_time': after_grace},
+            {'student_id': self.students[2].id, 'status': 'present', 'confidence_score': 0.9},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['saved'], 3)
+        self.assertEqual(response.data['errors'], [])
+        statuses = dict(Attendance.objects.filter(session=session).values_list('student_id', 'status'))
+        self.assertEqual(statuses, {
+            self.students[0].id: 'present', self.students[1].id: 'late', self.students[2].id: 'present',
+        })
+        self.assertIsNotNone(Attendance.objects.get(session=session, student=self.students[1]).late_entry_time)
+
+    def test_bad_rows_are_reported_not_dropped(self):
+        session = self.create_session(statuses=())
+        self.client.force_authenticate(self.teacher)
+
+        response, _ = self.mark(session, [
+            {'student_id': self.students[0].id, 'status': 'present'},
+            {'student_id': self.students[1].id, 'status': 'sleeping'},
+            {'student_id': self.teacher.id, 'status': 'present'},
+            {'student_id': self.students[0].id, 'status': 'absent'},
+            {'status': 'present'},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['saved'], 1)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2, 3, 4])
+        self.assertEqual(Attendance.objects.filter(session=session).count(), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        self.client.force_authenticate(self.teacher)
+        session = self.create_session(statuses=())
+        _, few = self.mark(session, [{'student_id': self.students[0].id, 'status': 'present'}])
+        session = self.create_session(statuses=())
+        _, many = self.mark(session, [{'student_id': s.id, 'status': 'present'} for s in self.students])
+
+        self.assertEqual(few, many)
+
+
+@override_settings(LOW_ATTENDANCE_THRESHOLD=75.0)
+class LowAttendanceWarningTests(AttendanceAPITestCase):
+    """Warnings are issued from finalized reports, once per threshold crossing"""
+
+    def end_session(self, statuses):
+        session = self.create_session(statuses=statuses)
+        self.client.post(f'/api/attendance/sessions/{session.id}/end_session/')
+        run_pending()
+
+    def warnings_for(self, student):
+        return Notification.objects.filter(user=student, title='Low Attendance Warning').count()
+
+    def test_marking_does_not_warn(self):
+        session = self.create_session(statuses=())
+        self.client.force_authenticate(self.teacher)
+
+        self.client.post('/api/attendance/attendance/mark_attendance/', {
+            'student_id': self.students[0].id, 'session_id': session.id, 'status': 'absent'
+        }, format='json')
+
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_warns_once_per_crossing(self):
+        self.client.force_authenticate(self.teacher)
+        self.end_session(('absent', 'late'))
+        self.end_session(('absent', 'present'))
+        self.assertEqual(self.warnings_for(self.students[0]), 1)
+        self.assertEqual(self.warnings_for(self.students[1]), 0)
+
+        # Recovers to 75% and then drops again
+        for _ in range(6):
+            self.end_session(('present',))
+        self.end_session(('absent',))
+        self.end_session(('absent',))
+
+        self.assertEqual(self.warnings_for(self.students[0]), 2)
+
+
+class AttendanceStatisticsTests(AttendanceAPITestCase):
+    """statistics answers in one query, grouped or not"""
+
+    url = '/api/attendance/attendance/statistics/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_subject = Subject.objects.create(
+            name='Maths', code='CE102', department=cls.department, semester=cls.semester
+        )
+        cls.create_session(statuses=('present', 'present', 'absent', 'late'))
+        cls.create_session(statuses=('present', 'absent'), subject=cls.other_subject)
+
+    def test_totals_in_one_query(self):
+        self.client.force_authenticate(self.admin)
+
+        response, queries = self.count_queries('get', self.url)
+
+        self.assertEqual(queries, 1)
+        self.assertEqual(
+            response.data,
+            {'total': 6, 'present': 3, 'absent': 2, 'late': 1, 'percentage': 50.0}
+        )
+
+    def test_group_by_subject_in_one_query(self):
+        self.client.force_authenticate(self.admin)
+
+        response, queries = self.count_queries('get', self.url + '?group_by=subject')
+
+        self.assertEqual(queries, 1)
+        self.assertEqual(response.data['total'], 6)
+        groups = {g['subject_code']: (g['total'], g['present'], g['percentage']) for g in response.data['groups']}
+        self.assertEqual(groups, {'CE101': (4, 2, 50.0), 'CE102': (2, 1, 50.0)})
+
+    def test_group_by_day_and_week(self):
+        self.client.force_authenticate(self.admin)
+
+        for group_by, key in (('day', 'date'), ('week', 'week_start')):
+            response = self.client.get(self.url, {'group_by': group_by})
+            self.assertEqual(len(response.data['groups']), 1)
+            self.assertIn(key, response.data['groups'][0])
+
+        self.assertEqual(self.client.get(self.url, {'group_by': 'teacher'}).status_code, 400)
+
+
+class MaterializedReportTests(AttendanceAPITestCase):
+    """Attendance writes after finalization keep reports in step"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.session = cls.create_session(statuses=('present', 'absent', 'late'))
+        Session.objects.filter(pk=cls.session.pk).update(is_active=False, attendance_finalized=True)
+        rollup_session(Session.objects.select_related('class_assigned__semester').get(pk=cls.session.pk))
+
+    def report(self, student):
+        return AttendanceReport.objects.get(student=student, subject=self.subject)
+
+    def assertNoDrift(self):
+        _, missing, stale, orphaned = diff_reports()
+        self.assertEqual((missing, stale, orphaned), ([], {}, []))
+
+    def test_approved_change_moves_counts(self):
+        attendance = Attendance.objects.get(session=self.session, student=self.students[1])
+        change = AttendanceChange.objects.create(
+            attendance=attendance, changed_by=self.teacher, old_status='absent', new_status='present', reason='Late upload'
+        )
+        self.client.force_authenticate(self.hod)
+
+        self.client.post(f'/api/attendance/attendance-changes/{change.id}/approve/')
+
+        report = self.report(self.students[1])
+        self.assertEqual((report.present_count, report.absent_count, report.percentage), (1, 0, 100.0))
+        self.assertNoDrift()
+
+    def test_insert_and_delete_in_finalized_session(self):
+        Attendance.objects.create(student=self.students[3], session=self.session, status='present')
+        Attendance.objects.get(session=self.session, student=self.students[0]).delete()
+
+        self.assertEqual(self.report(self.students[3]).total_classes_held, 1)
+        self.assertEqual(self.report(self.students[0]).total_classes_held, 0)
+        self.assertEqual(len(diff_reports()[3]), 1)  # the emptied report is orphaned
+
+    def test_open_sessions_are_not_counted(self):
+        Attendance.objects.create(student=self.students[3], session=self.create_session(statuses=()), status='present')
+
+        self.assertFalse(AttendanceReport.objects.filter(student=self.students[3]).exists())
+        self.assertNoDrift()
+
+    def test_mark_multiple_on_finalized_session(self):
+        self.client.force_authenticate(self.teacher)
+
+        self.client.post('/api/attendance/attendance/mark_multiple/', {
+            'session_id': self.session.id,
+            'attendances': [
+                {'student_id': self.students[1].id, 'status': 'late'},
+                {'student_id': self.students[4].id, 'status': 'absent'},
+            ]
+        }, format='json')
+
+        self.assertEqual(self.report(self.students[1]).late_count, 1)
+        self.assertEqual(self.report(self.students[4]).absent_count, 1)
+        self.assertNoDrift()
+
+    def test_mark_multiple_sees_a_session_finalized_while_it_validates(self):
+        session = self.create_session(statuses=('present',))
+        apply_grace_period = AttendanceViewSet._apply_grace_period
+
+        def end_session_meanwhile(*args):
+            Session.objects.filter(pk=session.pk).update(is_active=False, attendance_finalized=True)
+            rollup_session(Session.objects.select_related('class_assigned__semester').get(pk=session.pk))
+            return apply_grace_period(*args)
+
+        self.client.force_authenticate(self.teacher)
+        with mock.patch.object(AttendanceViewSet, '_apply_grace_period', staticmethod(end_session_meanwhile)):
+            self.client.post('/api/attendance/attendance/mark_multiple/', {
+                'session_id': session.id,
+                'attendances': [
+                    {'student_id': self.students[0].id, 'status': 'absent', 'detected_time': timezone.now().isoformat()},
+                ]
+            }, format='json')
+
+        self.assertEqual(self.report(self.students[0]).present_count, 1)  # the earlier session
+        self.assertEqual(self.report(self.students[0]).absent_count, 1)
+        self.assertNoDrift()
+
+    def test_rebuild_repairs_drift(self):
+        AttendanceReport.objects.filter(student=self.students[0]).update(present_count=7, total_classes_held=9)
+        AttendanceReport.objects.filter(student=self.students[1]).delete()
+
+        result = rebuild_reports(class_id=self.klass.id)
+
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (1, 1, 1))
+        self.assertNoDrift()
+        self.assertEqual(self.report(self.students[0]).percentage, 100.0)
+
+
+@override_settings(BACKGROUND_JOBS={'ENABLED': True})
+class BulkRegenerateTests(AttendanceAPITestCase):
+    """regenerate without student_id rebuilds a whole subset in a few queries"""
+
+    url = '/api/attendance/attendance-reports/regenerate/'
+
+    def finalize(self, statuses):
+        session = self.create_session(statuses=statuses)
+        Session.objects.filter(pk=session.pk).update(is_active=False, attendance_finalized=True)
+
+    def rebuild(self, data):
+        """Queue a rebuild, then run it: (job result, queries the job took)"""
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 202)
+        with CaptureQueriesContext(connection) as ctx:
+            run_pending()
+        return Job.objects.get(pk=response.data['id']).result, len(ctx.captured_queries)
+
+    def test_rebuilds_department_in_constant_queries(self):
+        self.client.force_authenticate(self.hod)
+        self.finalize(('present', 'absent'))
+        result, few = self.rebuild({})
+        self.assertEqual((result['created'], result['rows_touched']), (2, 2))
+
+        AttendanceReport.objects.all().delete()
+        self.finalize(('present', 'absent', 'late', 'present', 'present'))
+        result, many = self.rebuild({'class_id': self.klass.id})
+
+        self.assertEqual(result['scope'], {'class_id': self.klass.id, 'department_id': self.department.id})
+        self.assertEqual(result['created'], 5)
+        self.assertIn('elapsed_ms', result)
+        self.assertEqual(few, many)
+        self.assertEqual(AttendanceReport.objects.get(student=self.students[0]).total_classes_held, 2)
+
+    def test_hod_cannot_rebuild_other_department(self):
+        self.client.force_authenticate(self.hod)
+
+        response = self.client.post(self.url, {'department_id': self.department.id + 1}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_idempotency_keys_are_per_user(self):
+        def post(user):
+            self.client.force_authenticate(user)
+            return self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='rebuild-1').data['id']
+
+        first = post(self.hod)
+
+        self.assertEqual(post(self.hod), first)
+        self.assertNotEqual(post(self.admin), first)
+        self.assertEqual(Job.objects.count(), 2)
+
+
+class ReportSemesterLabelTests(AttendanceAPITestCase):
+    """Reports are keyed by the class's semester number, whatever label was used before"""
+
+    def finalize(self, statuses):
+        session = self.create_session(statuses=statuses)
+        Session.objects.filter(pk=session.pk).update(is_active=False, attendance_finalized=True)
+
+    def test_single_regenerate_ignores_the_client_label(self):
+        self.finalize(('present',))
+        self.client.force_authenticate(self.admin)
+        data = {'student_id': self.students[0].id, 'subject_id': self.subject.id, 'class_id': self.klass.id}
+
+        for label in ('Semester 1', str(self.semester)):
+            response = self.client.post(
+                '/api/attendance/attendance-reports/regenerate/', {**data, 'semester': label}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        report = AttendanceReport.objects.get(student=self.students[0])
+        self.assertEqual((report.semester, report.total_classes_held), ('1', 1))
+
+    def test_migration_merges_old_labels(self):
+        self.finalize(('present', 'absent'))
+        old_label = AttendanceReport.objects.create(
+            student=self.students[0], subject=self.subject, class_assigned=self.klass, semester=str(self.semester),
+            total_classes_held=1, present_count=1, percentage=100.0, low_attendance_warned_at=timezone.now(),
+        )
+        self.finalize(('absent', 'absent'))
+        AttendanceReport.objects.create(
+            student=self.students[0], subject=self.subject, class_assigned=self.klass, semester='1',
+            total_classes_held=1, absent_count=1,
+        )
+        AttendanceReport.objects.create(
+            student=self.students[1], subject=self.subject, class_assigned=self.klass, semester='Semester 1',
+            total_classes_held=2, absent_count=2,
+        )
+
+        migration = importlib.import_module('attendance.migrations.0011_relabel_report_semesters')
+        migration.relabel_report_semesters(apps, None)
+
+        reports = {r.student_id: r for r in AttendanceReport.objects.filter(class_assigned=self.klass)}
+        self.assertEqual(set(r.semester for r in reports.values()), {'1'})
+        self.assertEqual(len(reports), 2)
+        first = reports[self.students[0].id]
+        self.assertEqual(
+            (first.total_classes_held, first.present_count, first.absent_count, first.percentage), (2, 1, 1, 50.0)
+        )
+        self.assertEqual(first.low_attendance_warned_at, old_label.low_attendance_warned_at)
+        self.assertEqual(reports[self.students[1].id].total_classes_held, 2)
+        self.assertEqual(diff_reports(class_id=self.klass.id)[1:], ([], {}, []))
+
+
+@override_settings(BACKGROUND_JOBS={'ENABLED': True})
+class JobQueueTests(AttendanceAPITestCase):
+    """Heavy work is queued as jobs, claimed once, retried and reported"""
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+        @job_handler('tests.flaky')
+        def flaky(fail_times=0):
+            self.calls.append(fail_times)
+            if len(self.calls) <= fail_times:
+                raise RuntimeError('boom')
+            return {'calls': len(self.calls)}
+
+        self.addCleanup(HANDLERS.pop, 'tests.flaky')
+
+    def test_end_session_rolls_up_and_queues_the_warning_check(self):
+        session = self.create_session(statuses=('present', 'absent'))
+        self.client.force_authenticate(self.teacher)
+
+        response = self.client.post(f'/api/attendance/sessions/{session.id}/end_session/')
+
+        self.assertEqual(AttendanceReport.objects.count(), 2)
+        job = Job.objects.get(pk=response.data['warnings_job'])
+        self.assertEqual((job.kind, job.status, job.created_by), ('reports.low_attendance', 'queued', self.teacher))
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'succeeded')
+
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        job = enqueue('tests.flaky', {'fail_times': 5}, max_attempts=2)
+
+        with self.assertLogs('attendance.jobs', 'ERROR'):
+            self.assertEqual(run_job(claim_job()), 'queued')
+        job.refresh_from_db()
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertIsNone(claim_job())  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('attendance.jobs', 'ERROR'):
+            self.assertEqual(run_job(claim_job()), 'failed')
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 2)
+
+        self.calls.clear()
+        retried = enqueue('tests.flaky', {'fail_times': 1})
+        with self.assertLogs('attendance.jobs', 'ERROR'):
+            run_job(claim_job())
+        Job.objects.filter(pk=retried.pk).update(run_after=timezone.now())
+        run_job(claim_job())
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts, retried.result), ('succeeded', 2, {'calls': 2}))
+
+    def test_claimed_jobs_are_not_claimed_again_until_stale(self):
+        job = enqueue('tests.flaky')
+
+        self.assertEqual(claim_job(worker='a').pk, job.pk)
+        self.assertIsNone(claim_job(worker='b'))
+        self.assertEqual(requeue_stale(stale_after=60), 0)
+
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(stale_after=60), 1)
+        self.assertEqual(claim_job(worker='b').attempts, 2)
+
+    def test_status_api_and_metrics(self):
+        own = enqueue('tests.flaky', created_by=self.teacher)
+        enqueue('tests.flaky', created_by=self.hod)
+        run_pending(limit=1)
+
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get('/api/attendance/jobs/')
+        self.assertEqual([job['id'] for job in response.data['results']], [own.pk])
+        self.assertEqual(response.data['results'][0]['status'], 'succeeded')
+        self.assertEqual(self.client.get('/api/attendance/jobs/metrics/').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        metrics = self.client.get('/api/attendance/jobs/metrics/').data
+        self.assertEqual((metrics['queued'], metrics['running']), (1, 0))
+        self.assertEqual(metrics['kinds']['tests.flaky']['finished'], 1)
+        self.assertIsNotNone(metrics['kinds']['tests.flaky']['run_ms_avg'])
+
+    @override_settings(BACKGROUND_JOBS={'ENABLED': False})
+    def test_disabled_queue_runs_jobs_inline_after_commit(self):
+        session = self.create_session(statuses=('present',))
+        self.client.force_authenticate(self.teacher)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(f'/api/attendance/sessions/{session.id}/end_session/')
+        # Nothing runs inside the session lock; the check waits for the commit
+        self.assertEqual(Job.objects.get(pk=response.data['warnings_job']).status, 'queued')
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(AttendanceReport.objects.get(student=self.students[0]).present_count, 1)
+        self.assertFalse(Job.objects.exclude(status='succeeded').exists())
+
+    @override_settings(BACKGROUND_JOBS={'ENABLED': False})
+    def test_inline_failures_are_failed_not_requeued(self):
+        with self.assertLogs('attendance.jobs', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            job = enqueue('tests.flaky', {'fail_times': 1})
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+
+class NotificationCounterTests(AttendanceAPITestCase):
+    """Fan-out is bulk and unread counts come from the counter row"""
+
+    url = '/api/attendance/notifications/'
+
+    def unread(self, user):
+        self.client.force_authenticate(user)
+        response, queries = self.count_queries('get', self.url + 'unread_count/')
+        self.assertEqual(queries, 1)
+        return response.data['unread_count']
+
+    def test_class_broadcast_is_bulk_and_counted(self):
+        self.client.force_authenticate(self.teacher)
+        payload = {'class_id': self.klass.id, 'title': 'Lab moved', 'message': 'Room 204 today'}
+
+        response, queries = self.count_queries('post', self.url + 'broadcast/', payload)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['recipients'], 5)
+        self.assertEqual(self.unread(self.students[0]), 1)
+
+        for i in range(10):
+            student = CustomUser.objects.create_user(username=f'late{i}', password='pass12345', role='student')
+            ClassStudent.objects.create(student=student, class_assigned=self.klass)
+        self.client.force_authenticate(self.teacher)
+        response, more = self.count_queries('post', self.url + 'broadcast/', payload)
+
+        self.assertEqual(response.data['recipients'], 15)
+        self.assertEqual(queries, more)
+        self.assertEqual(self.unread(self.students[4]), 2)
+        self.assertEqual(recount_unread(), 0)
+
+    def test_read_marks_and_single_writes_move_the_counter(self):
+        notifications = [
+            Notification.objects.create(user=self.students[0], category='alert', title=f'n{i}', message='m')
+            for i in range(3)
+        ]
+        self.assertEqual(self.unread(self.students[0]), 3)
+
+        self.client.post(f'{self.url}{notifications[0].id}/mark_read/')
+        self.client.post(f'{self.url}{notifications[0].id}/mark_read/')
+        self.assertEqual(self.unread(self.students[0]), 2)
+
+        notifications[1].delete()
+        notifications[2].is_read = True
+        notifications[2].save()
+        self.assertEqual(self.unread(self.students[0]), 0)
+
+        Notification.objects.create(user=self.students[0], category='alert', title='n', message='m')
+        self.client.post(self.url + 'mark_all_read/')
+        self.assertEqual(self.unread(self.students[0]), 0)
+        self.assertEqual(recount_unread(), 0)
+
+    def test_broadcast_permissions(self):
+        payload = {'department_id': self.department.id, 'title': 'Exam week', 'message': 'Schedules are out'}
+
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.post(self.url + 'broadcast/', payload, format='json').status_code, 403)
+        self.client.force_authenticate(self.students[0])
+        self.assertEqual(self.client.post(self.url + 'broadcast/', payload, format='json').status_code, 403)
+
+        self.client.force_authenticate(self.hod)
+        response = self.client.post(self.url + 'broadcast/', {**payload, 'roles': ['student', 'teacher']}, format='json')
+        self.assertEqual(response.data['recipients'], 6)
+
+
+class DepartmentStatisticsTests(AttendanceAPITestCase):
+    """Department statistics come from one query and are then served from cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/attendance/departments/{self.department.id}/statistics/'
+
+    def test_one_query_then_zero(self):
+        self.client.force_authenticate(self.hod)
+
+        response, cold = self.count_queries('get', self.url)
+        _, warm = self.count_queries('get', self.url)
+
+        self.assertEqual((cold, warm), (1, 0))
+        self.assertEqual(
+            (response.data['total_classes'], response.data['total_subjects'],
+             response.data['total_students'], response.data['total_teachers']),
+            (1, 1, 5, 1)
+        )
+        self.assertEqual(response.data['department']['code'], 'CE')
+        self.assertIn('computed_at', response.data)
+
+    def test_writes_invalidate(self):
+        self.client.force_authenticate(self.hod)
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subject.objects.create(name='Maths', code='CE102', department=self.department, semester=self.semester)
+            self.students[0].department = None
+            self.students[0].save()
+
+        response, queries = self.count_queries('get', self.url)
+        self.assertEqual(queries, 1)
+        self.assertEqual((response.data['total_subjects'], response.data['total_students']), (2, 4))
+
+    def test_other_hod_gets_404_from_cache(self):
+        self.client.force_authenticate(self.hod)
+        self.client.get(self.url)
+        other_hod = CustomUser.objects.create_user(username='hod2', password='pass12345', role='hod')
+        self.client.force_authenticate(other_hod)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+# One process in tests, so locmem cannot go stale across workers
+@override_settings(RESPONSE_CACHE={'ENABLED': True})
+class ResponseCacheTests(AttendanceAPITestCase):
+    """Polled list endpoints are served from a role-aware, version-invalidated cache"""
+
+    url = '/api/attendance/sessions/'
+
+    def test_second_poll_is_a_hit(self):
+        self.create_session()
+        self.client.force_authenticate(self.teacher)
+
+        first, _ = self.count_queries('get', self.url)
+        second, queries = self.count_queries('get', self.url)
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(first.data, second.data)
+
+    def test_writes_bump_the_version(self):
+        session = self.create_session()
+        self.client.force_authenticate(self.teacher)
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.filter(session=session, student=self.students[1]).get().delete()
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['absent_count'], 0)
+
+    def test_versions_bump_only_when_the_write_commits(self):
+        before = get_versions(['attendance.Attendance'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_session()
+            # A GET racing the open transaction still caches under the old version
+            self.assertEqual(get_versions(['attendance.Attendance']), before)
+
+        self.assertNotEqual(get_versions(['attendance.Attendance']), before)
+
+    def test_users_do_not_share_scoped_entries(self):
+        self.create_session()
+        other_teacher = CustomUser.objects.create_user(
+            username='teacher2', password='pass12345', role='teacher', department=self.department
+        )
+        self.client.force_authenticate(self.teacher)
+        self.client.get(self.url)
+
+        self.client.force_authenticate(other_teacher)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_metrics(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        metrics = self.client.get('/api/attendance/cache-metrics/').data
+
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+        self.assertEqual(metrics['endpoints']['SessionViewSet.list']['hit_rate'], 0.5)
+
+
+@override_settings(LIVE_UPDATES={'BROKER': 'memory'})
+class LiveUpdatesTests(AttendanceAPITestCase):
+    """Writes are pushed to Server-Sent Events subscribers of their scope"""
+
+    def setUp(self):
+        super().setUp()
+        reset_broker()
+        self.addCleanup(reset_broker)
+
+    def stream(self, user, query, during=None, origin=None):
+        """Run the SSE app for a user; `during` is a sync callable run once subscribed.
+        Returns (status, [event dicts]); the response headers are kept in self.headers."""
+        token = str(AccessToken.for_user(user))
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': LIVE_UPDATES_PATH,
+            'query_string': f'token={token}&{query}'.encode(),
+            'headers': [(b'origin', origin.encode())] if origin else [],
+        }
+
+        async def scenario():
+            sent, disconnected = [], asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            async def wait_for_bodies(count):
+                while sum(m['type'] == 'http.response.body' for m in sent) < count:
+                    await asyncio.sleep(0.01)
+
+            app = asyncio.ensure_future(live_updates_application(scope, receive, send))
+            if during is not None:
+                await asyncio.wait_for(wait_for_bodies(1), 5)
+                if sent[0]['status'] == 200:
+                    await sync_to_async(during)()
+                    await asyncio.wait_for(wait_for_bodies(2), 5)
+            disconnected.set()
+            await asyncio.wait_for(app, 5)
+            return sent
+
+        sent = async_to_sync(scenario)()
+        self.headers = dict(sent[0]['headers'])
+        events = [
+            json.loads(line[len('data: '):])
+            for message in sent if message['type'] == 'http.response.body'
+            for line in message['body'].decode().splitlines() if line.startswith('data: ')
+        ]
+        return sent[0]['status'], events
+
+    def test_marks_are_pushed_to_session_subscribers(self):
+        session = self.create_session(statuses=())
+
+        def mark():
+            self.client.force_authenticate(self.teacher)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/attendance/attendance/mark_attendance/', {
+                    'student_id': self.students[0].id, 'session_id': session.id, 'status': 'present'
+                }, format='json')
+
+        status, events = self.stream(self.hod, f'session={session.id}&class={self.klass.id}', during=mark)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(events), 1)  # published to both topics, delivered once
+        self.assertEqual(events[0]['type'], 'attendance.marked')
+        self.assertEqual(events[0]['data']['student_id'], self.students[0].id)
+
+    def test_subscriptions_are_scoped(self):
+        self.assertEqual(self.stream(self.students[0], f'department={self.department.id}')[0], 403)
+        self.assertEqual(self.stream(self.students[0], f'class={self.klass.id}')[0], 200)
+        self.assertEqual(self.stream(self.hod, 'session=abc')[0], 400)
+
+        scope_without_token = {'type': 'http', 'method': 'GET', 'path': LIVE_UPDATES_PATH, 'query_string': b'class=1'}
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async_to_sync(live_updates_application)(scope_without_token, None, send)
+        self.assertEqual(sent[0]['status'], 401)
+
+    @override_settings(CORS_ALLOWED_ORIGINS=['http://localhost:5173'], CORS_ALLOW_CREDENTIALS=True)
+    def test_cors_headers_follow_the_allowed_origins(self):
+        query = f'class={self.klass.id}'
+
+        self.assertEqual(self.stream(self.hod, query, origin='http://localhost:5173')[0], 200)
+        self.assertEqual(self.headers[b'access-control-allow-origin'], b'http://localhost:5173')
+        self.assertEqual(self.headers[b'access-control-allow-credentials'], b'true')
+
+        denied = self.stream(self.students[0], f'department={self.department.id}', origin='http://localhost:5173')
+        self.assertEqual(denied[0], 403)
+        self.assertEqual(self.headers[b'access-control-allow-origin'], b'http://localhost:5173')
+
+        self.stream(self.hod, query, origin='https://evil.example')
+        self.assertNotIn(b'access-control-allow-origin', self.headers)
+        self.stream(self.hod, query)
+        self.assertNotIn(b'access-control-allow-origin', self.headers)
+
+
+class KeysetPaginationTests(AttendanceAPITestCase):
+    """Attendance lists page on (marked_at, id) without COUNT and can stream NDJSON"""
+
+    url = '/api/attendance/attendance/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for _ in range(5):
+            cls.create_session()
+        # Identical timestamps must still page without gaps or repeats
+        Attendance.objects.update(marked_at=timezone.now())
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response, queries = self.count_queries('get', url)
+            ids += [row['id'] for row in response.data['results']]
+            pages.append((response, queries))
+            url = response.data['next']
+        return ids, pages
+
+    def test_cursor_walk_is_complete_and_flat(self):
+        self.client.force_authenticate(self.admin)
+
+        ids, pages = self.walk(self.url + '?page_size=4')
+
+        self.assertEqual(sorted(ids, reverse=True), ids)
+        self.assertEqual(ids, list(Attendance.objects.order_by('-id').values_list('id', flat=True)))
+        self.assertEqual(len({queries for _, queries in pages}), 1)
+        self.assertNotIn('count', pages[0][0].data)
+
+        # Going back from the second page returns the first page
+        previous = self.client.get(pages[1][0].data['previous'])
+        self.assertEqual([r['id'] for r in previous.data['results']], ids[:4])
+
+    def test_page_param_keeps_page_number_pagination(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(self.url, {'page': 1})
+
+        self.assertEqual(response.data['count'], Attendance.objects.count())
+
+    def test_stream_emits_ndjson(self):
+        self.client.force_authenticate(self.teacher)
+
+        response = self.client.get(self.url, {'stream': 1})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), Attendance.objects.count())
+        self.assertEqual(set(rows[0]), set(AttendanceViewSet.stream_fields))
+
+    def test_invalid_cursor_is_404(self):
+        self.client.force_authenticate(self.admin)
+
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nope'}).status_code, 404)
+
+
+class AttendanceExportTests(AttendanceAPITestCase):
+    """export streams long and wide layouts from a single query"""
+
+    url = '/api/attendance/attendance/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_session(statuses=('present', 'absent', 'late'), start_time=timezone.now() - timedelta(days=1))
+        cls.create_session(statuses=('present', 'present'))
+
+    def download(self, **params):
+        self.client.force_authenticate(self.hod)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+            content = b''.join(response.streaming_content).decode()
+        return response, list(csv.reader(io.StringIO(content))), len(ctx.captured_queries)
+
+    def test_long_layout(self):
+        response, rows, queries = self.download(class_id=self.klass.id)
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'attendance-class{self.klass.id}-department{self.department.id}.csv', response['Content-Disposition'])
+        self.assertEqual(len(rows), 1 + 5)
+        self.assertEqual(rows[1][5:9], ['student0', '', '', 'present'])
+        self.assertEqual(queries, 1)
+
+    def test_wide_layout(self):
+        response, rows, queries = self.download(layout='wide')
+
+        self.assertEqual(len(rows[0]), 3 + 2 + 3)
+        self.assertEqual(rows[1][:5], ['student0', '', '', 'P', 'P'])
+        self.assertEqual(rows[2][3:], ['A', 'P', '1', '0', '1'])
+        self.assertEqual(rows[3][3:], ['L', '', '0', '1', '0'])
+        self.assertEqual(queries, 2)
+
+    def test_bad_layout(self):
+        self.client.force_authenticate(self.hod)
+
+        self.assertEqual(self.client.get(self.url, {'layout': 'tall'}).status_code, 400)
+
+    def test_xlsx(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            self.skipTest('openpyxl is not installed')
+        self.client.force_authenticate(self.hod)
+
+        response = self.client.get(self.url, {'file_format': 'xlsx', 'layout': 'wide'})
+
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual([cell.value for cell in next(sheet.iter_rows(min_row=2, max_row=2))][:5], ['student0', None, None, 'P', 'P'])
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, AttendanceAPITestCase):
+    """Every list endpoint stays within a pinned number of queries whatever the row count"""
+
+    # Queries for a first (uncached) page as admin, with several rows behind every field
+    LIST_BUDGETS = {
+        '/api/attendance/departments/': 2,
+        '/api/attendance/semesters/': 2,
+        '/api/attendance/subjects/': 2,
+        '/api/attendance/classes/': 3,
+        '/api/attendance/class-students/': 2,
+        '/api/attendance/teacher-assignments/': 2,
+        '/api/attendance/class-schedules/': 2,
+        '/api/attendance/sessions/': 2,
+        '/api/attendance/attendance/': 1,
+        '/api/attendance/attendance-changes/': 1,
+        '/api/attendance/attendance-reports/': 2,
+        '/api/attendance/embeddings/': 2,
+        '/api/attendance/notifications/': 1,
+        '/api/attendance/jobs/': 2,
+        '/api/auth/': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(3):
+            hod = CustomUser.objects.create_user(username=f'budget-hod{i}', password='pass12345', role='hod')
+            department = Department.objects.create(name=f'Department {i}', code=f'D{i}', hod=hod)
+            hod.department = department
+            hod.save()
+            semester = Semester.objects.create(
+                number=i + 2, department=department, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+            )
+            subject = Subject.objects.create(name=f'Subject {i}', code=f'S{i}', department=department, semester=semester)
+            klass = Class.objects.create(name=f'Class {i}', section='A', department=department, semester=semester)
+            klass.subjects.add(subject)
+            ClassSchedule.objects.create(
+                class_assigned=klass, subject=subject, day_of_week=i,
+                scheduled_start_time=clock(9), scheduled_end_time=clock(10)
+            )
+            TeacherAssignment.objects.create(teacher=cls.teacher, subject=subject, class_assigned=klass)
+            FaceEmbedding.objects.create(student=cls.students[i], embedding_vector=[0.0] * 4)
+            Notification.objects.create(user=cls.admin, category='announcement', title=f'Note {i}', message='m')
+
+            session = cls.create_session(statuses=('present', 'absent', 'late'))
+            AttendanceChange.objects.create(
+                attendance=session.attendances.first(), changed_by=cls.teacher,
+                old_status='present', new_status='absent', reason='Correction'
+            )
+            Job.objects.create(kind='reports.rebuild', created_by=cls.admin)
+        rebuild_reports()
+
+    def list_routes(self):
+        routes = [f'/api/attendance/{prefix}/' for prefix, _, _ in attendance_urls.router.registry]
+        routes += [f'/api/auth/{prefix}/'.replace('//', '/') for prefix, _, _ in users_urls.router.registry]
+        return routes
+
+    def test_every_list_endpoint_has_a_budget(self):
+        self.assertEqual(sorted(self.list_routes()), sorted(self.LIST_BUDGETS))
+
+    def test_list_endpoints_stay_within_budget(self):
+        self.client.force_authenticate(self.admin)
+        for url, budget in self.LIST_BUDGETS.items():
+            with self.subTest(url=url), self.assertQueryBudget(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_budget_failure_names_the_repeated_query(self):
+        with self.assertRaisesMessage(AssertionError, '3x SELECT'):
+            with self.assertQueryBudget(2):
+                for subject in Subject.objects.all()[:3]:
+                    subject.department.name
+
+    @override_settings(QUERY_BUDGET={'DEFAULT': 1, 'HEADERS': True})
+    def test_middleware_headers_and_over_budget_log(self):
+        self.client.force_authenticate(self.admin)
+
+        with self.assertLogs('attendance.querybudget', 'WARNING') as logs:
+            response = self.client.get('/api/attendance/classes/')
+
+        self.assertEqual(response['X-Query-Count'], '3')
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+        self.assertIn('X-Query-Time-Ms', response)
+        self.assertIn('GET /api/attendance/classes/ ran 3 queries', logs.output[0])
+
+
+class LeanListSerializerTests(AttendanceAPITestCase):
+    """List actions built from values() rows match the model serializers field for field"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        session = cls.create_session(statuses=('present', 'absent', 'late', 'present'))
+        Attendance.objects.filter(session=session, student=cls.students[3]).update(
+            marked_by=None, confidence_score=0.93, detected_time=timezone.now(), notes='Camera 2'
+        )
+        cls.create_session(
+            is_active=False, attendance_finalized=True, end_time=timezone.now(), camera_feed_id='cam-1'
+        )
+        Session.objects.update(attendance_finalized=True)
+        rebuild_reports()
+
+    def assertSameRows(self, url, serializer_class, queryset):
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        by_id = lambda row: row['id']
+        self.assertTrue(response.data['results'])
+        self.assertEqual(
+            sorted(response.data['results'], key=by_id),
+            sorted((dict(row) for row in serializer_class(queryset, many=True).data), key=by_id),
+        )
+
+    def test_lists_match_model_serializers(self):
+        self.client.force_authenticate(self.admin)
+        sessions = Session.objects.all()
+
+        for url, serializer_class, queryset in [
+            ('/api/attendance/attendance/', AttendanceSerializer, Attendance.objects.all()),
+            ('/api/attendance/sessions/', SessionSerializer, sessions),
+            ('/api/attendance/attendance-reports/', AttendanceReportSerializer, AttendanceReport.objects.all()),
+        ]:
+            with self.subTest(url=url):
+                self.assertSameRows(url, serializer_class, queryset)
+
+    def test_lists_keep_role_scoping(self):
+        student = self.students[0]
+        self.client.force_authenticate(student)
+
+        self.assertSameRows('/api/attendance/attendance/', AttendanceSerializer, Attendance.objects.filter(student=student))
+        self.assertSameRows(
+            '/api/attendance/attendance-reports/', AttendanceReportSerializer,
+            AttendanceReport.objects.filter(student=student)
+        )
+
+
+class AtomicThrottleTests(AttendanceAPITestCase):
+    """Throttles count in the shared 'throttle' cache with one increment per request"""
+
+    class ThreeAMinute(UserRateThrottle):
+        rate = '3/min'
+
+    def throttle(self, now):
+        throttle = self.ThreeAMinute()
+        throttle.timer = lambda: now
+        return throttle
+
+    def test_one_increment_per_request_and_no_history_list(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.teacher
+        backend = caches['throttle']
+
+        with mock.patch.object(backend, 'incr', wraps=backend.incr) as incr:
+            throttles = [self.throttle(1000.0) for _ in range(4)]
+            allowed = [throttle.allow_request(request, None) for throttle in throttles]
+
+        self.assertEqual(allowed, [True, True, True, False])
+        self.assertEqual(incr.call_count, 4)
+        # A plain counter per window instead of DRF's list of timestamps
+        self.assertEqual(backend.get(throttles[-1].key), 4)
+
+    def test_window_end_resets_the_count(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.teacher
+        for _ in range(3):
+            self.throttle(1000.0).allow_request(request, None)
+
+        blocked = self.throttle(1010.0)
+        self.assertFalse(blocked.allow_request(request, None))
+        self.assertEqual(blocked.wait(), 10.0)  # the minute window ends at 1020
+        self.assertTrue(self.throttle(1021.0).allow_request(request, None))
+
+    def test_file_backend_keeps_the_window_expiry(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.teacher
+
+        class Hourly(UserRateThrottle):
+            rate = '5/hour'
+
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'throttle': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            for now in (3600.0, 3601.0):
+                throttle = Hourly()
+                throttle.timer = lambda now=now: now
+                throttle.allow_request(request, None)
+            backend = caches['throttle']
+            with open(backend._key_to_file(throttle.key), 'rb') as f:
+                lifetime = pickle.load(f) - time.time()
+
+        # Lives until the hourly window ends (3600 s after the second request), not
+        # the default 300 s timeout that incr() writes
+        self.assertAlmostEqual(lifetime, 3600, delta=5)
+
+    def test_api_returns_429_with_retry_after(self):
+        self.client.force_authenticate(self.teacher)
+
+        with mock.patch.object(UserRateThrottle, 'THROTTLE_RATES', {'user': '2/min'}):
+            responses = [self.client.get('/api/attendance/subjects/') for _ in range(3)]
+
+        self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+        self.assertIn('Retry-After', responses[2])
+
+    def test_cache_aliases_have_separate_namespaces(self):
+        caches['default'].set('shared-name', 'default')
+
+        self.assertIsNone(caches['throttle'].get('shared-name'))
+        self.assertNotEqual(caches['default'].key_prefix, caches['throttle'].key_prefix)
@@ -0,0 +1,92 @@
+"""
+Request throttles that count with one atomic increment per request.
+
+DRF's SimpleRateThrottle keeps a list of request timestamps per client and
+rewrites it on every request (get, trim, set): two workers serving the same
+client at once both read the old list and one of the writes is lost, and
+the stored list grows with the rate. These throttles count requests in
+fixed windows instead. The cache key names the current window and a request
+is a single increment of it:
+
+- Redis: INCR plus EXPIREAT (the window's end) in one MULTI round trip
+- other backends: cache.incr(), with cache.add() starting the window (the
+  file backend's incr() rewrites the entry, so the window's expiry is
+  restored with touch())
+
+A client can send up to twice the rate across a window boundary; in return
+the check costs the same at any rate and never loses a count on Redis.
+
+Counters live in the settings.THROTTLE_CACHE_ALIAS cache, which must be a
+shared backend (CACHE_BACKEND=redis or file) when several workers serve the
+API. The file backend's incr() is itself a read-modify-write, so only Redis
+counts exactly under concurrency.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.redis import RedisCache
+from rest_framework import throttling
+
+
+class AtomicCounterMixin:
+    """Fixed-window counting for a SimpleRateThrottle subclass"""
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.window_end = (window + 1) * self.duration
+        self.key = f'{key}:{window}'
+        self.count = self.increment(self.key)
+        if self.count > self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def increment(self, key):
+        """Add one to the window's counter and return the new count"""
+        backend = self.cache
+        expires_at = math.ceil(self.window_end) + 1
+
+        if isinstance(backend, RedisCache):
+            # RedisCache.incr() runs EXISTS before INCR; use the client directly
+            full_key = backend.make_and_validate_key(key)
+            pipeline = backend._cache.get_client(full_key, write=True).pipeline()
+            pipeline.incr(full_key)
+            pipeline.expireat(full_key, expires_at)
+            return pipeline.execute()[0]
+
+        try:
+            count = backend.incr(key)
+        except ValueError:
+            # First request of the window; add() fails if another request won the race
+            if backend.add(key, 1, expires_at - self.now):
+                return 1
+            count = backend.incr(key)
+        if type(backend).incr is BaseCache.incr:
+            # The generic incr() (file backend) re-sets the key with the default
+            # timeout; put the window's expiry back
+            backend.touch(key, expires_at - self.now)
+        return count
+
+    def wait(self):
+        return max(self.window_end - self.now, 0)
+
+
+class AnonRateThrottle(AtomicCounterMixin, throttling.AnonRateThrottle):
+    """REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['anon'] per client IP"""
+
+
+class UserRateThrottle(AtomicCounterMixin, throttling.UserRateThrottle):
+    """REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['user'] per user (IP when anonymous)"""
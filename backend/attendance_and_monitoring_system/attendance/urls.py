@@ -4,7 +4,7 @@ from .views import (
     DepartmentViewSet, SemesterViewSet, SubjectViewSet, ClassViewSet, ClassStudentViewSet,
     TeacherAssignmentViewSet, ClassScheduleViewSet, SessionViewSet,
     AttendanceViewSet, AttendanceChangeViewSet, AttendanceReportViewSet,
-    FaceEmbeddingViewSet, NotificationViewSet
+    FaceEmbeddingViewSet, NotificationViewSet, JobViewSet, ResponseCacheMetricsView
 )
 
 router = DefaultRouter()
@@ -21,7 +21,9 @@ router.register(r'attendance-changes', AttendanceChangeViewSet)
 router.register(r'attendance-reports', AttendanceReportViewSet)
 router.register(r'embeddings', FaceEmbeddingViewSet)
 router.register(r'notifications', NotificationViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
+    path('cache-metrics/', ResponseCacheMetricsView.as_view(), name='cache-metrics'),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,41 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from django.db.models import Q, Count, Prefetch
 from datetime import datetime, timedelta
 
 from .models import (
     Department, Semester, Subject, Class, ClassStudent, TeacherAssignment, 
     ClassSchedule, Session, Attendance, AttendanceChange, AttendanceReport,
-    FaceEmbedding, Notification
+    FaceEmbedding, Notification, Job
 )
 from .serializers import (
     DepartmentSerializer, SemesterSerializer, SubjectSerializer, ClassSerializer, ClassDetailSerializer,
     ClassStudentSerializer, TeacherAssignmentSerializer, ClassScheduleSerializer,
     SessionSerializer, AttendanceSerializer, AttendanceChangeSerializer,
     AttendanceReportSerializer, FaceEmbeddingSerializer, NotificationSerializer,
-    AttendanceStatisticsSerializer
+    AttendanceStatisticsSerializer, AttendanceMarkResultSerializer, JobSerializer,
+    AttendanceListSerializer, SessionListSerializer, AttendanceReportListSerializer
+)
+from .caching import (
+    CachedResponseMixin, bump_versions, get_department_statistics, response_cache_metrics
+)
+from .exports import EXPORT_FORMATS, EXPORT_LAYOUTS, export_response
+from .jobs import enqueue, job_metrics
+from .notifications import (
+    class_recipients, department_recipients, mark_read as mark_notifications_read, notify_users,
+    unread_count as get_unread_count
+)
+from .live import publish_session_event
+from .pagination import KeysetPagination, LeanListMixin, NDJSONStreamMixin
+from .reports import (
+    STATISTICS_GROUPS, apply_transitions, attendance_statistics, report_key, report_scope, rollup_session,
+    session_report_key
 )
 from users.models import CustomUser
 from users.serializers import UserSerializer, UserDetailSerializer
@@ -31,7 +50,7 @@ class IsDepartmentAllowed(BasePermission):
 
 class DepartmentViewSet(viewsets.ModelViewSet):
     """ViewSet for Department model"""
-    queryset = Department.objects.all()
+    queryset = Department.objects.all().select_related('hod')
     serializer_class = DepartmentSerializer
     permission_classes = [IsAuthenticated, IsDepartmentAllowed]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -55,21 +74,18 @@ class DepartmentViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def statistics(self, request, pk=None):
-        """Get department statistics"""
-        department = self.get_object()
+        """Get department statistics (cached until the department's data changes)"""
+        try:
+            stats = get_department_statistics(int(pk))
+        except (TypeError, ValueError):
+            stats = None
         
-        total_classes = Class.objects.filter(department=department).count()
-        total_subjects = Subject.objects.filter(department=department).count()
-        total_students = CustomUser.objects.filter(department=department, role='student').count()
-        total_teachers = CustomUser.objects.filter(department=department, role='teacher').count()
+        # Same visibility as get_queryset(), checked on the cached payload so a
+        # warm cache answers without touching the database
+        if stats is None or (request.user.role == 'hod' and stats['department']['hod'] != request.user.id):
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
         
-        return Response({
-            'department': DepartmentSerializer(department).data,
-            'total_classes': total_classes,
-            'total_subjects': total_subjects,
-            'total_students': total_students,
-            'total_teachers': total_teachers
-        })
+        return Response(stats)
 
 
 class SemesterViewSet(viewsets.ModelViewSet):
@@ -100,11 +116,12 @@ class SemesterViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet for Subject model"""
-    queryset = Subject.objects.all()
+    queryset = Subject.objects.all().select_related('department', 'semester')
     serializer_class = SubjectSerializer
     permission_classes = [IsAuthenticated]
+    cache_models = ['attendance.Subject', 'attendance.Department', 'attendance.Semester']
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'code']
     ordering_fields = ['code', 'created_at']
@@ -126,10 +143,16 @@ class SubjectViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ClassViewSet(viewsets.ModelViewSet):
+class ClassViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet for Class model"""
-    queryset = Class.objects.all()
+    queryset = Class.objects.all().select_related('department', 'semester').prefetch_related(
+        Prefetch('subjects', queryset=Subject.objects.select_related('department', 'semester'))
+    )
     permission_classes = [IsAuthenticated]
+    cache_models = [
+        'attendance.Class', 'attendance.Subject', 'attendance.Department', 'attendance.Semester',
+        'attendance.ClassStudent', 'users.CustomUser'
+    ]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'section', 'academic_year']
     ordering_fields = ['name', 'created_at']
@@ -152,14 +175,25 @@ class ClassViewSet(viewsets.ModelViewSet):
             class_ids = ClassStudent.objects.filter(student=user, enrollment_status='active').values_list('class_assigned_id', flat=True)
             queryset = queryset.filter(id__in=class_ids)
         
+        queryset = queryset.annotate(
+            student_count=Count('enrolled_students', filter=Q(enrolled_students__enrollment_status='active'))
+        )
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(Prefetch(
+                'enrolled_students',
+                queryset=ClassStudent.objects.filter(enrollment_status='active').select_related('student'),
+                to_attr='active_enrollments'
+            ))
+        
         return queryset
 
 
-class ClassStudentViewSet(viewsets.ModelViewSet):
+class ClassStudentViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet for ClassStudent model"""
     queryset = ClassStudent.objects.all().select_related('student', 'class_assigned')
     serializer_class = ClassStudentSerializer
     permission_classes = [IsAuthenticated]
+    cache_models = ['attendance.ClassStudent', 'attendance.Class', 'users.CustomUser']
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['student__username', 'student__first_name', 'student__last_name', 'class_assigned__name']
     ordering_fields = ['enrollment_date']
@@ -248,11 +282,17 @@ class TeacherAssignmentViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class SessionViewSet(viewsets.ModelViewSet):
+class SessionViewSet(CachedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """ViewSet for Session model"""
-    queryset = Session.objects.all().select_related('teacher', 'subject', 'class_assigned')
+    queryset = Session.objects.all().select_related('teacher', 'subject', 'class_assigned', 'department')
     serializer_class = SessionSerializer
+    lean_serializer_class = SessionListSerializer
     permission_classes = [IsAuthenticated]
+    cache_actions = ('list', 'retrieve', 'active_sessions')
+    cache_models = [
+        'attendance.Session', 'attendance.Attendance', 'attendance.Subject', 'attendance.Class',
+        'attendance.Department', 'attendance.ClassStudent', 'users.CustomUser'
+    ]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['subject__code', 'teacher__username']
     ordering_fields = ['start_time', 'created_at']
@@ -270,6 +310,13 @@ class SessionViewSet(viewsets.ModelViewSet):
             class_ids = ClassStudent.objects.filter(student=user, enrollment_status='active').values_list('class_assigned_id', flat=True)
             queryset = queryset.filter(class_assigned_id__in=class_ids)
         
+        # Status counts in the same query instead of three COUNTs per session
+        queryset = queryset.annotate(
+            present_count=Count('attendances', filter=Q(attendances__status='present')),
+            absent_count=Count('attendances', filter=Q(attendances__status='absent')),
+            late_count=Count('attendances', filter=Q(attendances__status='late')),
+        )
+        
         return queryset
 
     @action(detail=False, methods=['post'])
@@ -306,6 +353,7 @@ class SessionViewSet(viewsets.ModelViewSet):
             is_active=True,
             total_students=total_students
         )
+        publish_session_event('session.started', session, subject_id=session.subject_id)
         
         serializer = self.get_serializer(session)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -315,65 +363,61 @@ class SessionViewSet(viewsets.ModelViewSet):
         """End an active session"""
         session = self.get_object()
         
-        if not session.is_active:
-            return Response(
-                {'error': 'Session is already ended'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        session.end_time = timezone.now()
-        session.is_active = False
-        session.attendance_finalized = True
-        session.save()
-        
-        # Update attendance reports for all students in this session
-        attendances = Attendance.objects.filter(session=session).select_related('student')
-        for attendance in attendances:
-            report, created = AttendanceReport.objects.get_or_create(
-                student=attendance.student,
-                subject=session.subject,
-                class_assigned=session.class_assigned,
-                semester=session.class_assigned.semester,
-                defaults={
-                    'total_classes_held': 0,
-                    'present_count': 0,
-                    'absent_count': 0,
-                    'late_count': 0,
-                    'percentage': 0.0
-                }
-            )
+        with transaction.atomic():
+            # Lock the row so two requests cannot both end (and roll up) the session
+            session = Session.objects.select_for_update().select_related(
+                'class_assigned__semester'
+            ).get(pk=session.pk)
+            
+            if not session.is_active:
+                return Response(
+                    {'error': 'Session is already ended'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Update counts
-            report.total_classes_held += 1
-            if attendance.status == 'present':
-                report.present_count += 1
-            elif attendance.status == 'absent':
-                report.absent_count += 1
-            elif attendance.status == 'late':
-                report.late_count += 1
+            session.end_time = timezone.now()
+            session.is_active = False
+            session.attendance_finalized = True
+            session.save(update_fields=['end_time', 'is_active', 'attendance_finalized'])
             
-            # Calculate percentage
-            if report.total_classes_held > 0:
-                report.percentage = (report.present_count / report.total_classes_held) * 100
+            # Roll up under the lock: from the moment the session is finalized,
+            # attendance writes to it are applied to the reports as deltas, so the
+            # reports must already contain the session when this transaction commits
+            rollup_session(session)
             
-            report.save()
+            # Low attendance warnings only read the reports, so they never run under
+            # this lock: a worker picks them up, or (queue disabled) they run once
+            # this transaction commits, still within the request
+            job = enqueue(
+                'reports.low_attendance', report_key(session),
+                idempotency_key=f'reports.low_attendance:{session.pk}', created_by=request.user
+            )
+            publish_session_event('session.ended', session, end_time=session.end_time.isoformat())
         
-        serializer = self.get_serializer(session)
-        return Response(serializer.data)
+        serializer = self.get_serializer(self.get_queryset().get(pk=session.pk))
+        return Response({**serializer.data, 'warnings_job': job.pk})
 
     @action(detail=False, methods=['get'])
     def active_sessions(self, request):
-        """Get all active sessions"""
-        queryset = self.get_queryset().filter(is_active=True)
+        """Get all active sessions (a plain list: dashboards count every entry)"""
+        queryset = self.filter_queryset(self.get_queryset()).filter(is_active=True)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
-class AttendanceViewSet(viewsets.ModelViewSet):
+class AttendanceViewSet(NDJSONStreamMixin, CachedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """ViewSet for Attendance model"""
-    queryset = Attendance.objects.all().select_related('student', 'session', 'marked_by')
+    queryset = Attendance.objects.all().select_related('student', 'session__subject', 'marked_by')
     serializer_class = AttendanceSerializer
+    lean_serializer_class = AttendanceListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_field = 'marked_at'
+    stream_fields = [
+        'id', 'student_id', 'session_id', 'status', 'detected_time', 'late_entry_time', 'marked_at',
+        'marked_by_id', 'notes', 'confidence_score', 'is_verified'
+    ]
+    cache_models = ['attendance.Attendance', 'attendance.Session', 'attendance.Subject', 'users.CustomUser']
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['student__username', 'session__subject__code', 'status']
     ordering_fields = ['marked_at', 'status']
@@ -419,13 +463,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             else:
                 detection_dt = current_time
             
-            # Auto-detect late status based on grace period
-            grace_period_delta = timedelta(minutes=session.grace_period_minutes)
-            grace_deadline = session.start_time + grace_period_delta
-            
             # If detected after grace period, mark as late (unless manually set)
-            if detection_dt > grace_deadline and status_value == 'present':
-                status_value = 'late'
+            status_value = self._apply_grace_period(session, status_value, detection_dt)
             
             defaults = {
                 'status': status_value,
@@ -445,9 +484,10 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 session_id=session_id,
                 defaults=defaults
             )
-            
-            # Generate low attendance warning if needed
-            self._check_and_generate_warning(student_id, session.subject_id)
+            publish_session_event(
+                'attendance.marked', session,
+                student_id=attendance.student_id, status=attendance.status
+            )
             
             serializer = self.get_serializer(attendance)
             return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
@@ -456,72 +496,179 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    def _check_and_generate_warning(self, student_id, subject_id):
-        """Check attendance percentage and generate warning if below threshold"""
-        threshold = 75.0  # 75% attendance threshold
-        
-        # Calculate attendance percentage for this subject
-        total_sessions = Session.objects.filter(
-            subject_id=subject_id,
-            attendance_finalized=True
-        ).count()
-        
-        if total_sessions == 0:
-            return
-        
-        present_count = Attendance.objects.filter(
-            student_id=student_id,
-            session__subject_id=subject_id,
-            status__in=['present', 'late']
-        ).count()
-        
-        percentage = (present_count / total_sessions) * 100
-        
-        # Generate warning if below threshold
-        if percentage < threshold:
-            subject = Subject.objects.get(id=subject_id)
-            Notification.objects.create(
-                user_id=student_id,
-                category='alert',
-                title='Low Attendance Warning',
-                message=f'Your attendance in {subject.name} is {percentage:.1f}%, below the required {threshold}%.',
-                related_attendance=None
-            )
+    @staticmethod
+    def _apply_grace_period(session, status_value, detection_dt):
+        """Turn 'present' into 'late' when detected after the session's grace period"""
+        grace_deadline = session.start_time + timedelta(minutes=session.grace_period_minutes)
+        if detection_dt > grace_deadline and status_value == 'present':
+            return 'late'
+        return status_value
 
     @action(detail=False, methods=['post'])
     def mark_multiple(self, request):
-        """Mark attendance for multiple students"""
-        attendances_data = request.data.get('attendances', [])
-        session_id = request.data.get('session_id')
+        """Mark attendance for multiple students in one bulk upsert.
+        
+        Body: {"session_id": 1, "attendances": [{"student_id": 5, "status": "present",
+        "confidence_score": 0.93, "detected_time": "...", "notes": ""}, ...]}
+        ("session"/"records"/"student" are accepted as aliases.)
+        
+        Valid rows are written with a single INSERT ... ON CONFLICT DO UPDATE;
+        invalid rows are reported in `errors` with their index. 'present' is
+        turned into 'late' only for rows whose detected_time is past the
+        grace period.
+        """
+        rows = request.data.get('attendances', request.data.get('records', []))
+        session_id = request.data.get('session_id') or request.data.get('session')
+        if not session_id and rows:
+            # Allow the session to be given per row, as long as it is the same everywhere
+            row_sessions = {row.get('session_id') or row.get('session') for row in rows if isinstance(row, dict)}
+            if len(row_sessions) == 1:
+                session_id = row_sessions.pop()
         
         if not session_id:
             return Response({'error': 'session_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(rows, list):
+            return Response({'error': 'attendances must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            session = Session.objects.only(
+                'id', 'start_time', 'grace_period_minutes', 'attendance_finalized', 'class_assigned_id', 'department_id'
+            ).get(id=session_id)
+        except (Session.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        current_time = timezone.now()
+        valid_statuses = {choice for choice, _ in Attendance.STATUS_CHOICES}
+        errors = []
+        parsed = {}
+        
+        def reject(index, student_id, message):
+            errors.append({'index': index, 'student_id': student_id, 'error': message})
         
-        created_attendances = []
-        for data in attendances_data:
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                reject(index, None, 'Each attendance must be an object')
+                continue
+            student_id = row.get('student_id', row.get('student'))
             try:
-                attendance, created = Attendance.objects.update_or_create(
-                    student_id=data.get('student_id'),
-                    session_id=session_id,
-                    defaults={
-                        'status': data.get('status', 'absent'),
-                        'marked_by': request.user,
-                        'confidence_score': data.get('confidence_score'),
-                        'notes': data.get('notes', ''),
-                        'marked_at': timezone.now()
-                    }
-                )
-                created_attendances.append(attendance)
-            except Exception as e:
+                student_id = int(student_id)
+            except (TypeError, ValueError):
+                reject(index, student_id, 'student_id is required')
                 continue
-        
-        serializer = self.get_serializer(created_attendances, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+            if student_id in parsed:
+                reject(index, student_id, 'Duplicate student_id in request')
+                continue
+            
+            status_value = row.get('status', 'absent')
+            if status_value not in valid_statuses:
+                reject(index, student_id, f'Invalid status: {status_value}')
+                continue
+            
+            confidence = row.get('confidence_score')
+            if confidence is not None:
+                try:
+                    confidence = float(confidence)
+                except (TypeError, ValueError):
+                    confidence = -1
+                if not 0 <= confidence <= 1:
+                    reject(index, student_id, 'Confidence score must be between 0 and 1.')
+                    continue
+            
+            # Without a detected_time the submitted status stands: the time of
+            # the upload says nothing about when the student arrived
+            detection_dt = current_time
+            if row.get('detected_time'):
+                detection_dt = parse_datetime(str(row['detected_time']))
+                if detection_dt is None:
+                    reject(index, student_id, 'Invalid detected_time')
+                    continue
+                if timezone.is_naive(detection_dt):
+                    detection_dt = timezone.make_aware(detection_dt)
+                status_value = self._apply_grace_period(session, status_value, detection_dt)
+            parsed[student_id] = (index, Attendance(
+                student_id=student_id,
+                session_id=session.id,
+                status=status_value,
+                marked_by=request.user,
+                confidence_score=confidence,
+                notes=row.get('notes', ''),
+                marked_at=current_time,
+                detected_time=detection_dt,
+                late_entry_time=detection_dt if status_value == 'late' else None,
+            ))
+        
+        # One query to drop rows pointing at unknown students
+        known_students = set(
+            CustomUser.objects.filter(id__in=parsed.keys(), role='student').values_list('id', flat=True)
+        )
+        for student_id in [sid for sid in parsed if sid not in known_students]:
+            index, _ = parsed.pop(student_id)
+            reject(index, student_id, 'Student not found')
+        
+        if parsed:
+            with transaction.atomic():
+                # Lock the session like end_session does: concurrent uploads (and
+                # finalizing) are serialized, so attendance_finalized and the
+                # previous statuses below cannot change before the upsert
+                session = Session.objects.select_for_update().only(
+                    'id', 'start_time', 'grace_period_minutes', 'attendance_finalized', 'class_assigned_id', 'department_id'
+                ).get(pk=session.pk)
+                
+                # bulk_create skips signals, so finalized sessions update their reports here
+                previous = {}
+                if session.attendance_finalized:
+                    previous = dict(
+                        Attendance.objects.select_for_update()
+                        .filter(session_id=session.id, student_id__in=parsed.keys())
+                        .values_list('student_id', 'status')
+                    )
+                
+                Attendance.objects.bulk_create(
+                    [attendance for _, attendance in parsed.values()],
+                    update_conflicts=True,
+                    unique_fields=['student', 'session'],
+                    update_fields=[
+                        'status', 'marked_by', 'confidence_score', 'notes',
+                        'marked_at', 'detected_time', 'late_entry_time'
+                    ],
+                )
+                
+                # bulk_create skips the signals that invalidate cached responses
+                bump_versions('attendance.Attendance')
+                publish_session_event('attendance.marked', session, marks=[
+                    {'student_id': student_id, 'status': attendance.status}
+                    for student_id, (_, attendance) in parsed.items()
+                ])
+                
+                if session.attendance_finalized:
+                    _, key = session_report_key(session.id)
+                    apply_transitions(key, [
+                        (student_id, previous.get(student_id), attendance.status)
+                        for student_id, (_, attendance) in parsed.items()
+                    ])
+        
+        # Upserted rows do not get their ids back, so read them in one go
+        saved = Attendance.objects.filter(session_id=session.id, student_id__in=parsed.keys()).values(
+            'id', 'student_id', 'session_id', 'status', 'detected_time',
+            'late_entry_time', 'marked_at', 'confidence_score'
+        )
+        errors.sort(key=lambda error: error['index'])
+        
+        return Response(
+            {
+                'session_id': session.id,
+                'saved': len(parsed),
+                'results': AttendanceMarkResultSerializer(saved, many=True).data,
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED if parsed or not errors else status.HTTP_400_BAD_REQUEST
+        )
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Get attendance statistics"""
+        """Get attendance statistics (optionally ?group_by=subject|class|day|week)"""
         user = request.user
+        group_by = request.query_params.get('group_by')
         subject_id = request.query_params.get('subject_id')
         class_id = request.query_params.get('class_id')
         start_date = request.query_params.get('start_date')
@@ -548,20 +695,49 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             except:
                 pass
         
-        total = queryset.count()
-        present = queryset.filter(status='present').count()
-        absent = queryset.filter(status='absent').count()
-        late = queryset.filter(status='late').count()
+        if group_by and group_by not in STATISTICS_GROUPS:
+            return Response(
+                {'error': f"group_by must be one of: {', '.join(STATISTICS_GROUPS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        percentage = (present / total * 100) if total > 0 else 0
+        return Response(attendance_statistics(queryset, group_by=group_by or None))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Download attendance as CSV or XLSX, streamed from one query.
+        
+        Query params: department_id, semester_id, class_id, subject_id (any
+        subset), layout=long|wide and file_format=csv|xlsx. HODs are limited
+        to their department.
+        """
+        layout = request.query_params.get('layout', 'long')
+        file_format = request.query_params.get('file_format', 'csv')
+        if layout not in EXPORT_LAYOUTS or file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"layout must be one of {', '.join(EXPORT_LAYOUTS)} and file_format one of {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        scope = {}
+        for param in ('department_id', 'semester_id', 'class_id', 'subject_id'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    scope[param] = int(value)
+                except ValueError:
+                    return Response({'error': f'{param} must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role == 'hod':
+            scope['department_id'] = request.user.department_id
+        
+        attendance_filters, _ = report_scope(**scope)
+        queryset = self.get_queryset().filter(**attendance_filters)
+        name = 'attendance-' + '-'.join(f'{key[:-3]}{value}' for key, value in sorted(scope.items())) if scope else 'attendance'
         
-        return Response({
-            'total': total,
-            'present': present,
-            'absent': absent,
-            'late': late,
-            'percentage': round(percentage, 2)
-        })
+        try:
+            return export_response(queryset, layout=layout, file_format=file_format, filename=name)
+        except ImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def by_date(self, request):
@@ -580,11 +756,24 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AttendanceChangeViewSet(viewsets.ModelViewSet):
+class AttendanceChangeViewSet(NDJSONStreamMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet for AttendanceChange model"""
-    queryset = AttendanceChange.objects.all().select_related('attendance', 'changed_by', 'approved_by')
+    queryset = AttendanceChange.objects.all().select_related(
+        'attendance__student', 'attendance__session__subject', 'changed_by', 'approved_by'
+    )
     serializer_class = AttendanceChangeSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_field = 'changed_at'
+    stream_fields = [
+        'id', 'attendance_id', 'changed_by_id', 'old_status', 'new_status', 'reason', 'notes',
+        'changed_at', 'approved_by_id', 'approved_at'
+    ]
+    cache_actions = ('list', 'retrieve', 'pending')
+    cache_models = [
+        'attendance.AttendanceChange', 'attendance.Attendance', 'attendance.Session', 'attendance.Subject',
+        'users.CustomUser'
+    ]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['changed_at']
     ordering = ['-changed_at']
@@ -626,6 +815,11 @@ class AttendanceChangeViewSet(viewsets.ModelViewSet):
         change.approved_at = timezone.now()
         change.save()
         
+        publish_session_event(
+            'change.approved', attendance.session,
+            change_id=change.id, student_id=attendance.student_id, status=attendance.status
+        )
+        
         serializer = self.get_serializer(change)
         return Response(serializer.data)
 
@@ -656,10 +850,11 @@ class AttendanceChangeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class AttendanceReportViewSet(viewsets.ReadOnlyModelViewSet):
+class AttendanceReportViewSet(LeanListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for AttendanceReport model (read-only)"""
     queryset = AttendanceReport.objects.all().select_related('student', 'subject', 'class_assigned')
     serializer_class = AttendanceReportSerializer
+    lean_serializer_class = AttendanceReportListSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['student__username', 'subject__code', 'semester']
@@ -694,18 +889,34 @@ class AttendanceReportViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['post'])
     def regenerate(self, request):
-        """Regenerate attendance reports (Admin/HOD only)"""
+        """Regenerate attendance reports (Admin/HOD only)
+        
+        With student_id: rebuild that one report (subject_id and class_id are
+        required; the semester label comes from the class). Without it: bulk mode, queueing a job that
+        rebuilds every report in the subset given by any of department_id,
+        semester_id, class_id and subject_id (HODs are limited to their
+        department). An Idempotency-Key header returns the job this user
+        already queued under that key instead of a new one.
+        """
         if request.user.role not in ['admin', 'hod']:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
         student_id = request.data.get('student_id')
         subject_id = request.data.get('subject_id')
         class_id = request.data.get('class_id')
-        semester = request.data.get('semester')
         
-        if not all([student_id, subject_id, class_id, semester]):
+        if not student_id:
+            return self._regenerate_bulk(request)
+        
+        if not all([student_id, subject_id, class_id]):
             return Response({'error': 'All fields required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        # Same key the rollups use, whatever label the client sends
+        class_assigned = Class.objects.select_related('semester').filter(pk=class_id).first()
+        if class_assigned is None:
+            return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+        semester = AttendanceReport.semester_label(class_assigned)
+        
         # Get all sessions for this class/subject/semester
         sessions = Session.objects.filter(
             class_assigned_id=class_id,
@@ -719,10 +930,9 @@ class AttendanceReportViewSet(viewsets.ReadOnlyModelViewSet):
             session__in=sessions
         )
         
-        total = attendances.count()
-        present = attendances.filter(status='present').count()
-        absent = attendances.filter(status='absent').count()
-        late = attendances.filter(status='late').count()
+        counts = attendance_statistics(attendances)
+        total, present = counts['total'], counts['present']
+        absent, late = counts['absent'], counts['late']
         percentage = (present / total * 100) if total > 0 else 0
         
         report, created = AttendanceReport.objects.update_or_create(
@@ -742,6 +952,36 @@ class AttendanceReportViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(report)
         return Response(serializer.data)
 
+    def _regenerate_bulk(self, request):
+        """Queue a rebuild of all reports in a subset (see jobs.rebuild_reports_job)"""
+        scope = {}
+        for param in ('department_id', 'semester_id', 'class_id', 'subject_id'):
+            value = request.data.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                scope[param] = int(value)
+            except (TypeError, ValueError):
+                return Response({'error': f'{param} must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.user.role == 'hod':
+            if not request.user.department_id:
+                return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+            if scope.get('department_id', request.user.department_id) != request.user.department_id:
+                return Response({'error': 'HOD can only regenerate their department'}, status=status.HTTP_403_FORBIDDEN)
+            scope['department_id'] = request.user.department_id
+        
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key and len(idempotency_key) > 100:
+            return Response({'error': 'Idempotency-Key is limited to 100 characters'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = enqueue('reports.rebuild', scope, idempotency_key=idempotency_key, created_by=request.user)
+        finished = job.status in ('succeeded', 'failed')
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_200_OK if finished else status.HTTP_202_ACCEPTED
+        )
+
 
 class FaceEmbeddingViewSet(viewsets.ModelViewSet):
     """ViewSet for FaceEmbedding model"""
@@ -763,11 +1003,16 @@ class FaceEmbeddingViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(NDJSONStreamMixin, viewsets.ModelViewSet):
     """ViewSet for Notification model"""
     queryset = Notification.objects.all().select_related('user')
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_field = 'created_at'
+    stream_fields = [
+        'id', 'category', 'title', 'message', 'is_read', 'read_at', 'related_attendance_id', 'created_at'
+    ]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'is_read']
     ordering = ['-created_at']
@@ -779,26 +1024,64 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_read(self, request, pk=None):
         """Mark notification as read"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save()
+        mark_notifications_read(request.user, [notification.pk])
+        notification.refresh_from_db()
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        Notification.objects.filter(user=request.user, is_read=False).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
-        return Response({'status': 'all notifications marked as read'})
+        count = mark_notifications_read(request.user)
+        return Response({'status': 'all notifications marked as read', 'marked': count})
 
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Get count of unread notifications"""
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return Response({'unread_count': count})
+        """Get count of unread notifications (from the user's counter row)"""
+        return Response({'unread_count': get_unread_count(request.user)})
+
+    @action(detail=False, methods=['post'])
+    def broadcast(self, request):
+        """Send one notification to a whole class or department
+        
+        Body: class_id or department_id, title, message, category (default
+        announcement) and, for departments, roles (default ["student"]).
+        Admins reach everyone, HODs their department, teachers the classes
+        of their department.
+        """
+        user = request.user
+        if user.role not in ['admin', 'hod', 'teacher']:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        title = request.data.get('title')
+        message = request.data.get('message')
+        category = request.data.get('category', 'announcement')
+        if not title or not message:
+            return Response({'error': 'title and message are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if category not in dict(Notification.CATEGORY_CHOICES):
+            return Response({'error': 'Invalid category'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        class_id = request.data.get('class_id')
+        department_id = request.data.get('department_id')
+        if class_id:
+            klass = Class.objects.filter(pk=class_id).only('department_id').first()
+            if klass is None:
+                return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+            if user.role != 'admin' and klass.department_id != user.department_id:
+                return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+            recipients = class_recipients(klass.pk)
+        elif department_id:
+            if user.role == 'teacher' or (user.role == 'hod' and str(department_id) != str(user.department_id)):
+                return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+            roles = request.data.get('roles') or ['student']
+            if not set(roles) <= {'student', 'teacher', 'hod'}:
+                return Response({'error': 'roles may only contain student, teacher and hod'}, status=status.HTTP_400_BAD_REQUEST)
+            recipients = department_recipients(department_id, roles)
+        else:
+            return Response({'error': 'class_id or department_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        sent = notify_users(recipients, category, title, message)
+        return Response({'recipients': sent}, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['get'])
     def by_category(self, request):
@@ -811,3 +1094,41 @@ class NotificationViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset().filter(category=category)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of background jobs: admins see all jobs, other users the ones they queued"""
+    queryset = Job.objects.all().select_related('created_by')
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['created_at', 'finished_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.role != 'admin':
+            queryset = queryset.filter(created_by=self.request.user)
+        
+        for param in ('kind', 'status'):
+            value = self.request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def metrics(self, request):
+        """Queue depth and job latency per kind (Admin only)"""
+        if request.user.role != 'admin':
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(job_metrics())
+
+
+class ResponseCacheMetricsView(APIView):
+    """Hit/miss counters of the response cache (Admin only)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'admin':
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(response_cache_metrics(CachedResponseMixin.endpoints))
@@ -2,6 +2,8 @@
 ASGI config for attendance_and_monitoring_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to the live updates path (Server-Sent Events, see attendance/live.py)
+are streamed by a plain ASGI app; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_and_monitoring_system.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from attendance.live import LIVE_UPDATES_PATH, live_updates_application  # noqa: E402 (needs Django set up)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == LIVE_UPDATES_PATH:
+        return await live_updates_application(scope, receive, send)
+    return await django_application(scope, receive, send)
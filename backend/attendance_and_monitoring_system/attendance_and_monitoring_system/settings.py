@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables
 load_dotenv()
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'attendance.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -256,8 +258,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'attendance.throttling.AnonRateThrottle',
+        'attendance.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -265,6 +267,81 @@ REST_FRAMEWORK = {
     },
 }
 
+# Cache backend shared by every worker, selected with CACHE_BACKEND:
+# - 'locmem': per process (development and tests only)
+# - 'file': a directory on the host (CACHE_LOCATION), shared by all workers
+#   on one machine
+# - 'redis': any Redis-compatible server at CACHE_URL (Redis, Valkey, KeyDB,
+#   a local redis-server), needs the `redis` package
+# Each alias gets its own key namespace under CACHE_KEY_PREFIX; 'throttle'
+# holds the request rate counters (see attendance/throttling.py).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'attendance_system')
+CACHE_BACKENDS = {
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', '/var/tmp/attendance_system_cache'),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, not {CACHE_BACKEND!r}")
+
+CACHES = {}
+for _alias in ('default', 'throttle'):
+    CACHES[_alias] = {**CACHE_BACKENDS[CACHE_BACKEND], 'KEY_PREFIX': f'{CACHE_KEY_PREFIX}:{_alias}'}
+    if CACHE_BACKEND == 'locmem':
+        CACHES[_alias]['LOCATION'] = _alias
+    elif CACHE_BACKEND == 'file':
+        # One directory per alias, so clearing one never empties the other
+        CACHES[_alias]['LOCATION'] = os.path.join(CACHE_BACKENDS['file']['LOCATION'], _alias)
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+# Response cache for polled list endpoints (see attendance/caching.py).
+# ALIAS names an entry in CACHES; point it at a shared backend such as
+# Redis in production so every worker sees the same versions and entries.
+# Off by default with locmem: each worker would keep its own versions and
+# serve entries another worker's writes should have invalidated.
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', str(CACHE_BACKEND != 'locmem')).lower() == 'true',
+    'ALIAS': os.getenv('RESPONSE_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '30')),
+}
+
+# Live updates pushed over Server-Sent Events (see attendance/live.py).
+# 'memory' only reaches clients of the same process; use 'redis' when
+# running several ASGI workers.
+LIVE_UPDATES = {
+    'BROKER': os.getenv('LIVE_UPDATES_BROKER', 'memory'),
+    'REDIS_URL': os.getenv('LIVE_UPDATES_REDIS_URL', 'redis://localhost:6379/0'),
+}
+
+# Per-request SQL query budget (see attendance/querybudget.py): requests over
+# DEFAULT queries (or their view's query_budget) are logged, and in DEBUG
+# every response carries X-Query-Count / X-Query-Time-Ms / X-Query-Duplicates.
+QUERY_BUDGET = {
+    'ENABLED': os.getenv('QUERY_BUDGET_ENABLED', 'True').lower() == 'true',
+    'DEFAULT': int(os.getenv('QUERY_BUDGET_DEFAULT', '25')),
+    'HEADERS': DEBUG,
+}
+
+# Low attendance warnings (evaluated when a session is finalized)
+LOW_ATTENDANCE_THRESHOLD = float(os.getenv('LOW_ATTENDANCE_THRESHOLD', '75'))
+
+# Background jobs (see attendance/jobs.py), executed by `manage.py run_jobs`.
+# Off by default: jobs run inline in the request that queues them. Only
+# enable queueing when a run_jobs worker is deployed next to the API.
+BACKGROUND_JOBS = {
+    'ENABLED': os.getenv('BACKGROUND_JOBS_ENABLED', 'False').lower() == 'true',
+    'MAX_ATTEMPTS': int(os.getenv('BACKGROUND_JOBS_MAX_ATTEMPTS', '3')),
+    'RETRY_BACKOFF': int(os.getenv('BACKGROUND_JOBS_RETRY_BACKOFF', '30')),
+    'STALE_AFTER': int(os.getenv('BACKGROUND_JOBS_STALE_AFTER', '600')),
+}
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -17,6 +17,24 @@ from attendance.models import Department, Semester
 
 User = get_user_model()
 
+def get_or_create_hod(code, name):
+    """HOD user for a department code (password: hod123)"""
+    username = f"hod_{code.lower()}"
+    hod, created = User.objects.get_or_create(
+        username=username,
+        defaults={
+            'email': f'{username}@college.edu',
+            'role': 'hod',
+            'first_name': 'HOD',
+            'last_name': name.split()[0],
+        }
+    )
+    if created:
+        hod.set_password('hod123')
+        hod.save()
+    return hod
+
+
 def create_departments_and_semesters():
     """Create 4 departments with 8 semesters each"""
     
@@ -30,10 +48,15 @@ def create_departments_and_semesters():
     print("Creating departments...")
     departments = []
     for dept_data in departments_data:
+        # Every department needs its HOD, so the HOD user comes first
+        hod = get_or_create_hod(dept_data['code'], dept_data['name'])
         dept, created = Department.objects.get_or_create(
             code=dept_data['code'],
-            defaults={'name': dept_data['name']}
+            defaults={'name': dept_data['name'], 'hod': hod}
         )
+        if hod.department_id != dept.id:
+            hod.department = dept
+            hod.save(update_fields=['department'])
         departments.append(dept)
         status = "Created" if created else "Already exists"
         print(f"  {status}: {dept.code} - {dept.name}")
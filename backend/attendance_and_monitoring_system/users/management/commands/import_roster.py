@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.roster import BATCH_SIZE, import_roster
+
+
+class Command(BaseCommand):
+    help = 'Bulk import students (and their class enrollments) from a roster CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a username column (see users/roster.py for the others)')
+        parser.add_argument('--class', dest='class_id', type=int, help='Enroll every row without a class_id in this class')
+        parser.add_argument('--department', dest='department_id', type=int, help='Default department id')
+        parser.add_argument('--semester', dest='semester_id', type=int, help='Default semester id')
+        parser.add_argument('--default-password', help='Password for rows without one')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, help='Password hashing threads (defaults to the CPU count, max 8)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and roll back')
+
+    def handle(self, *args, **options):
+        try:
+            file = open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        with file:
+            result = import_roster(
+                file,
+                dry_run=options['dry_run'],
+                class_id=options['class_id'],
+                department_id=options['department_id'],
+                semester_id=options['semester_id'],
+                default_password=options['default_password'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+            )
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']} ({error['username'] or '-'}): {'; '.join(error['errors'])}")
+
+        verb = 'Would create' if result['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} student(s) and {result['enrolled']} enrollment(s) "
+            f"from {result['rows']} row(s), {result['failed']} failed, in {result['elapsed_ms']} ms"
+        ))
@@ -0,0 +1,254 @@
+"""
+Bulk import of student rosters from CSV.
+
+The CSV is read row by row and handled in batches: rows are validated
+(duplicate usernames, bad emails, short passwords, unknown classes,
+departments and semesters), passwords of the valid rows are hashed in a thread pool (PBKDF2 releases
+the GIL), then the batch's users and their ClassStudent enrollments are
+written with bulk_create. The whole import runs in one transaction;
+invalid rows are skipped and reported with their line number. If a
+concurrent write still makes an insert fail (e.g. the same username
+created meanwhile), the import is rolled back and reported as failed.
+
+Columns: username (required), password, email, first_name, last_name,
+phone, class_id, department_id, semester_id. Missing per-row values fall
+back to the defaults given to import_roster().
+"""
+import csv
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from attendance.models import Class, ClassStudent, Department, Semester
+from .models import CustomUser
+
+MIN_PASSWORD_LENGTH = 8
+BATCH_SIZE = 500
+
+
+class DryRunRollback(Exception):
+    pass
+
+
+def _int_or_none(value):
+    value = (value or '').strip()
+    return int(value) if value else None
+
+
+class RosterImport:
+    def __init__(self, default_password=None, class_id=None, department_id=None, semester_id=None,
+                 batch_size=BATCH_SIZE, workers=None):
+        self.default_password = default_password
+        self.defaults = {'class_id': class_id, 'department_id': department_id, 'semester_id': semester_id}
+        self.batch_size = batch_size
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.errors = []
+        self.created = 0
+        self.enrolled = 0
+        self.rows = 0
+        self._seen_usernames = set()
+        self._classes = {}
+        self._existing = {'department_id': set(), 'semester_id': set()}
+
+    def error(self, line, username, messages):
+        self.errors.append({'line': line, 'username': username, 'errors': messages})
+
+    def _class(self, class_id):
+        """(department_id, semester_id) of a class, cached; None if it does not exist"""
+        if class_id not in self._classes:
+            self._classes[class_id] = Class.objects.filter(pk=class_id).values_list(
+                'department_id', 'semester_id'
+            ).first()
+        return self._classes[class_id]
+
+    def validate(self, line, row):
+        """Cleaned values for a row, or None after recording its errors"""
+        messages = []
+        username = (row.get('username') or '').strip()
+        if not username:
+            messages.append('username is required')
+        elif len(username) > 150:
+            messages.append('username must be at most 150 characters')
+        elif username.lower() in self._seen_usernames:
+            messages.append('duplicate username in file')
+
+        password = row.get('password') or self.default_password
+        if not password:
+            messages.append('password is required')
+        elif len(password) < MIN_PASSWORD_LENGTH:
+            messages.append(f'password must be at least {MIN_PASSWORD_LENGTH} characters')
+
+        phone = (row.get('phone') or '').strip()
+        if len(phone) > 15:
+            messages.append('phone must be at most 15 characters')
+
+        email = (row.get('email') or '').strip()
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                messages.append('invalid email')
+
+        try:
+            ids = {
+                key: _int_or_none(row.get(key)) or self.defaults[key]
+                for key in ('class_id', 'department_id', 'semester_id')
+            }
+        except ValueError:
+            ids = {}
+            messages.append('class_id, department_id and semester_id must be integers')
+
+        if ids.get('class_id'):
+            placement = self._class(ids['class_id'])
+            if placement is None:
+                messages.append(f"class {ids['class_id']} does not exist")
+            else:
+                ids['department_id'] = ids['department_id'] or placement[0]
+                ids['semester_id'] = ids['semester_id'] or placement[1]
+
+        if messages:
+            self.error(line, username, messages)
+            return None
+
+        self._seen_usernames.add(username.lower())
+        return {
+            'line': line,
+            'username': username,
+            'password': password,
+            'email': email,
+            'first_name': (row.get('first_name') or '').strip(),
+            'last_name': (row.get('last_name') or '').strip(),
+            'phone': phone or None,
+            **ids,
+        }
+
+    def flush(self, batch, pool):
+        if not batch:
+            return
+
+        # Usernames already in the database, one query per batch
+        taken = set(
+            CustomUser.objects.filter(username__in=[row['username'] for row in batch])
+            .values_list('username', flat=True)
+        )
+        # Per-row department and semester ids that do not exist, at most one
+        # query per model and batch (ids seen in earlier batches are remembered)
+        unknown = {}
+        for key, model in (('department_id', Department), ('semester_id', Semester)):
+            wanted = {row[key] for row in batch if row[key]} - self._existing[key]
+            if wanted:
+                self._existing[key].update(model.objects.filter(pk__in=wanted).order_by().values_list('pk', flat=True))
+            unknown[key] = wanted - self._existing[key]
+
+        fresh = []
+        for row in batch:
+            messages = []
+            if row['username'] in taken:
+                messages.append('username already exists')
+            for key, label in (('department_id', 'department'), ('semester_id', 'semester')):
+                if row[key] in unknown[key]:
+                    messages.append(f'{label} {row[key]} does not exist')
+            if messages:
+                self.error(row['line'], row['username'], messages)
+            else:
+                fresh.append(row)
+        if not fresh:
+            return
+
+        hashes = list(pool.map(make_password, [row['password'] for row in fresh]))
+        users = [
+            CustomUser(
+                username=row['username'], password=password, email=row['email'],
+                first_name=row['first_name'], last_name=row['last_name'], phone=row['phone'],
+                role='student', department_id=row['department_id'], semester_id=row['semester_id'],
+            )
+            for row, password in zip(fresh, hashes)
+        ]
+        CustomUser.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(CustomUser.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        self.created += len(users)
+
+        enrollments = [
+            ClassStudent(student_id=user.pk, class_assigned_id=row['class_id'])
+            for row, user in zip(fresh, users) if row['class_id']
+        ]
+        ClassStudent.objects.bulk_create(enrollments)
+        self.enrolled += len(enrollments)
+
+        self.departments.update(row['department_id'] for row in fresh)
+
+    def run(self, lines, dry_run=False):
+        """Import from an iterable of CSV text lines; returns the summary"""
+        started = time.perf_counter()
+        self.departments = set()
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or 'username' not in [name.strip() for name in reader.fieldnames]:
+            self.error(1, None, ['CSV header must include a username column'])
+            return self.summary(started, dry_run)
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+        for key, model in (('class_id', Class), ('department_id', Department), ('semester_id', Semester)):
+            if self.defaults[key] and not model.objects.filter(pk=self.defaults[key]).exists():
+                self.error(0, None, [f'{key} {self.defaults[key]} does not exist'])
+                return self.summary(started, dry_run)
+
+        try:
+            with transaction.atomic(), ThreadPoolExecutor(max_workers=self.workers) as pool:
+                batch = []
+                for row in reader:
+                    self.rows += 1
+                    cleaned = self.validate(reader.line_num, row)
+                    if cleaned:
+                        batch.append(cleaned)
+                    if len(batch) >= self.batch_size:
+                        self.flush(batch, pool)
+                        batch = []
+                self.flush(batch, pool)
+                if dry_run:
+                    raise DryRunRollback()
+        except DryRunRollback:
+            pass
+        except IntegrityError:
+            # Rows written by someone else since the batch was checked; nothing was kept
+            self.created = self.enrolled = 0
+            self.error(0, None, ['import rolled back: a row conflicted with a concurrent change, retry the import'])
+        else:
+            self._invalidate_caches()
+
+        return self.summary(started, dry_run)
+
+    def _invalidate_caches(self):
+        # bulk_create does not send the signals that keep cached reads current
+        from attendance.caching import bump_versions, invalidate_department_statistics
+
+        if self.created:
+            bump_versions('users.CustomUser', 'attendance.ClassStudent')
+            invalidate_department_statistics(*self.departments)
+
+    def summary(self, started, dry_run):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'enrolled': self.enrolled,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'dry_run': dry_run,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def import_roster(file, dry_run=False, **options):
+    """Import a roster from a binary or text file object (see RosterImport for options)"""
+    if isinstance(file.read(0), bytes):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    return RosterImport(**options).run(file, dry_run=dry_run)
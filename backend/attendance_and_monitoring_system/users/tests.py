@@ -1,3 +1,149 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from attendance.models import Department, Semester, Class, ClassStudent
+from .models import CustomUser
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def roster_csv(rows, header='username,email,first_name,last_name,password'):
+    return '\n'.join([header] + rows) + '\n'
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RosterImportTests(APITestCase):
+    url = '/api/auth/import/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='admin', password='pass12345', role='admin')
+        hod = CustomUser.objects.create_user(username='hod', password='pass12345', role='hod')
+        cls.department = Department.objects.create(name='Computer Engineering', code='CE', hod=hod)
+        cls.semester = Semester.objects.create(
+            number=1, department=cls.department,
+            start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cls.klass = Class.objects.create(name='BCE', section='A', department=cls.department, semester=cls.semester)
+        CustomUser.objects.create_user(username='taken', password='pass12345', role='student')
+
+    def upload(self, content, **data):
+        self.client.force_authenticate(self.admin)
+        data['file'] = SimpleUploadedFile('roster.csv', content.encode(), content_type='text/csv')
+        return self.client.post(self.url, data, format='multipart')
+
+    def test_import_creates_students_and_enrollments(self):
+        response = self.upload(roster_csv([
+            'alice,alice@example.com,Alice,A,secret123',
+            'bob,bob@example.com,Bob,B,secret456',
+        ]), class_id=self.klass.id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['enrolled'], 2)
+        alice = CustomUser.objects.get(username='alice')
+        self.assertEqual(alice.role, 'student')
+        self.assertEqual((alice.department_id, alice.semester_id), (self.department.id, self.semester.id))
+        self.assertTrue(alice.check_password('secret123'))
+        self.assertTrue(ClassStudent.objects.filter(student=alice, class_assigned=self.klass).exists())
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        response = self.upload(roster_csv([
+            'carol,carol@example.com,Carol,C,secret123',
+            'carol,other@example.com,Carol,C,secret123',
+            'taken,,,,secret123',
+            'dave,not-an-email,Dave,D,secret123',
+            'erin,,Erin,E,short',
+            ',,,,secret123',
+        ]))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        errors = {error['line']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(errors, {
+            3: ['duplicate username in file'],
+            4: ['username already exists'],
+            5: ['invalid email'],
+            6: ['password must be at least 8 characters'],
+            7: ['username is required'],
+        })
+
+    def test_default_password_and_per_row_class(self):
+        content = roster_csv([f'frank,,,,,{self.klass.id}', 'grace,,,,,999'], header='username,email,first_name,last_name,password,class_id')
+        response = self.upload(content, default_password='welcome123')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(CustomUser.objects.get(username='frank').check_password('welcome123'))
+        self.assertEqual(response.data['errors'][0]['errors'], ['class 999 does not exist'])
+
+    def test_unknown_per_row_department_and_semester(self):
+        header = 'username,email,first_name,last_name,password,department_id,semester_id'
+        content = roster_csv([
+            f'ken,,,,secret123,{self.department.id},{self.semester.id}',
+            f'liam,,,,secret123,999,{self.semester.id}',
+            f'mia,,,,secret123,{self.department.id},998',
+        ], header=header)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(content)
+
+        self.assertEqual(response.data['created'], 1)
+        errors = {error['line']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(errors, {3: ['department 999 does not exist'], 4: ['semester 998 does not exist']})
+        lookups = [q['sql'] for q in queries.captured_queries if 'FROM "attendance_department"' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+
+    def test_conflicting_insert_rolls_back_the_import(self):
+        conflict = IntegrityError('UNIQUE constraint failed: users_customuser.username')
+        with mock.patch.object(CustomUser.objects, 'bulk_create', side_effect=conflict):
+            response = self.upload(roster_csv(['nina,,,,secret123']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 0)
+        self.assertIn('import rolled back', response.data['errors'][0]['errors'][0])
+        self.assertFalse(CustomUser.objects.filter(username='nina').exists())
+
+    def test_dry_run_rolls_back(self):
+        response = self.upload(roster_csv(['heidi,,,,secret123']), dry_run='true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertFalse(CustomUser.objects.filter(username='heidi').exists())
+
+    def test_bad_header_and_permissions(self):
+        self.assertEqual(self.upload('name,email\nivan,\n').status_code, 400)
+
+        student = CustomUser.objects.get(username='taken')
+        self.client.force_authenticate(student)
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('r.csv', b'username\n')}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+    def test_large_intake_uses_batched_queries(self):
+        rows = [f'student{i},student{i}@example.com,S,{i},secret123' for i in range(2000)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(roster_csv(rows), class_id=self.klass.id)
+
+        self.assertEqual(response.data['created'], 2000)
+        self.assertEqual(ClassStudent.objects.filter(class_assigned=self.klass).count(), 2000)
+        # Batched statements (SQLite splits inserts further at its parameter limit), not per student
+        self.assertLess(len(queries), 100)
+
+    def test_management_command(self):
+        out, err = io.StringIO(), io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(roster_csv(['judy,,,,secret123', 'taken,,,,secret123']))
+            f.flush()
+            call_command('import_roster', f.name, '--class', str(self.klass.id), stdout=out, stderr=err)
+
+        self.assertIn('Created 1 student(s) and 1 enrollment(s)', out.getvalue())
+        self.assertIn('line 3 (taken): username already exists', err.getvalue())
@@ -1,3 +1,5 @@
+import csv
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
@@ -6,6 +8,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import CustomUser
+from .roster import import_roster
 from .serializers import UserSerializer, UserDetailSerializer, UserCreateSerializer
 
 def home(request):
@@ -36,22 +39,24 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # department_name and semester_display read both relations
+        users = CustomUser.objects.select_related('department', 'semester')
         
         if user.role == 'admin':
             # Admin can see all users
-            return CustomUser.objects.all()
+            return users.all()
         elif user.role == 'hod':
             # HOD can see users in their department
-            return CustomUser.objects.filter(department=user.department)
+            return users.filter(department=user.department)
         elif user.role == 'teacher':
             # Teacher can see teachers and students in their department
-            return CustomUser.objects.filter(
+            return users.filter(
                 department=user.department,
                 role__in=['teacher', 'student']
             )
         else:
             # Student can only see themselves
-            return CustomUser.objects.filter(id=user.id)
+            return users.filter(id=user.id)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -124,6 +129,58 @@ class UserViewSet(viewsets.ModelViewSet):
         logger.info(f"Password changed successfully for user: {user.username}")
         return Response({"message": "Password changed successfully"})
 
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_roster(self, request):
+        """
+        Bulk import students from an uploaded CSV (multipart field "file").
+        Optional form fields: class_id, department_id, semester_id,
+        default_password (used for rows without a password) and dry_run.
+        Valid rows are created, invalid ones reported with their line.
+        """
+        if request.user.role != 'admin':
+            return Response(
+                {"error": "Only admin can import users"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "Upload the roster CSV as 'file'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        options = {'default_password': request.data.get('default_password') or None}
+        for key in ('class_id', 'department_id', 'semester_id'):
+            value = request.data.get(key)
+            if value:
+                try:
+                    options[key] = int(value)
+                except (TypeError, ValueError):
+                    return Response(
+                        {"error": f"{key} must be an integer"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+
+        try:
+            result = import_roster(upload.file, dry_run=dry_run, **options)
+        except (UnicodeDecodeError, csv.Error):
+            return Response(
+                {"error": "The roster must be a UTF-8 CSV file"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not result['rows'] and result['errors']:
+            # Bad header or unknown class / department / semester
+            return Response(
+                {"error": result['errors'][0]['errors'][0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        code = status.HTTP_201_CREATED if result['created'] and not dry_run else status.HTTP_200_OK
+        return Response(result, status=code)
+
     def create(self, request, *args, **kwargs):
         """Only admin can create users"""
         if request.user.role != 'admin':
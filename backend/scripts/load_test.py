@@ -0,0 +1,426 @@
+"""
+Load testing for the Khwopa Attendance System API.
+
+comprehensive_api_test.py and test_api.py check correctness one request at
+a time. This script drives concurrent, mixed traffic against a running
+server and reports per-endpoint throughput, latency percentiles and error
+rates as JSON.
+
+1. Seed realistic data (the college scenario from create_scenario_data.py,
+   scaled up with one class + subject per teacher and its students) and
+   write a manifest of who teaches what:
+
+       python scripts/load_test.py seed --teachers 200 --students-per-class 48
+
+2. Start the server (runserver, or gunicorn/uvicorn for realistic numbers)
+   and run the workload:
+
+       python scripts/load_test.py run --teachers 200 --students 100 --output results.json
+
+   Every teacher logs in, then all of them start a session at the same
+   moment ("9:00"), mark their class with mark_multiple in batches (plus a
+   few single late marks), poll active sessions and end the session.
+   Meanwhile students poll their dashboard (unread count, reports,
+   attendance) and HODs read department statistics and reports.
+
+SQLite serializes writers, so concurrent marking there mostly measures
+"database is locked" errors; point DATABASES at PostgreSQL/MySQL for
+numbers that mean something. When the server runs with DEBUG, the X-Query-Count header added by the
+query budget middleware is averaged per endpoint too.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+BASE_URL = "http://127.0.0.1:8000"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), 'attendance_and_monitoring_system')
+DEFAULT_MANIFEST = os.path.join(SCRIPTS_DIR, 'load_test_manifest.json')
+
+TEACHER_PASSWORD = 'teacher123'
+STUDENT_PASSWORD = 'student123'
+HOD_PASSWORD = 'hod123'
+PREFIX = 'load'
+
+
+# =======================
+# Seeding (needs Django)
+# =======================
+
+def setup_django():
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_and_monitoring_system.settings')
+    import django
+    django.setup()
+
+
+def seed(args):
+    """Create the scenario data plus one class per load teacher; write the manifest"""
+    setup_django()
+    import create_scenario_data as scenario
+    from django.contrib.auth.hashers import make_password
+    from django.db import transaction
+    from attendance.models import Class, ClassStudent, Department, Semester, Subject, TeacherAssignment
+    from users.models import CustomUser
+
+    scenario.main()
+
+    departments = list(Department.objects.order_by('code'))
+    per_department = math.ceil(args.teachers / len(departments))
+    teacher_hash = make_password(TEACHER_PASSWORD)
+    student_hash = make_password(STUDENT_PASSWORD)
+    manifest = {'teachers': [], 'students': [], 'hods': []}
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        for department in departments:
+            code = department.code.lower()
+            semesters = {s.number: s for s in Semester.objects.filter(department=department)}
+            manifest['hods'].append({'username': department.hod.username, 'department_id': department.id})
+
+            for i in range(per_department):
+                if len(manifest['teachers']) >= args.teachers:
+                    break
+                semester = semesters.get(i % 8 + 1)
+                teacher, _ = CustomUser.objects.get_or_create(
+                    username=f'{PREFIX}_teacher_{code}{i}',
+                    defaults={'role': 'teacher', 'department': department, 'password': teacher_hash,
+                              'first_name': f'Teacher{i}', 'last_name': department.code}
+                )
+                subject, _ = Subject.objects.get_or_create(
+                    code=f'{PREFIX.upper()}-{department.code}-{i}',
+                    defaults={'name': f'Load Subject {i}', 'department': department, 'semester': semester}
+                )
+                klass, _ = Class.objects.get_or_create(
+                    name=f'{PREFIX.upper()}-{department.code}', section=str(i),
+                    defaults={'department': department, 'semester': semester}
+                )
+                klass.subjects.add(subject)
+                TeacherAssignment.objects.get_or_create(
+                    teacher=teacher, subject=subject, class_assigned=klass,
+                    defaults={'semester': semester, 'teaching_department': department}
+                )
+
+                usernames = [f'{PREFIX}_student_{code}{i}_{j}' for j in range(args.students_per_class)]
+                CustomUser.objects.bulk_create([
+                    CustomUser(username=username, role='student', department=department, semester=semester,
+                               password=student_hash, first_name=f'Student{j}', last_name=department.code)
+                    for j, username in enumerate(usernames)
+                ], ignore_conflicts=True)
+                student_ids = list(
+                    CustomUser.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True)
+                )
+                ClassStudent.objects.bulk_create(
+                    [ClassStudent(student_id=student_id, class_assigned=klass) for student_id in student_ids],
+                    ignore_conflicts=True
+                )
+
+                manifest['teachers'].append({
+                    'username': teacher.username, 'class_id': klass.id, 'subject_id': subject.id,
+                    'student_ids': student_ids,
+                })
+                manifest['students'].extend(usernames[:2])
+
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"\nSeeded {len(manifest['teachers'])} load teachers with {args.students_per_class} students each "
+          f"in {time.perf_counter() - started:.1f}s; manifest written to {args.manifest}")
+
+
+# =======================
+# Measuring
+# =======================
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Thread-safe per-endpoint samples"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # name -> [(latency_ms, status, queries)]
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, name, latency_ms, status, queries=None):
+        with self.lock:
+            self.samples[name].append((latency_ms, status, queries))
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        total = errors = 0
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(sample[0] for sample in samples)
+            failed = sum(1 for _, status, _ in samples if not 200 <= status < 400)
+            statuses = defaultdict(int)
+            for _, status, _ in samples:
+                statuses[str(status)] += 1
+            queries = [q for _, _, q in samples if q is not None]
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': failed,
+                'error_rate': round(failed / len(samples), 4),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'latency_ms': {
+                    'mean': round(sum(latencies) / len(latencies), 1),
+                    'p50': round(percentile(latencies, 0.50), 1),
+                    'p90': round(percentile(latencies, 0.90), 1),
+                    'p95': round(percentile(latencies, 0.95), 1),
+                    'p99': round(percentile(latencies, 0.99), 1),
+                    'max': round(latencies[-1], 1),
+                },
+                'status_codes': dict(statuses),
+                'queries_mean': round(sum(queries) / len(queries), 1) if queries else None,
+            }
+            total += len(samples)
+            errors += failed
+        return {
+            'duration_s': round(elapsed, 2),
+            'totals': {
+                'requests': total,
+                'errors': errors,
+                'error_rate': round(errors / total, 4) if total else 0.0,
+                'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            },
+            'endpoints': endpoints,
+        }
+
+
+class Client:
+    """One virtual user: a keep-alive HTTP session that records every call"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def call(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(name, (time.perf_counter() - started) * 1000, 0)
+            return None
+        queries = response.headers.get('X-Query-Count')
+        self.recorder.add(
+            name, (time.perf_counter() - started) * 1000, response.status_code,
+            int(queries) if queries is not None else None
+        )
+        return response
+
+    def login(self, username, password):
+        response = self.call('auth.login', 'POST', '/api/auth/login/', json={'username': username, 'password': password})
+        if response is None or response.status_code != 200:
+            return False
+        self.http.headers['Authorization'] = f"Bearer {response.json()['access']}"
+        return True
+
+
+# =======================
+# Workloads
+# =======================
+
+def teacher_workload(client, teacher, args, start_gate, deadline):
+    start_gate.wait()
+    if args.ramp:
+        time.sleep(random.uniform(0, args.ramp))
+
+    sessions = 0
+    while sessions < args.sessions or (deadline and time.monotonic() < deadline):
+        response = client.call('sessions.start_session', 'POST', '/api/attendance/sessions/start_session/', json={
+            'class_assigned': teacher['class_id'], 'subject': teacher['subject_id']
+        })
+        if response is None or response.status_code != 201:
+            time.sleep(args.think)
+            sessions += 1
+            continue
+        session_id = response.json()['id']
+
+        students = list(teacher['student_ids'])
+        late = students[-args.late_marks:] if args.late_marks else []
+        on_time = students[:len(students) - len(late)]
+        for start in range(0, len(on_time), args.batch_size):
+            batch = on_time[start:start + args.batch_size]
+            client.call('attendance.mark_multiple', 'POST', '/api/attendance/attendance/mark_multiple/', json={
+                'session_id': session_id,
+                'attendances': [
+                    {'student_id': student_id, 'status': 'present' if random.random() < 0.85 else 'absent',
+                     'confidence_score': round(random.uniform(0.8, 0.99), 2)}
+                    for student_id in batch
+                ],
+            })
+            client.call('sessions.active_sessions', 'GET', '/api/attendance/sessions/active_sessions/')
+        for student_id in late:
+            client.call('attendance.mark_attendance', 'POST', '/api/attendance/attendance/mark_attendance/', json={
+                'student_id': student_id, 'session_id': session_id, 'status': 'late'
+            })
+
+        client.call('sessions.end_session', 'POST', f'/api/attendance/sessions/{session_id}/end_session/')
+        sessions += 1
+        time.sleep(args.think)
+
+
+def student_workload(client, args, stop):
+    while not stop.is_set():
+        client.call('notifications.unread_count', 'GET', '/api/attendance/notifications/unread_count/')
+        client.call('attendance_reports.list', 'GET', '/api/attendance/attendance-reports/')
+        client.call('attendance.list', 'GET', '/api/attendance/attendance/')
+        stop.wait(args.poll_interval)
+
+
+def hod_workload(client, hod, args, stop):
+    while not stop.is_set():
+        client.call('departments.statistics', 'GET', f"/api/attendance/departments/{hod['department_id']}/statistics/")
+        client.call('attendance.statistics', 'GET', '/api/attendance/attendance/statistics/?group_by=subject')
+        client.call('attendance_reports.low_attendance', 'GET', '/api/attendance/attendance-reports/low_attendance/')
+        client.call('sessions.list', 'GET', '/api/attendance/sessions/')
+        stop.wait(args.poll_interval)
+
+
+def run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    teachers = manifest['teachers'][:args.teachers]
+    students = manifest['students'][:args.students]
+    hods = manifest['hods'][:args.hods]
+
+    recorder = Recorder()
+    stop = threading.Event()
+    deadline = None
+
+    def login_all(entries, password):
+        clients = []
+        for entry in entries:
+            client = Client(args.base_url, recorder, args.timeout)
+            username = entry['username'] if isinstance(entry, dict) else entry
+            if client.login(username, password):
+                clients.append((client, entry))
+            else:
+                print(f'Login failed for {username}', file=sys.stderr)
+        return clients
+
+    print(f'Logging in {len(teachers)} teachers, {len(students)} students and {len(hods)} HODs...', file=sys.stderr)
+    with ThreadPoolExecutor(max_workers=args.login_concurrency) as pool:
+        teacher_clients = [c for chunk in pool.map(lambda t: login_all([t], TEACHER_PASSWORD), teachers) for c in chunk]
+        student_clients = [c for chunk in pool.map(lambda s: login_all([s], STUDENT_PASSWORD), students) for c in chunk]
+        hod_clients = [c for chunk in pool.map(lambda h: login_all([h], HOD_PASSWORD), hods) for c in chunk]
+    start_gate = threading.Barrier(len(teacher_clients) + 1)
+
+    workers = len(teacher_clients) + len(student_clients) + len(hod_clients)
+    print(f'Running the workload with {workers} virtual users...', file=sys.stderr)
+    recorder.started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for client, _ in student_clients:
+            pool.submit(student_workload, client, args, stop)
+        for client, hod in hod_clients:
+            pool.submit(hod_workload, client, hod, args, stop)
+        if args.duration:
+            deadline = time.monotonic() + args.duration
+        teacher_futures = [
+            pool.submit(teacher_workload, client, teacher, args, start_gate, deadline)
+            for client, teacher in teacher_clients
+        ]
+        start_gate.wait()  # every teacher starts at the same moment
+        for future in teacher_futures:
+            future.result()
+        stop.set()
+    recorder.finished = time.perf_counter()
+
+    result = {
+        'base_url': args.base_url,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'teachers': len(teacher_clients), 'students': len(student_clients), 'hods': len(hod_clients),
+            'sessions_per_teacher': args.sessions, 'duration': args.duration, 'batch_size': args.batch_size,
+            'late_marks': args.late_marks, 'poll_interval': args.poll_interval, 'ramp': args.ramp,
+        },
+        **recorder.summary(),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    print_table(result)
+
+    if args.max_error_rate is not None and result['totals']['error_rate'] > args.max_error_rate:
+        sys.exit(1)
+
+
+def print_table(result):
+    """Human-readable summary on stderr (the JSON stays clean on stdout)"""
+    out = sys.stderr
+    print(f"\n{'Endpoint':<36}{'reqs':>7}{'err%':>7}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'SQL':>6}", file=out)
+    print('-' * 96, file=out)
+    for name, stats in result['endpoints'].items():
+        latency = stats['latency_ms']
+        queries = stats['queries_mean'] if stats['queries_mean'] is not None else '-'
+        print(
+            f"{name:<36}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%{stats['throughput_rps']:>8}"
+            f"{latency['p50']:>8}{latency['p95']:>8}{latency['p99']:>8}{latency['max']:>8}{queries:>6}",
+            file=out
+        )
+    totals = result['totals']
+    print('-' * 96, file=out)
+    print(f"{totals['requests']} requests in {result['duration_s']}s, {totals['throughput_rps']} req/s, "
+          f"{totals['error_rate'] * 100:.2f}% errors", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='Create load-test users, classes and enrollments')
+    seed_parser.add_argument('--teachers', type=int, default=200)
+    seed_parser.add_argument('--students-per-class', type=int, default=48)
+    seed_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+
+    run_parser = commands.add_parser('run', help='Drive the mixed workload against a running server')
+    run_parser.add_argument('--base-url', default=BASE_URL)
+    run_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    run_parser.add_argument('--teachers', type=int, default=200, help='Concurrent teachers running sessions')
+    run_parser.add_argument('--students', type=int, default=100, help='Students polling their dashboard')
+    run_parser.add_argument('--hods', type=int, default=4, help='HODs reading statistics and reports')
+    run_parser.add_argument('--sessions', type=int, default=1, help='Sessions per teacher')
+    run_parser.add_argument('--duration', type=float, help='Keep teachers running sessions for this many seconds')
+    run_parser.add_argument('--batch-size', type=int, default=12, help='Students per mark_multiple call')
+    run_parser.add_argument('--late-marks', type=int, default=3, help='Students marked late one by one')
+    run_parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between dashboard polls')
+    run_parser.add_argument('--think', type=float, default=0.5, help='Seconds between a teacher\'s sessions')
+    run_parser.add_argument('--ramp', type=float, default=0.0, help='Spread session starts over this many seconds')
+    run_parser.add_argument('--timeout', type=float, default=30.0)
+    run_parser.add_argument('--login-concurrency', type=int, default=20)
+    run_parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    run_parser.add_argument('--max-error-rate', type=float, help='Exit with status 1 above this error rate (e.g. 0.01)')
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,40 +10,38 @@ export default function AttendanceTable({ filterOptions, data, role, onDataChang
     const [error, setError] = useState(null);
     const [editingRecord, setEditingRecord] = useState(null);
     const [editForm, setEditForm] = useState({ status: '', notes: '' });
-    const [currentPage, setCurrentPage] = useState(1);
-    const [totalPages, setTotalPages] = useState(1);
+    // The attendance list is keyset-paginated: pages are reached through the
+    // next/previous cursors it returns (sending `page` falls back to COUNT + OFFSET)
+    const [cursor, setCursor] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [previousCursor, setPreviousCursor] = useState(null);
+    const [pageNumber, setPageNumber] = useState(1);
 
     useEffect(() => {
         if (!data) {
-            fetchAttendanceData(currentPage);
+            fetchAttendanceData(null, 1);
         } else {
             setAttendanceData(data);
         }
-    }, [data, currentPage]);
-
-    useEffect(() => {
-        if (!data) {
-            setCurrentPage(1);
-            fetchAttendanceData(1);
-        }
     }, [filters, data]);
 
-    const fetchAttendanceData = async (page = currentPage) => {
+    const cursorFrom = (url) => (url ? new URL(url).searchParams.get('cursor') : null);
+
+    const fetchAttendanceData = async (pageCursor = cursor, page = pageNumber) => {
         try {
             setLoading(true);
             setError(null);
 
-            const params = {
-                page,
-                ...filters
-            };
+            const params = { ...filters };
+            if (pageCursor) params.cursor = pageCursor;
 
             const response = await attendanceAPI.getAll(params);
             const results = response.data.results || response.data;
-            const totalCount = response.data.count || results.length || 0;
             setAttendanceData(results || []);
-            setTotalPages(Math.max(1, Math.ceil(totalCount / 20)));
-            setCurrentPage(page);
+            setNextCursor(cursorFrom(response.data.next));
+            setPreviousCursor(cursorFrom(response.data.previous));
+            setCursor(pageCursor);
+            setPageNumber(page);
         } catch (err) {
             console.error("Error fetching attendance data:", err);
             setError("Failed to load attendance data. Please try again.");
@@ -140,7 +138,7 @@ export default function AttendanceTable({ filterOptions, data, role, onDataChang
         return (
             <div className="error-container">
                 <div className="error-message">{error}</div>
-                <button onClick={fetchAttendanceData} className="retry-btn">Retry</button>
+                <button onClick={() => fetchAttendanceData()} className="retry-btn">Retry</button>
             </div>
         );
     }
@@ -168,7 +166,7 @@ export default function AttendanceTable({ filterOptions, data, role, onDataChang
                     disabled={loading}
                 />
                 <button
-                    onClick={fetchAttendanceData}
+                    onClick={() => fetchAttendanceData()}
                     className="refresh-btn"
                     disabled={loading}
                     style={{ marginLeft: 10 }}
@@ -289,15 +287,15 @@ export default function AttendanceTable({ filterOptions, data, role, onDataChang
 
             <div className="pagination">
                 <button
-                    onClick={() => fetchAttendanceData(Math.max(1, currentPage - 1))}
-                    disabled={currentPage === 1 || loading}
+                    onClick={() => fetchAttendanceData(pageNumber > 2 ? previousCursor : null, Math.max(1, pageNumber - 1))}
+                    disabled={!previousCursor || loading}
                 >
                     Previous
                 </button>
-                <span>Page {currentPage} of {totalPages}</span>
+                <span>Page {pageNumber}</span>
                 <button
-                    onClick={() => fetchAttendanceData(Math.min(totalPages, currentPage + 1))}
-                    disabled={currentPage === totalPages || loading}
+                    onClick={() => fetchAttendanceData(nextCursor, pageNumber + 1)}
+                    disabled={!nextCursor || loading}
                 >
                     Next
                 </button>